@@ -1,8 +1,20 @@
-from typing import Optional, Tuple, List
-from app.core.retrieve.retriever import retrieve_relevant_chunks
-from app.core.reason.generator import generate_answer
+import asyncio
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple, List
+from app.core.retrieve.retriever import retrieve_relevant_chunks, retrieve_relevant_chunks_batch
+from app.core.reason.cache import AnswerCache, CachedAnswer, answer_cache_key, get_answer_cache, normalize_query
+from app.core.reason.semantic_cache import SemanticQueryCache
+from app.core.reason.generator import generate_answer, generate_answer_async, generate_answer_stream
+from app.core.verify.base import VerificationResult
 from app.core.verify.verifier import AnswerVerifier
 from app.core.schemas.embedding import EmbeddedChunk
+from app.core.schemas.filter import SearchFilter
+from app.core.schemas.response import BatchAnswer
+from app.core.core.config import settings
+from app.core.core.tracing import current_span, span
+
+NO_CONTEXT_ANSWER = "I could not find any relevant information in the document to answer your question."
 
 
 class VeriLensAgent:
@@ -11,50 +23,341 @@ class VeriLensAgent:
     
     The agent retrieves relevant document chunks, generates answers,
     and optionally verifies that answers are grounded in evidence.
+    Answers (and verification results) are cached by query, retrieved
+    chunks and model, so repeated questions skip the LLM; paraphrased
+    questions answered from the same chunks are matched semantically.
     """
     
-    def __init__(self, vector_store, enable_verification: bool = False):
+    def __init__(
+        self,
+        vector_store,
+        enable_verification: bool = False,
+        answer_cache: Optional[AnswerCache] = None,
+        semantic_cache: Optional[SemanticQueryCache] = None
+    ):
         """
         Initialize the VeriLens agent.
         
         Args:
             vector_store: The vector store containing document embeddings
             enable_verification: Whether to verify answers (slower but more reliable)
+            answer_cache: Cache to use (defaults to the shared cache when
+                settings.ANSWER_CACHE_ENABLED is set)
+            semantic_cache: Paraphrase cache to use (defaults to a new one over
+                this store when settings.SEMANTIC_CACHE_ENABLED is set)
         """
         self.vector_store = vector_store
         self.enable_verification = enable_verification
         self.verifier = AnswerVerifier() if enable_verification else None
+        if answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+            answer_cache = get_answer_cache()
+        self.answer_cache = answer_cache
+        if semantic_cache is None and settings.SEMANTIC_CACHE_ENABLED:
+            semantic_cache = SemanticQueryCache(vector_store)
+        self.semantic_cache = semantic_cache
         self._last_chunks: List[EmbeddedChunk] = []
     
-    def answer(self, query: str) -> str:
+    def answer(self, query: str, search_filter: Optional[SearchFilter] = None) -> str:
         """
         Generate an answer for the given query.
         
         Args:
             query: The user's question
+            search_filter: Only answer from chunks matching this filter
             
         Returns:
             The generated answer with citations
         """
-        self._last_chunks = retrieve_relevant_chunks(query, self.vector_store)
+        with span("agent.answer", query_chars=len(query)) as s:
+            self._last_chunks = retrieve_relevant_chunks(query, self.vector_store, search_filter)
+            s.set(chunks=len(self._last_chunks))
+            return self._answer_from_chunks(query, self._last_chunks)
+    
+    def _answer_from_chunks(self, query: str, chunks: List[EmbeddedChunk]) -> str:
+        """Everything in answer() after retrieval: cache lookup, generation and verification."""
+        if not chunks:
+            return NO_CONTEXT_ANSWER
         
-        if not self._last_chunks:
-            return "I could not find any relevant information in the document to answer your question."
-
-        answer = generate_answer(query, self._last_chunks)
-
-        if self.enable_verification and self.verifier:
-            verification = self.verifier.verify(answer, self._last_chunks, query)
-            if verification.overall_status == "NOT_VERIFIED":
-                answer += f"\n\n⚠️ VERIFICATION WARNING: This answer may not be fully grounded in the document. Confidence: {verification.confidence_score:.0%}"
-            elif verification.overall_status == "PARTIALLY_VERIFIED":
-                answer += f"\n\n📝 Note: Some claims could not be fully verified. Confidence: {verification.confidence_score:.0%}"
+        key, cached, exact = self._lookup(query, chunks)
+        answer = cached.answer if cached else generate_answer(query, chunks)
+        verification = cached.verification if cached else None
         
-        return answer
+        if self._should_verify(verification):
+            verification = self.verifier.verify(answer, chunks, query)
+        
+        self._store(query, chunks, key, cached, exact, answer, verification)
+        current_span().set(verification=_status(verification))
+        return answer + self._note(verification)
+    
+    def answer_batch(
+        self,
+        queries: List[str],
+        max_concurrency: Optional[int] = None,
+        ordered: bool = True,
+        search_filter: Optional[SearchFilter] = None
+    ) -> Iterator[BatchAnswer]:
+        """
+        Answer many questions, sharing retrieval work across the batch.
+        
+        All queries are embedded in one transform call and scored against
+        the store with one matrix product (see similarity_search_batch).
+        Generation and verification then run on up to max_concurrency
+        threads, still subject to the shared LLM scheduler's limits.
+        Questions that are identical after normalization are answered
+        once. A failing question yields a BatchAnswer with `error` set;
+        the rest of the batch carries on.
+        
+        Args:
+            queries: The questions
+            max_concurrency: Questions answered at once (defaults to settings.BATCH_MAX_CONCURRENCY)
+            ordered: Yield results in input order; otherwise as they complete
+            search_filter: Only answer from chunks matching this filter
+            
+        Yields:
+            One BatchAnswer per query
+        """
+        if max_concurrency is None:
+            max_concurrency = settings.BATCH_MAX_CONCURRENCY
+        
+        with span("agent.answer_batch", queries=len(queries), max_concurrency=max_concurrency) as s:
+            try:
+                retrieved = retrieve_relevant_chunks_batch(queries, self.vector_store, search_filter)
+            except Exception as e:
+                s.set(failed=len(queries))
+                for index, query in enumerate(queries):
+                    yield BatchAnswer(index=index, query=query, error=f"Retrieval failed: {e}")
+                return
+            
+            # Duplicates are answered by the first occurrence
+            copies: Dict[int, List[int]] = {}
+            first_by_key: Dict[str, int] = {}
+            for index, query in enumerate(queries):
+                first = first_by_key.setdefault(normalize_query(query), index)
+                copies.setdefault(first, []).append(index)
+            
+            executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="answer-batch")
+            pending = {
+                executor.submit(
+                    contextvars.copy_context().run, self._answer_batch_item, queries[first], retrieved[first]
+                ): first
+                for first in copies
+            }
+            finished: Dict[int, BatchAnswer] = {}
+            next_index = 0
+            failed = 0
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        first = pending.pop(future)
+                        try:
+                            answer, error = future.result(), None
+                        except Exception as e:
+                            answer, error = None, str(e)
+                        for index in copies[first]:
+                            failed += error is not None
+                            result = BatchAnswer(
+                                index=index,
+                                query=queries[index],
+                                answer=answer,
+                                sources=retrieved[index] if error is None else [],
+                                error=error
+                            )
+                            if ordered:
+                                finished[index] = result
+                            else:
+                                yield result
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+            finally:
+                # Stop queued questions if the caller stops iterating early
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=False)
+                s.set(failed=failed)
     
-    def answer_with_sources(self, query: str) -> Tuple[str, List[EmbeddedChunk]]:
-        answer = self.answer(query)
+    def _answer_batch_item(self, query: str, chunks: List[EmbeddedChunk]) -> str:
+        with span("agent.answer", query_chars=len(query), chunks=len(chunks)):
+            return self._answer_from_chunks(query, chunks)
+    
+    def answer_with_sources(
+        self,
+        query: str,
+        search_filter: Optional[SearchFilter] = None
+    ) -> Tuple[str, List[EmbeddedChunk]]:
+        answer = self.answer(query, search_filter)
         return answer, self._last_chunks
     
-    def get_relevant_chunks(self, query: str, top_k: Optional[int] = None) -> List[EmbeddedChunk]:
-        return retrieve_relevant_chunks(query, self.vector_store)
+    def answer_stream(self, query: str, search_filter: Optional[SearchFilter] = None) -> Iterator[str]:
+        """
+        Streaming version of answer.
+        
+        Yields the answer text as the LLM produces it. When verification
+        is enabled, the full answer is verified after the stream ends and
+        any warning is yielded as a final piece. Cached answers are
+        yielded in one piece.
+        
+        Args:
+            query: The user's question
+            search_filter: Only answer from chunks matching this filter
+            
+        Yields:
+            Pieces of the answer text, in order
+        """
+        with span("agent.answer", query_chars=len(query), stream=True) as s:
+            self._last_chunks = retrieve_relevant_chunks(query, self.vector_store, search_filter)
+            s.set(chunks=len(self._last_chunks))
+            
+            if not self._last_chunks:
+                yield NO_CONTEXT_ANSWER
+                return
+            
+            key, cached, exact = self._lookup(query, self._last_chunks)
+            if cached:
+                answer, verification = cached.answer, cached.verification
+                yield answer
+            else:
+                pieces = []
+                for token in generate_answer_stream(query, self._last_chunks):
+                    pieces.append(token)
+                    yield token
+                answer, verification = "".join(pieces), None
+            
+            if self._should_verify(verification):
+                verification = self.verifier.verify(answer, self._last_chunks, query)
+            
+            self._store(query, self._last_chunks, key, cached, exact, answer, verification)
+            s.set(verification=_status(verification))
+            note = self._note(verification)
+            if note:
+                yield note
+    
+    async def answer_async(self, query: str, search_filter: Optional[SearchFilter] = None) -> str:
+        """
+        Async version of answer.
+        
+        Retrieval runs in the loop's default executor and the LLM calls
+        use the shared async client, so one event loop can serve many
+        questions concurrently.
+        """
+        answer, _ = await self.answer_with_sources_async(query, search_filter)
+        return answer
+    
+    async def answer_with_sources_async(
+        self,
+        query: str,
+        search_filter: Optional[SearchFilter] = None
+    ) -> Tuple[str, List[EmbeddedChunk]]:
+        """
+        Async version of answer_with_sources.
+        
+        Chunks are returned directly rather than through shared agent
+        state, so concurrent calls never see each other's sources.
+        Retrieval and the cache reads and writes (SQLite and the semantic
+        cache's query embedding) run in the default executor, so they
+        never block the event loop.
+        """
+        with span("agent.answer", query_chars=len(query)) as s:
+            loop = asyncio.get_running_loop()
+            # Run retrieval in this task's context so its span nests under this one
+            chunks = await loop.run_in_executor(
+                None, contextvars.copy_context().run, retrieve_relevant_chunks, query, self.vector_store, search_filter
+            )
+            s.set(chunks=len(chunks))
+            
+            if not chunks:
+                return NO_CONTEXT_ANSWER, chunks
+            
+            key, cached, exact = await loop.run_in_executor(
+                None, contextvars.copy_context().run, self._lookup, query, chunks
+            )
+            answer = cached.answer if cached else await generate_answer_async(query, chunks)
+            verification = cached.verification if cached else None
+            
+            if self._should_verify(verification):
+                verification = await self.verifier.verify_async(answer, chunks, query)
+            
+            await loop.run_in_executor(
+                None, contextvars.copy_context().run,
+                self._store, query, chunks, key, cached, exact, answer, verification
+            )
+            s.set(verification=_status(verification))
+            return answer + self._note(verification), chunks
+    
+    def get_relevant_chunks(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[EmbeddedChunk]:
+        return retrieve_relevant_chunks(query, self.vector_store, search_filter)
+    
+    def _lookup(
+        self,
+        query: str,
+        chunks: List[EmbeddedChunk]
+    ) -> Tuple[Optional[str], Optional[CachedAnswer], bool]:
+        """
+        Find a cached answer, trying the exact cache before the semantic one.
+        
+        Returns:
+            The exact cache key (None without a cache), the entry found (or
+            None), and whether it came from the exact cache
+        """
+        key = None
+        if self.answer_cache is not None:
+            key = answer_cache_key(query, chunks)
+            cached = self.answer_cache.get(key)
+            if cached is not None:
+                current_span().set(cache="exact")
+                return key, cached, True
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.get(query, chunks)
+            current_span().set(cache="semantic" if cached is not None else "miss")
+            return key, cached, False
+        current_span().set(cache="miss" if key is not None else "off")
+        return key, None, False
+    
+    def _should_verify(self, verification: Optional[VerificationResult]) -> bool:
+        return self.enable_verification and self.verifier is not None and verification is None
+    
+    def _store(
+        self,
+        query: str,
+        chunks: List[EmbeddedChunk],
+        key: Optional[str],
+        cached: Optional[CachedAnswer],
+        exact: bool,
+        answer: str,
+        verification: Optional[VerificationResult]
+    ):
+        """Write a new answer, or a newly added verification, back to the caches."""
+        # Failed verifications are retried next time rather than cached
+        if verification is not None and verification.overall_status == "ERROR":
+            verification = None
+        verified_now = verification is not None and (cached is None or cached.verification is None)
+        
+        # Semantic hits are also saved under this exact phrasing
+        if key is not None and (not exact or verified_now):
+            self.answer_cache.put(key, answer, verification)
+        if self.semantic_cache is not None and (cached is None or verified_now):
+            self.semantic_cache.put(query, chunks, answer, verification)
+    
+    def _note(self, verification: Optional[VerificationResult]) -> str:
+        if not self.enable_verification or verification is None:
+            return ""
+        return _verification_note(verification)
+
+
+def _status(verification: Optional[VerificationResult]) -> Optional[str]:
+    return verification.overall_status if verification is not None else None
+
+
+def _verification_note(verification) -> str:
+    """Warning text appended to answers that did not fully verify."""
+    if verification.overall_status == "NOT_VERIFIED":
+        return f"\n\n⚠️ VERIFICATION WARNING: This answer may not be fully grounded in the document. Confidence: {verification.confidence_score:.0%}"
+    if verification.overall_status == "PARTIALLY_VERIFIED":
+        return f"\n\n📝 Note: Some claims could not be fully verified. Confidence: {verification.confidence_score:.0%}"
+    return ""
@@ -20,15 +20,105 @@ load_dotenv(dotenv_path=env_path)
 class Settings(BaseModel):
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     LLM_MODEL: str = "llama-3.3-70b-versatile"
+    LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")  # any OpenAI-compatible endpoint
     
     # Retrieval settings
     TOP_K: int = 3
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 100
+    CONTEXT_MAX_TOKENS: int = 3000  # prompt context budget after merging overlapping chunks; 0 for no limit
+    RETRIEVAL_ENGINE: str = "tfidf"  # "tfidf" (dense cosine) or "bm25" (inverted index)
+    
+    # Approximate nearest-neighbor settings (see app/core/retrieve/ann.py)
+    ANN_ENABLED: bool = True
+    ANN_MIN_CHUNKS: int = 50000  # smaller stores are always searched exactly
+    ANN_LISTS: int = 0  # IVF lists (k-means centroids); 0 uses sqrt(chunks)
+    ANN_PROBES: int = 16  # lists scanned per query; more is slower but closer to exact
+    ANN_TRAIN_SAMPLE: int = 32768  # chunks sampled to train the centroids
+    ANN_TRAIN_ITERATIONS: int = 10
+    ANN_RETRAIN_GROWTH: float = 4.0  # retrain once the store has grown this many times
+    
+    # Quantized embedding settings (see app/core/retrieve/quantize.py)
+    QUANTIZATION: str = ""  # "int8" (per-dimension scaled) or "pq" (product quantization); "" searches float32 only
+    QUANT_PQ_SUBSPACES: int = 0  # PQ sub-vectors (one byte each) per embedding; 0 uses one per 8 dimensions
+    QUANT_RERANK: int = 4  # re-score the best top_k * this candidates with float vectors; 0 ranks by the codes alone
+    QUANT_TRAIN_SAMPLE: int = 32768  # chunks sampled to train the PQ codebooks
+    
+    # Deletion and compaction settings (see VectorStore.delete_rows and VectorStore.compact)
+    COMPACT_DELETED_FRACTION: float = 0.25  # compact once this share of rows is deleted; 0 compacts only on save()
+    COMPACT_IN_BACKGROUND: bool = True  # compact on a background thread instead of inside the deleting call
+    
+    # Batch answering settings (see VeriLensAgent.answer_batch)
+    BATCH_MAX_CONCURRENCY: int = 8  # questions answered at once
+    
+    # PDF extraction settings
+    PDF_WORKERS: int = 0  # 0 uses one worker process per CPU
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_PARALLEL_MIN_PAGES: int = 32  # smaller PDFs are extracted in-process
+    
+    # Bulk ingestion settings (see app/core/ingest/pipeline.py)
+    INGEST_EXTRACT_WORKERS: int = 0  # 0 uses one worker process per CPU
+    INGEST_CHUNK_WORKERS: int = 2
+    INGEST_EMBED_WORKERS: int = 1
+    INGEST_FIT_CHUNKS: int = 50000  # a new store's vocabulary is fitted on the first this many chunks, then files stream through the embed workers
+    INGEST_QUEUE_SIZE: int = 32
+    
+    # Embedding settings
+    TFIDF_MAX_FEATURES: int = 512
+    TFIDF_REFIT_FRACTION: float = 0.02  # refit the vocabulary once added chunks it covers poorly reach this share of the store; 0 refits only via refit_index
+    
+    # Answer cache settings (see app/core/reason/cache.py)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 256  # in-memory LRU entries
+    ANSWER_CACHE_TTL: float = 7 * 24 * 3600.0  # seconds; 0 disables expiry
+    ANSWER_CACHE_PATH: str = ".verilens_cache/answers.sqlite3"  # "" keeps the cache in memory only
+    
+    # Semantic query cache settings (see app/core/reason/semantic_cache.py)
+    SEMANTIC_CACHE_ENABLED: bool = False  # serves answers without an LLM call; opt in once the threshold suits your queries
+    SEMANTIC_CACHE_SIZE: int = 256  # recent queries kept per agent
+    SEMANTIC_CACHE_THRESHOLD: float = 0.8  # minimum query cosine similarity; the chunk sets must also match, and negated queries only match negated ones
+    
+    # Verification settings (see app/core/verify/grounding.py)
+    VERIFY_LOCAL_FIRST: bool = True  # decide clear cases locally, calling the LLM only when ambiguous
+    GROUNDING_HIGH: float = 0.8  # local score at or above which an answer is VERIFIED
+    GROUNDING_LOW: float = 0.3  # local score below which an answer is NOT_VERIFIED
+    
+    # LLM scheduler settings (see app/core/reason/scheduler.py); 0 disables a limit
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))  # match your provider quota
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_COMPLETION_TOKENS: int = 512  # expected completion size, charged up front to the token bucket
+    LLM_ATTEMPT_TIMEOUT: float = 30.0  # seconds before a single attempt is abandoned and retried
+    LLM_HEDGING: bool = False  # send a duplicate answer request when the first is slow
+    LLM_HEDGE_PERCENTILE: float = 0.95  # hedge after this percentile of recent attempt latencies
+    LLM_HEDGE_DELAY: float = 2.0  # hedge delay until LLM_HEDGE_MIN_SAMPLES latencies are known
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    
+    # Tracing settings (see app/core/core/tracing.py)
+    TRACE_ENABLED: bool = False
+    TRACE_JSONL_PATH: str = ".verilens_cache/traces.jsonl"  # one JSON trace per query; "" disables
+    TRACE_PROMETHEUS_PATH: str = ""  # Prometheus textfile rewritten after each query; "" disables
+    TRACE_PROFILE: str = ""  # "cpu", "memory" or "cpu,memory" to profile every traced query
+    TRACE_PROFILE_DIR: str = ".verilens_cache/profiles"  # cProfile .prof files
+    
+    # HTTP server settings (see app/core/server)
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 1  # processes sharing the port and the memory-mapped index; 0 uses one per CPU
+    SERVER_INDEX_PATH: str = ".verilens_cache/server_index"
+    SERVER_MAX_CONCURRENCY: int = 64  # queries in progress per worker
+    SERVER_MAX_QUEUE: int = 256  # queries waiting per worker before new ones get 503
+    SERVER_REQUEST_TIMEOUT: float = 120.0  # seconds before a query gets 504
+    SERVER_RETRIEVAL_THREADS: int = 0  # retrieval threads per worker; 0 uses CPUs + 4 (max 32)
+    SERVER_MAX_BODY_BYTES: int = 16 * 1024 * 1024
+    SERVER_KEEPALIVE_TIMEOUT: float = 15.0  # idle seconds before a connection is closed
+    SERVER_RELOAD_INTERVAL: float = 1.0  # how often workers check for an index written by another worker
+    SERVER_INGEST_ROOT: str = ""  # directory POST /ingest may read paths from; "" accepts only uploaded text
     
     # Retry settings
     MAX_RETRIES: int = 3
     RETRY_DELAY: float = 1.0
+    RETRY_MAX_DELAY: float = 30.0  # cap on exponential backoff (Retry-After headers are honored as sent)
 
 
 settings = Settings()
@@ -0,0 +1,396 @@
+import abc
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.core.config import settings, logger
+
+# Histogram buckets (seconds) for the Prometheus exporter
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Functions and allocation sites kept in a span's profile summary
+_PROFILE_TOP = 15
+
+_current: contextvars.ContextVar = contextvars.ContextVar("verilens_span", default=None)
+_profile_request: contextvars.ContextVar = contextvars.ContextVar("verilens_profile", default=None)
+
+
+class Span:
+    """
+    One timed operation, with attributes and nested child spans.
+
+    Created by span(); a span opened while another is current becomes
+    its child, and finished root spans are handed to the exporters.
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent", "attributes", "children",
+        "start_time", "duration", "error", "_start", "_token", "_profiler"
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.attributes = attributes
+        self.children: List["Span"] = []
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._start = 0.0
+        self._token = None
+        self._profiler = None
+
+    def set(self, **attributes):
+        """Set (or overwrite) attributes."""
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: float = 1):
+        """Add to a numeric attribute, starting from 0."""
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def __enter__(self) -> "Span":
+        if self.parent is not None:
+            self.parent.children.append(self)
+        elif _profile_kinds():
+            self._profiler = _Profiler(_profile_kinds())
+        self._token = _current.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned generator)
+            _current.set(self.parent)
+        if self._profiler is not None:
+            self._profiler.stop(self)
+        if self.parent is None:
+            _export(self)
+        return False
+
+    def to_dict(self) -> dict:
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "start": round(self.start_time, 6),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+        }
+        if self.error is not None:
+            record["error"] = self.error
+        if self.children:
+            record["children"] = [child.to_dict() for child in self.children]
+        return record
+
+    def walk(self) -> Iterable["Span"]:
+        """This span and all of its descendants, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class _NoopSpan:
+    """Stand-in returned by span() while tracing is off."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, amount: float = 1):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Time a block as a span nested under the current one.
+
+    Usage:
+        with span("retrieve", engine="tfidf") as s:
+            chunks = ...
+            s.set(chunks=len(chunks))
+
+    Spans follow contextvars, so nesting works across threads started
+    with a copied context and across asyncio tasks. While tracing is
+    off (settings.TRACE_ENABLED unset, no exporters registered and no
+    profile requested) this returns a shared no-op span.
+    """
+    parent = _current.get()
+    if parent is None and not _enabled():
+        return _NOOP
+    return Span(name, parent, attributes)
+
+
+def current_span():
+    """The innermost open span, or a no-op span if there is none."""
+    current = _current.get()
+    return current if current is not None else _NOOP
+
+
+# Profiling
+
+@contextmanager
+def profiled(kinds: str = "cpu"):
+    """
+    Profile the root spans (queries) started inside this block.
+
+    Args:
+        kinds: "cpu" (cProfile), "memory" (tracemalloc) or "cpu,memory"
+    """
+    token = _profile_request.set(kinds)
+    try:
+        yield
+    finally:
+        _profile_request.reset(token)
+
+
+def _profile_kinds() -> frozenset:
+    kinds = _profile_request.get() or settings.TRACE_PROFILE
+    return frozenset(k.strip() for k in kinds.split(",") if k.strip()) if kinds else frozenset()
+
+
+# Memory-profiled spans in progress; tracemalloc is process-wide, so it runs while any is open
+_tracemalloc_users = 0
+_tracemalloc_owned = False  # started here, rather than by the application
+_tracemalloc_lock = threading.Lock()
+
+
+class _Profiler:
+    """cProfile and/or tracemalloc capture for one root span."""
+
+    def __init__(self, kinds: frozenset):
+        global _tracemalloc_users, _tracemalloc_owned
+        self.cpu = None
+        self.memory = False
+
+        if "cpu" in kinds:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self.cpu = profiler
+            except ValueError as e:  # another profiler is active on this thread
+                logger.warning(f"CPU profile skipped: {e}")
+        if "memory" in kinds:
+            with _tracemalloc_lock:
+                if not _tracemalloc_users and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_owned = True
+                _tracemalloc_users += 1
+            tracemalloc.reset_peak()
+            self.memory = True
+
+    def stop(self, root: Span):
+        """Stop capturing and attach the results to the span."""
+        global _tracemalloc_users, _tracemalloc_owned
+        if self.cpu is not None:
+            self.cpu.disable()
+        # Snapshot before formatting the CPU report so its allocations are not counted
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+            ])
+            with _tracemalloc_lock:
+                _tracemalloc_users -= 1
+                if not _tracemalloc_users and _tracemalloc_owned:
+                    tracemalloc.stop()
+                    _tracemalloc_owned = False
+            top = snapshot.statistics("lineno")[:_PROFILE_TOP]
+            root.set(
+                memory_current_kb=round(current / 1024, 1),
+                memory_peak_kb=round(peak / 1024, 1),
+                memory_top=[f"{stat.traceback[0]}: {stat.size / 1024:.1f} KiB in {stat.count} blocks" for stat in top]
+            )
+
+        if self.cpu is not None:
+            directory = Path(settings.TRACE_PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{root.name}-{root.trace_id}.prof"
+            self.cpu.dump_stats(str(path))
+
+            out = io.StringIO()
+            pstats.Stats(self.cpu, stream=out).sort_stats("cumulative").print_stats(_PROFILE_TOP)
+            root.set(profile_path=str(path), profile_top=_pstats_rows(out.getvalue()))
+
+
+def _pstats_rows(text: str) -> List[str]:
+    """The function rows of a pstats report, without its header."""
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("ncalls"):
+            return [row.strip() for row in lines[i + 1:] if row.strip()]
+    return []
+
+
+# Exporters
+
+class SpanExporter(abc.ABC):
+    """Receives every finished root span (with its children)."""
+
+    @abc.abstractmethod
+    def export(self, root: Span):
+        """Handle one finished trace."""
+
+
+class JsonLinesExporter(SpanExporter):
+    """Appends each trace to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, root: Span):
+        line = json.dumps(root.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class PrometheusExporter(SpanExporter):
+    """
+    Aggregates span durations into Prometheus histograms.
+
+    render() returns the text exposition format, for a /metrics
+    endpoint; with a path, the file is also rewritten after every trace
+    for node_exporter's textfile collector.
+    """
+
+    def __init__(self, path: Optional[str] = None, buckets=DEFAULT_BUCKETS, namespace: str = "verilens"):
+        self.path = Path(path) if path else None
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, list] = {}  # span name -> [bucket counts, count, sum]
+        self._errors: Dict[str, int] = {}
+
+    def export(self, root: Span):
+        with self._lock:
+            for s in root.walk():
+                if s.duration is None:
+                    continue
+                histogram = self._histograms.setdefault(s.name, [[0] * len(self.buckets), 0, 0.0])
+                index = bisect_left(self.buckets, s.duration)
+                if index < len(self.buckets):
+                    histogram[0][index] += 1
+                histogram[1] += 1
+                histogram[2] += s.duration
+                if s.error is not None:
+                    self._errors[s.name] = self._errors.get(s.name, 0) + 1
+        if self.path is not None:
+            self.write(self.path)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        duration = f"{self.namespace}_span_duration_seconds"
+        errors = f"{self.namespace}_span_errors_total"
+        lines = [
+            f"# HELP {duration} Time spent in each traced stage.",
+            f"# TYPE {duration} histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._histograms):
+                counts, count, total = self._histograms[name]
+                label = _label(name)
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f'{duration}_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{duration}_bucket{{span="{label}",le="+Inf"}} {count}')
+                lines.append(f'{duration}_sum{{span="{label}"}} {total:.6f}')
+                lines.append(f'{duration}_count{{span="{label}"}} {count}')
+            lines.append(f"# HELP {errors} Traced stages that raised.")
+            lines.append(f"# TYPE {errors} counter")
+            for name in sorted(self._errors):
+                lines.append(f'{errors}{{span="{_label(name)}"}} {self._errors[name]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically replace `path` with the current metrics."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_exporters: List[SpanExporter] = []
+_exporters_lock = threading.Lock()
+_configured = False
+
+
+def add_exporter(exporter: SpanExporter) -> SpanExporter:
+    """Send finished traces to `exporter` (this also turns tracing on)."""
+    with _exporters_lock:
+        _exporters.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter: SpanExporter):
+    with _exporters_lock:
+        if exporter in _exporters:
+            _exporters.remove(exporter)
+
+
+def get_exporters() -> List[SpanExporter]:
+    """Registered exporters, including those configured from settings."""
+    _configure()
+    with _exporters_lock:
+        return list(_exporters)
+
+
+def _configure():
+    """Register the exporters named in settings, once, when tracing is enabled."""
+    global _configured
+    if _configured or not settings.TRACE_ENABLED:
+        return
+    with _exporters_lock:
+        if _configured:
+            return
+        _configured = True
+        if settings.TRACE_JSONL_PATH:
+            _exporters.append(JsonLinesExporter(settings.TRACE_JSONL_PATH))
+        if settings.TRACE_PROMETHEUS_PATH:
+            _exporters.append(PrometheusExporter(settings.TRACE_PROMETHEUS_PATH))
+
+
+def _enabled() -> bool:
+    return settings.TRACE_ENABLED or bool(_exporters) or bool(_profile_kinds())
+
+
+def _export(root: Span):
+    for exporter in get_exporters():
+        try:
+            exporter.export(root)
+        except Exception as e:
+            logger.warning(f"Trace export failed ({type(exporter).__name__}): {e}")
@@ -1,7 +1,9 @@
 # Ingestion module for document loading and chunking
-from .loader import load_document
-from .pdf_loader import load_pdf
-from .chunker import chunk_document
-from .indexer import index_chunks
+from .loader import load_document, find_documents
+from .pdf_loader import load_pdf, load_pdf_document, iter_pdf_pages, pdf_page_hashes
+from .chunker import chunk_document, iter_chunks
+from .indexer import index_chunks, index_document, index_documents, refit_due, refit_index
+from .pipeline import ingest_directory, IngestStats, FileProgress
+from .refresh import refresh_pages, refresh_document, refresh_file, RefreshResult
 
-__all__ = ["load_document", "load_pdf", "chunk_document", "index_chunks"]
+__all__ = ["load_document", "find_documents", "load_pdf", "load_pdf_document", "iter_pdf_pages", "pdf_page_hashes", "chunk_document", "iter_chunks", "index_chunks", "index_document", "index_documents", "refit_due", "refit_index", "ingest_directory", "IngestStats", "FileProgress", "refresh_pages", "refresh_document", "refresh_file", "RefreshResult"]
@@ -1,14 +1,22 @@
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 from app.core.schemas.document import Document, DocumentChunk
 from app.core.core.config import settings
 
 
-def chunk_document(document: Document) -> List[DocumentChunk]:
-    chunks = []
-    text = document.content
-
-    chunk_size = settings.CHUNK_SIZE
-    overlap = settings.CHUNK_OVERLAP
+def iter_chunks(
+    text: str,
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None
+) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (start, end) character offsets of overlapping chunks.
+
+    No text is copied; callers slice the chunks they actually need.
+    """
+    if chunk_size is None:
+        chunk_size = settings.CHUNK_SIZE
+    if overlap is None:
+        overlap = settings.CHUNK_OVERLAP
     if overlap >= chunk_size:
         raise ValueError(
             f"Invalid chunk config: CHUNK_OVERLAP ({overlap}) "
@@ -16,22 +24,11 @@ def chunk_document(document: Document) -> List[DocumentChunk]:
         )
 
     start = 0
-    chunk_id = 0
     text_length = len(text)
 
     while start < text_length:
         end = min(start + chunk_size, text_length)
-        chunk_text = text[start:end]
-
-        chunks.append(
-            DocumentChunk(
-                chunk_id=chunk_id,
-                text=chunk_text,
-                source=document.source
-            )
-        )
-
-        chunk_id += 1
+        yield start, end
 
         # Move to next chunk position
         # If we've reached the end, break to avoid infinite loop
@@ -39,4 +36,14 @@ def chunk_document(document: Document) -> List[DocumentChunk]:
             break
         start = end - overlap
 
-    return chunks
+
+def chunk_document(document: Document) -> List[DocumentChunk]:
+    text = document.content
+    return [
+        DocumentChunk(
+            chunk_id=chunk_id,
+            text=text[start:end],
+            source=document.source
+        )
+        for chunk_id, (start, end) in enumerate(iter_chunks(text))
+    ]
@@ -1,27 +1,174 @@
 # app/core/ingest/indexer.py
-from app.core.retrieve.embedder import embed_texts_batch, add_to_corpus, fit_vectorizer
-from app.core.schemas.embedding import EmbeddedChunk
+import hashlib
+from typing import List, Optional, Tuple
+from app.core.ingest.chunker import iter_chunks
+from app.core.retrieve.ann import update_ann_index
+from app.core.retrieve.bm25 import update_bm25_index
+from app.core.retrieve.quantize import update_quantization
+from app.core.schemas.document import Document
+from app.core.core.config import settings
+
+
+def _embed(texts, vector_store):
+    """
+    Embed texts with the store's embedder.
+
+    The first batch indexed into a store fits the embedder. Later batches
+    keep its vocabulary, so adding stays proportional to the new text and
+    leaves the IVF and quantized indexes in place; words the vocabulary
+    lacks are dropped, and texts it covers poorly are counted towards the
+    next refit (see refit_due). Call inside
+    vector_store.writing() until the embeddings are added.
+    """
+    embedder = vector_store.embedder
+
+    # Generate all embeddings in one batch (much faster)
+    if embedder.is_fitted and len(vector_store):
+        vector_store.vocabulary_misses += embedder.count_misses(texts)
+        return embedder.transform(texts)
+    return embedder.fit_transform(texts)
+
+
+def refit_due(vector_store) -> bool:
+    """
+    Whether enough chunks missed the store's vocabulary to refit it.
+
+    True once the chunks added since the last fit whose most frequent
+    words are mostly outside the vocabulary (see
+    TfidfEmbedder.count_misses) reach settings.TFIDF_REFIT_FRACTION of
+    the live chunks. refit_index can be called at any time as well.
+    """
+    fraction = settings.TFIDF_REFIT_FRACTION
+    misses = vector_store.vocabulary_misses
+    live = len(vector_store) - vector_store.deleted_count
+    return fraction > 0 and misses > 0 and vector_store.is_sparse and misses >= fraction * live
+
+
+def refit_index(vector_store):
+    """Refit the store's vocabulary on all live chunks, re-embed them and rebuild the search indexes."""
+    with vector_store.writing():
+        if not len(vector_store):
+            return
+        vector_store.refit_embedder()
+        update_search_indexes(vector_store)
+
+
+def _finish_add(vector_store, refit: bool):
+    """After adding rows: refit if refit is set and due, else extend the search indexes."""
+    if refit and refit_due(vector_store):
+        refit_index(vector_store)
+    else:
+        update_search_indexes(vector_store)
+
+
+def update_search_indexes(vector_store):
+    """Bring the BM25, IVF and quantized indexes up to date with rows just added."""
+    if settings.RETRIEVAL_ENGINE == "bm25":
+        update_bm25_index(vector_store)
+    if settings.ANN_ENABLED:
+        update_ann_index(vector_store)
+    if settings.QUANTIZATION:
+        update_quantization(vector_store)
+
+
+def document_page_hashes(document: Document) -> List[str]:
+    """
+    Hash of each page of a document's text (the whole text is one page
+    without page_offsets). Used when the loader supplied no page_hashes.
+    """
+    starts = document.page_offsets or [0]
+    ends = starts[1:] + [len(document.content)]
+    return [
+        hashlib.sha256(document.content[start:end].encode("utf-8")).hexdigest()
+        for start, end in zip(starts, ends)
+    ]
 
 
 def index_chunks(chunks, vector_store):
     """
     Takes DocumentChunk objects, generates embeddings,
-    and stores them in the vector store as EmbeddedChunk objects.
+    and stores them in the vector store's chunk table.
+    Embeddings stay sparse: the store keeps them as one CSR matrix.
+    When the BM25 engine is selected, its inverted index is extended too;
+    large stores get their IVF (approximate search) index updated, and
+    quantized codes are kept current when settings.QUANTIZATION is set.
     """
     texts = [chunk.text for chunk in chunks]
-    
-    for text in texts:
-        add_to_corpus(text)
-    fit_vectorizer()
+    with vector_store.writing():
+        embeddings = _embed(texts, vector_store)
 
-    # Generate all embeddings in one batch (much faster)
-    embeddings = embed_texts_batch(texts)
-
-    for chunk, embedding in zip(chunks, embeddings):
-        embedded_chunk = EmbeddedChunk(
-            chunk_id=chunk.chunk_id,
-            text=chunk.text,
-            source=chunk.source,
-            embedding=embedding
-        )
-        vector_store.add(embedded_chunk)
+        # The store keeps only ids and offsets, so no EmbeddedChunk is built here
+        vector_store.add_sparse(chunks, embeddings)
+        _finish_add(vector_store, refit=True)
+
+
+def index_documents(
+    documents: List[Document],
+    vector_store,
+    offsets: Optional[List[List[Tuple[int, int]]]] = None,
+    refit: bool = True
+) -> int:
+    """
+    Chunk, embed and store whole documents without copying chunk text.
+
+    Each document's text is stored once and its chunks are kept as
+    offsets into it; chunk strings are only sliced transiently for
+    embedding. All documents are embedded in one batch, with the store's
+    current vocabulary once it is fitted (see _embed). Search indexes
+    are updated as in index_chunks. Each document's page hashes are
+    recorded, so it can later be refreshed page by page (see
+    ingest.refresh); documents are appended even if their source is
+    already indexed.
+
+    Args:
+        documents: Documents to index
+        vector_store: Store to add them to
+        offsets: Precomputed (start, end) chunk offsets per document
+        refit: Refit the vocabulary if refit_due afterwards; pass False
+            when the caller checks once after a run of additions instead
+
+    Returns:
+        The number of chunks added
+    """
+    if offsets is None:
+        offsets = [list(iter_chunks(document.content)) for document in documents]
+    if not any(offsets):
+        return 0
+
+    texts = [
+        document.content[start:end]
+        for document, doc_offsets in zip(documents, offsets)
+        for start, end in doc_offsets
+    ]
+    # Embed outside the write lock so concurrent writers overlap; a batch
+    # embedded with a vocabulary that a refit has since replaced is redone
+    embedder = vector_store.embedder
+    embeddings = misses = None
+    if embedder.is_fitted and len(vector_store):
+        embeddings, misses = embedder.transform(texts), embedder.count_misses(texts)
+    with vector_store.writing():
+        if embeddings is None or vector_store.embedder is not embedder or not len(vector_store):
+            embeddings = _embed(texts, vector_store)
+        else:
+            vector_store.vocabulary_misses += misses
+
+        row = 0
+        for document, doc_offsets in zip(documents, offsets):
+            vector_store.add_document(
+                document.content,
+                document.source,
+                doc_offsets,
+                embeddings[row:row + len(doc_offsets)],
+                metadata=document.metadata,
+                page_offsets=document.page_offsets,
+                page_hashes=document.page_hashes or document_page_hashes(document)
+            )
+            row += len(doc_offsets)
+
+        _finish_add(vector_store, refit)
+    return row
+
+
+def index_document(document: Document, vector_store) -> int:
+    """Index a single document; returns the number of chunks added."""
+    return index_documents([document], vector_store)
@@ -1,8 +1,9 @@
 from pathlib import Path
-from typing import List
+from typing import Iterable, List
 from app.core.schemas.document import Document
 
 DOCUMENT_PATHS=Path("data/documents")
+SUPPORTED_SUFFIXES=(".pdf", ".txt")
 
 def load_document()->List[Document]:
     documents=[]
@@ -18,3 +19,14 @@ def load_document()->List[Document]:
     return documents
 
 
+def find_documents(directory, suffixes: Iterable[str] = SUPPORTED_SUFFIXES, recursive: bool = True) -> List[Path]:
+    """
+    Find PDF and text files under a directory, sorted by path.
+    """
+    root=Path(directory)
+    if not root.is_dir():
+        raise NotADirectoryError(f"Not a directory: {root}")
+
+    suffixes={s.lower() for s in suffixes}
+    files=root.rglob("*") if recursive else root.glob("*")
+    return sorted(f for f in files if f.is_file() and f.suffix.lower() in suffixes)
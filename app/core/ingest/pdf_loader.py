@@ -1,10 +1,114 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 from PyPDF2 import PdfReader
+from app.core.schemas.document import Document
+from app.core.core.config import settings
 
-def load_pdf(path: str) -> str:
+
+def _extract_pages(path: str, page_numbers: Sequence[int]) -> List[Tuple[int, str]]:
+    """Extract the given 1-based pages in a worker process."""
     reader = PdfReader(path)
-    text = ""
+    return [(number, reader.pages[number - 1].extract_text() or "") for number in page_numbers]
+
+
+def iter_pdf_pages(
+    path: str,
+    workers: Optional[int] = None,
+    ordered: bool = False,
+    pages: Optional[Sequence[int]] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) pairs as pages are extracted.
+
+    Page ranges are extracted in a process pool, so downstream work can
+    start on the first pages while later ones are still being parsed.
+    Small PDFs are extracted in-process.
+
+    Args:
+        path: Path to the PDF file
+        workers: Worker processes (defaults to settings.PDF_WORKERS, or the CPU count)
+        ordered: Yield pages in page order instead of completion order
+        pages: Only extract these 1-based page numbers (defaults to all)
+
+    Yields:
+        Tuples of 1-based page number and extracted text
+    """
+    num_pages = len(PdfReader(path).pages)
+    numbers = list(range(1, num_pages + 1)) if pages is None else sorted(set(pages))
+    if workers is None:
+        workers = settings.PDF_WORKERS or os.cpu_count() or 1
+
+    if workers <= 1 or len(numbers) < settings.PDF_PARALLEL_MIN_PAGES:
+        yield from _extract_pages(path, numbers)
+        return
+
+    per_task = settings.PDF_PAGES_PER_TASK
+    tasks = [numbers[i:i + per_task] for i in range(0, len(numbers), per_task)]
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+    try:
+        futures = [executor.submit(_extract_pages, path, task) for task in tasks]
+
+        if not ordered:
+            for future in as_completed(futures):
+                yield from future.result()
+            return
+
+        # Buffer out-of-order pages until the next expected one arrives
+        pending: Dict[int, str] = {}
+        expected = iter(numbers)
+        next_page = next(expected, None)
+        for future in as_completed(futures):
+            pending.update(future.result())
+            while next_page in pending:
+                yield next_page, pending.pop(next_page)
+                next_page = next(expected, None)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def load_pdf(path: str, workers: Optional[int] = None) -> str:
+    pages = sorted(iter_pdf_pages(path, workers=workers))
+    return "".join(text for _, text in pages)
+
+
+def pdf_page_hashes(path: str) -> List[str]:
+    """
+    Hash every page's content stream, without extracting any text.
+
+    Decoding the streams is much cheaper than text extraction, so an
+    edited PDF can be compared with its indexed copy page by page and
+    only the changed pages extracted (see ingest.refresh).
+    """
+    hashes = []
+    for page in PdfReader(path).pages:
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+        hashes.append(hashlib.sha256(data).hexdigest())
+    return hashes
+
 
-    for page in reader.pages:
-        text += page.extract_text() or ""
+def load_pdf_document(path: str, source: Optional[str] = None, workers: Optional[int] = None) -> Document:
+    """
+    Load a PDF as a Document that records where each page starts,
+    so its chunks can be filtered by page (see SearchFilter.pages),
+    and each page's hash (see pdf_page_hashes).
 
-    return text
+    Args:
+        path: PDF file
+        source: Document name (defaults to the file name)
+        workers: Extraction processes (see iter_pdf_pages)
+    """
+    pages = sorted(iter_pdf_pages(path, workers=workers))
+    page_offsets, position = [], 0
+    for _, text in pages:
+        page_offsets.append(position)
+        position += len(text)
+    return Document(
+        content="".join(text for _, text in pages),
+        source=source or Path(path).name,
+        page_offsets=page_offsets,
+        page_hashes=pdf_page_hashes(path)
+    )
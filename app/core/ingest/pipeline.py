@@ -0,0 +1,342 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from pydantic import BaseModel
+from app.core.ingest.chunker import iter_chunks
+from app.core.ingest.indexer import index_documents, refit_due, refit_index
+from app.core.ingest.loader import find_documents
+from app.core.ingest.pdf_loader import load_pdf_document
+from app.core.ingest.refresh import extract_changes, refresh_pages
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.document import Document
+from app.core.core.config import settings, logger
+
+# Marks the end of a stage's input queue
+_DONE = object()
+
+STAGES = ("extract", "chunk", "embed")
+
+
+class FileProgress(BaseModel):
+    path: str
+    source: str
+    status: str = "pending"  # pending/extracted/chunked/indexed/updated/unchanged/empty/failed
+    characters: int = 0
+    chunks: int = 0
+    chunks_deleted: int = 0  # old chunks an update replaced
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class IngestStats:
+    """
+    Progress and throughput counters for a bulk ingestion run.
+
+    Updated concurrently by the pipeline stages; read at any time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files: Dict[str, FileProgress] = {}
+        self.stage_seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def _update(self, source: str, **fields):
+        with self._lock:
+            progress = self.files[source]
+            for name, value in fields.items():
+                setattr(progress, name, value)
+            return progress.model_copy()
+
+    def _add_stage_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    def count(self, status: str) -> int:
+        """Number of files currently in the given status."""
+        with self._lock:
+            return sum(1 for f in self.files.values() if f.status == status)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def total_chunks(self) -> int:
+        with self._lock:
+            return sum(f.chunks for f in self.files.values() if f.status in ("indexed", "updated"))
+
+    @property
+    def total_chunks_deleted(self) -> int:
+        with self._lock:
+            return sum(f.chunks_deleted for f in self.files.values())
+
+    @property
+    def total_characters(self) -> int:
+        with self._lock:
+            return sum(f.characters for f in self.files.values() if f.status in ("indexed", "updated"))
+
+    def summary(self) -> dict:
+        """Totals and per-second throughput as a plain dict."""
+        elapsed = self.elapsed or 1e-9
+        indexed = self.count("indexed") + self.count("updated")
+        return {
+            "files": len(self.files),
+            "indexed": self.count("indexed"),
+            "updated": self.count("updated"),
+            "unchanged": self.count("unchanged"),
+            "empty": self.count("empty"),
+            "failed": self.count("failed"),
+            "chunks": self.total_chunks,
+            "chunks_deleted": self.total_chunks_deleted,
+            "characters": self.total_characters,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "files_per_second": round(indexed / elapsed, 2),
+            "chunks_per_second": round(self.total_chunks / elapsed, 2),
+            "characters_per_second": round(self.total_characters / elapsed, 2),
+            "stage_seconds": {k: round(v, 3) for k, v in self.stage_seconds.items()},
+        }
+
+
+class _PageChanges(NamedTuple):
+    """A file the store already holds: its page hashes and changed pages, for refresh_pages."""
+    source: str
+    page_hashes: List[str]
+    page_texts: Dict[int, str]
+
+
+def _extract_file(path: str, source: str) -> Document:
+    """Extract a file as a Document (with page offsets for PDFs); runs in a worker process."""
+    if path.lower().endswith(".pdf"):
+        # Files are already spread over processes, so don't nest a pool
+        return load_pdf_document(path, source, workers=1)
+    return Document(content=Path(path).read_text(encoding="utf-8", errors="replace"), source=source)
+
+
+def ingest_directory(
+    directory: str,
+    vector_store: Optional[VectorStore] = None,
+    extract_workers: Optional[int] = None,
+    chunk_workers: Optional[int] = None,
+    embed_workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    on_progress: Optional[Callable[[FileProgress], None]] = None
+) -> Tuple[VectorStore, IngestStats]:
+    """
+    Index every PDF and text file under a directory into one store.
+
+    Files flow through three stages: extract -> chunk -> embed. Each stage
+    has its own pool of workers, and stages are connected by bounded
+    queues so a fast stage cannot run arbitrarily far ahead of a slow one.
+    Text extraction runs in a process pool. Chunk sources are paths
+    relative to the directory.
+
+    TF-IDF weights depend on the corpus, so when the store's embedder is
+    not fitted yet the embed stage collects files until it holds
+    settings.INGEST_FIT_CHUNKS chunks (or the run ends), fits the
+    vocabulary on them and indexes them in one batch. After that, and
+    from the start with an already fitted store, each file is embedded
+    with the current vocabulary as soon as it is chunked, by up to
+    embed_workers threads at once; the vocabulary is refit on the whole
+    store once at the end only if enough new chunks missed it (see
+    indexer.refit_due). Files whose source such a store already holds are
+    refreshed instead (see ingest.refresh): the extract stage hashes their
+    pages and extracts only the changed ones, unchanged files are skipped,
+    and the embed stage re-indexes just the changed pages.
+
+    Args:
+        directory: Directory to search recursively
+        vector_store: Store to add to (a new one is created if omitted)
+        extract_workers: Extraction processes (defaults to settings)
+        chunk_workers: Chunking threads (defaults to settings)
+        embed_workers: Embedding threads (defaults to settings)
+        queue_size: Capacity of each inter-stage queue (defaults to settings)
+        on_progress: Called with a FileProgress whenever a file finishes
+
+    Returns:
+        The vector store and the run's IngestStats
+    """
+    if vector_store is None:
+        vector_store = VectorStore()
+    extract_workers = extract_workers or settings.INGEST_EXTRACT_WORKERS or os.cpu_count() or 1
+    chunk_workers = chunk_workers or settings.INGEST_CHUNK_WORKERS
+    embed_workers = embed_workers or settings.INGEST_EMBED_WORKERS
+    queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+
+    root = Path(directory)
+    stats = IngestStats()
+    path_queue: queue.Queue = queue.Queue()
+    text_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    chunk_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    for path in find_documents(root):
+        source = path.relative_to(root).as_posix()
+        stats.files[source] = FileProgress(path=str(path), source=source)
+        path_queue.put((str(path), source))
+
+    # Files are held back until the vocabulary is fitted on the first of them
+    fitting = not (vector_store.embedder.is_fitted and len(vector_store))
+    buffered: List[Tuple[Document, List[Tuple[int, int]]]] = []
+    buffered_chunks = 0
+    buffer_lock = threading.Lock()
+
+    def finish(source: str, **fields):
+        progress = stats._update(source, seconds=stats.elapsed, **fields)
+        if on_progress is not None:
+            on_progress(progress)
+
+    def index_buffered():
+        """Fit the vocabulary on the held-back files and index them in one batch; caller holds buffer_lock."""
+        nonlocal fitting, buffered_chunks
+        batch = sorted(buffered, key=lambda item: item[0].source)
+        buffered.clear()
+        buffered_chunks = 0
+        fitting = False
+        start = time.perf_counter()
+        try:
+            index_documents([d for d, _ in batch], vector_store, [o for _, o in batch], refit=False)
+        except Exception as e:
+            logger.error(f"Failed to index {directory}: {e}")
+            for document, _ in batch:
+                finish(document.source, status="failed", error=str(e))
+        else:
+            for document, _ in batch:
+                finish(document.source, status="indexed")
+        finally:
+            stats._add_stage_time("embed", time.perf_counter() - start)
+
+    def extract_worker(pool: ProcessPoolExecutor):
+        while True:
+            item = path_queue.get()
+            if item is _DONE:
+                return
+            path, source = item
+            texts = vector_store.chunks.texts
+            records = texts.pages(source)
+            indexed = not fitting and (records is not None or len(texts.docs_for_sources([source])) > 0)
+            start = time.perf_counter()
+            try:
+                if indexed:
+                    page_hashes, page_texts = pool.submit(extract_changes, path, records, 1).result()
+                else:
+                    document = pool.submit(_extract_file, path, source).result()
+            except Exception as e:
+                logger.error(f"Failed to extract {path}: {e}")
+                finish(source, status="failed", error=str(e))
+                continue
+            finally:
+                stats._add_stage_time("extract", time.perf_counter() - start)
+
+            if indexed:
+                if records is not None and page_hashes == [record.hash for record in records]:
+                    finish(source, status="unchanged")
+                    continue
+                # Already chunked by refresh_pages, so skip the chunk stage
+                stats._update(source, status="extracted", characters=sum(map(len, page_texts.values())))
+                chunk_queue.put(_PageChanges(source, page_hashes, page_texts))
+                continue
+            if not document.content.strip():
+                finish(source, status="empty")
+                continue
+            stats._update(source, status="extracted", characters=len(document.content))
+            text_queue.put(document)
+
+    def chunk_worker():
+        while True:
+            document = text_queue.get()
+            if document is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                offsets = list(iter_chunks(document.content))
+            except Exception as e:
+                finish(document.source, status="failed", error=str(e))
+                continue
+            finally:
+                stats._add_stage_time("chunk", time.perf_counter() - start)
+            stats._update(document.source, status="chunked", chunks=len(offsets))
+            chunk_queue.put((document, offsets))
+
+    def embed_worker():
+        nonlocal buffered_chunks
+        while True:
+            item = chunk_queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _PageChanges):
+                start = time.perf_counter()
+                try:
+                    result = refresh_pages(vector_store, item.source, item.page_hashes, item.page_texts)
+                except Exception as e:
+                    finish(item.source, status="failed", error=str(e))
+                    continue
+                finally:
+                    stats._add_stage_time("embed", time.perf_counter() - start)
+                finish(item.source, status="updated", chunks=result.chunks_added, chunks_deleted=result.chunks_deleted)
+                continue
+
+            document, offsets = item
+            if fitting:
+                # Other embed workers wait here while the vocabulary is fitted
+                with buffer_lock:
+                    if fitting:
+                        buffered.append(item)
+                        buffered_chunks += len(offsets)
+                        if buffered_chunks >= settings.INGEST_FIT_CHUNKS:
+                            index_buffered()
+                        continue
+
+            start = time.perf_counter()
+            try:
+                index_documents([document], vector_store, [offsets], refit=False)
+            except Exception as e:
+                finish(document.source, status="failed", error=str(e))
+                continue
+            finally:
+                stats._add_stage_time("embed", time.perf_counter() - start)
+            finish(document.source, status="indexed")
+
+    def run_stage(target, count: int, *args) -> List[threading.Thread]:
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    with ProcessPoolExecutor(max_workers=extract_workers) as pool:
+        extractors = run_stage(extract_worker, extract_workers, pool)
+        chunkers = run_stage(chunk_worker, chunk_workers)
+        embedders = run_stage(embed_worker, embed_workers)
+
+        # Shut the stages down in order, one sentinel per downstream worker
+        for _ in extractors:
+            path_queue.put(_DONE)
+        for thread in extractors:
+            thread.join()
+        for _ in chunkers:
+            text_queue.put(_DONE)
+        for thread in chunkers:
+            thread.join()
+        for _ in embedders:
+            chunk_queue.put(_DONE)
+        for thread in embedders:
+            thread.join()
+
+    if buffered:
+        index_buffered()
+    if refit_due(vector_store):
+        start = time.perf_counter()
+        try:
+            refit_index(vector_store)
+        except Exception as e:
+            logger.error(f"Failed to refit the vocabulary of {directory}: {e}")
+        finally:
+            stats._add_stage_time("embed", time.perf_counter() - start)
+
+    stats.finished = time.perf_counter()
+    return vector_store, stats
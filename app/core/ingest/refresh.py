@@ -0,0 +1,377 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from pydantic import BaseModel
+from app.core.ingest.chunker import iter_chunks
+from app.core.ingest.indexer import _embed, _finish_add, document_page_hashes
+from app.core.ingest.pdf_loader import iter_pdf_pages, pdf_page_hashes
+from app.core.retrieve.text_store import PageRecord
+from app.core.schemas.document import Document
+
+
+class RefreshResult(BaseModel):
+    source: str
+    pages: int = 0
+    changed_pages: int = 0  # including pages that were removed
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+
+
+def changed_pages(vector_store, source: str, page_hashes: Sequence[str]) -> List[int]:
+    """
+    0-based indices of the pages whose hash differs from the indexed one.
+
+    Every page counts as changed if the source was never indexed page by
+    page (or not at all).
+    """
+    records = vector_store.chunks.texts.pages(source)
+    if records is None:
+        return list(range(len(page_hashes)))
+    return [i for i, page_hash in enumerate(page_hashes) if i >= len(records) or records[i].hash != page_hash]
+
+
+def refresh_pages(
+    vector_store,
+    source: str,
+    page_hashes: Sequence[str],
+    page_texts: Dict[int, str],
+    metadata: Optional[dict] = None,
+    refit: bool = False
+) -> RefreshResult:
+    """
+    Bring one source up to date given its current page hashes.
+
+    Pages whose hash matches the indexed one keep their chunks. The
+    chunks touching each run of changed pages are deleted, and the text
+    they covered (the changed pages, plus the ends of the neighbouring
+    pages that shared a chunk with them, read from the store rather than
+    re-extracted) is re-chunked and re-embedded as a new document. Pages
+    past the new page count are deleted. Extraction and chunking are
+    proportional to the size of the edit, not of the document: new
+    chunks are embedded with the store's current vocabulary, and the IVF
+    and quantized indexes are extended rather than rebuilt. Refitting the
+    vocabulary costs a pass over the whole store, so it is left to
+    indexer.refit_index unless refit is set. A source that was indexed
+    without page records is replaced whole.
+
+    Args:
+        vector_store: Store holding the source
+        source: Document name
+        page_hashes: Hash of every current page, in order
+        page_texts: Text of (at least) every changed page, by 0-based index
+        metadata: Metadata for the new chunks (defaults to the source's latest)
+        refit: Also refit the store's vocabulary if indexer.refit_due
+            says enough new chunks missed it
+
+    Returns:
+        What changed
+    """
+    with vector_store.writing():
+        chunks = vector_store.chunks
+        texts = chunks.texts
+        size = len(vector_store)
+        records = texts.pages(source)
+        source_rows = chunks.rows_for_docs(texts.docs_for_sources([source]), size)
+
+        changed = set(changed_pages(vector_store, source, page_hashes))
+        if records is not None:
+            changed.update(range(len(page_hashes), len(records)))
+        result = RefreshResult(source=source, pages=len(page_hashes), changed_pages=len(changed))
+        if not changed:
+            return result
+
+        layout = _Layout(vector_store, records or [])
+        regions = _regions(layout, changed)
+        if records is None:
+            # Copies indexed without page records can't be diffed; replace them
+            stale = source_rows
+        else:
+            stale = np.unique(np.concatenate([rows for _, _, rows in regions]))
+
+        # One document per region; each page's record keeps the parts of its
+        # segments outside the region around its new one, which refers to
+        # the region's document as -1 - region until that is added (two
+        # regions can each take part of one page)
+        documents, new_records = [], list(records or [])[:len(page_hashes)]
+        new_records += [PageRecord(page_hash, ()) for page_hash in page_hashes[len(new_records):]]
+        for region, (lo, hi, _) in enumerate(regions):
+            pages = layout.pages(lo, hi, changed, len(page_hashes))
+            pieces, page_offsets, position = [], [0] * (pages[0] if pages else 0), 0
+            for page in pages:
+                if page in changed:
+                    if page not in page_texts:
+                        raise ValueError(f"Page {page + 1} of {source} changed but its text was not given")
+                    text, before, after = page_texts[page], (), ()
+                else:
+                    segments = new_records[page].segments
+                    start, end = layout.page_range(page)
+                    cut_lo, cut_hi = min(max(lo - start, 0), end - start), min(max(hi - start, 0), end - start)
+                    text = "".join(texts.slice(*segment) for segment in _clip(segments, cut_lo, cut_hi))
+                    before, after = _clip(segments, 0, cut_lo), _clip(segments, cut_hi, end - start)
+                middle = ((-1 - region, position, position + len(text)),) if text else ()
+                new_records[page] = PageRecord(page_hashes[page], before + middle + after)
+                pieces.append(text)
+                page_offsets.append(position)
+                position += len(text)
+            documents.append(("".join(pieces), page_offsets))
+
+        if metadata is None and len(source_rows):
+            metadata = texts.metadata(int(chunks.doc_id[source_rows[-1]]))
+        offsets = [list(iter_chunks(content)) for content, _ in documents]
+        embeddings = _embed(
+            [content[start:end] for (content, _), doc_offsets in zip(documents, offsets) for start, end in doc_offsets],
+            vector_store
+        ) if any(offsets) else None
+
+        row, doc_ids = 0, []
+        chunk_id = int(chunks.chunk_id[source_rows].max()) + 1 if len(source_rows) else 0
+        for (content, page_offsets), doc_offsets in zip(documents, offsets):
+            doc_ids.append(vector_store.add_document(
+                content,
+                source,
+                doc_offsets,
+                embeddings[row:row + len(doc_offsets)],
+                metadata=metadata,
+                page_offsets=page_offsets,
+                first_chunk_id=chunk_id
+            ) if content else -1)
+            row += len(doc_offsets)
+            chunk_id += len(doc_offsets)
+        new_records = [
+            PageRecord(record.hash, tuple(
+                (doc_ids[-1 - doc_id] if doc_id < 0 else doc_id, start, end) for doc_id, start, end in record.segments
+            ))
+            for record in new_records
+        ]
+
+        texts.set_pages(source, new_records)
+        result.chunks_deleted = vector_store.delete_rows(stale)
+        result.chunks_added = row
+        if row:
+            _finish_add(vector_store, refit)
+    return result
+
+
+def refresh_document(document: Document, vector_store, refit: bool = False) -> RefreshResult:
+    """
+    Re-index a new version of a document, touching only its changed pages.
+
+    Pages are compared by document.page_hashes, or by hashes of the page
+    texts when the loader supplied none (see refresh_pages, also for refit).
+    """
+    page_hashes = document.page_hashes or document_page_hashes(document)
+    starts = document.page_offsets or [0]
+    ends = starts[1:] + [len(document.content)]
+    page_texts = {
+        page: document.content[starts[page]:ends[page]]
+        for page in changed_pages(vector_store, document.source, page_hashes)
+    }
+    return refresh_pages(vector_store, document.source, page_hashes, page_texts, document.metadata or None, refit)
+
+
+def refresh_file(
+    path: str,
+    vector_store,
+    source: Optional[str] = None,
+    workers: Optional[int] = None,
+    metadata: Optional[dict] = None,
+    refit: bool = False
+) -> RefreshResult:
+    """
+    Re-index a PDF or text file, extracting and embedding only the pages that changed.
+
+    PDF page content streams are hashed first (see pdf_page_hashes);
+    text is extracted from the changed pages only. A text file is one
+    page. A file the store does not hold yet is indexed whole.
+
+    Args:
+        path: PDF or text file
+        vector_store: Store to update
+        source: Document name (defaults to the file name)
+        workers: Extraction processes (see iter_pdf_pages)
+        metadata: Metadata for the new chunks (defaults to the source's latest)
+        refit: Refit the store's vocabulary (see refresh_pages)
+    """
+    source = source or Path(path).name
+    page_hashes, page_texts = extract_changes(path, vector_store.chunks.texts.pages(source), workers)
+    return refresh_pages(vector_store, source, page_hashes, page_texts, metadata, refit)
+
+
+def extract_changes(
+    path: str,
+    records: Optional[List[PageRecord]],
+    workers: Optional[int] = None
+) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Hash a PDF or text file's pages and extract the ones that differ from records.
+
+    Text files are one page. Picklable, so bulk ingestion runs it in a
+    worker process.
+
+    Returns:
+        Every page's hash, and the text of each changed page by 0-based index
+    """
+    if not path.lower().endswith(".pdf"):
+        text = Path(path).read_text(encoding="utf-8", errors="replace")
+        page_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        unchanged = records is not None and len(records) == 1 and records[0].hash == page_hash
+        return [page_hash], {} if unchanged else {0: text}
+
+    page_hashes = pdf_page_hashes(path)
+    changed = [
+        i for i, page_hash in enumerate(page_hashes)
+        if records is None or i >= len(records) or records[i].hash != page_hash
+    ]
+    if not changed:
+        return page_hashes, {}
+    pages = iter_pdf_pages(path, workers=workers, pages=[i + 1 for i in changed])
+    return page_hashes, {number - 1: text for number, text in pages}
+
+
+class _Layout:
+    """
+    A source's indexed text as one sequence: its pages' texts, as last
+    indexed, back to back. Positions are offsets into that sequence.
+    """
+
+    def __init__(self, vector_store, records: List[PageRecord]):
+        self.chunks = vector_store.chunks
+        self.size = len(vector_store)
+        self.deleted = vector_store.deleted_mask()
+        self.records = records
+        self.starts = np.cumsum([0] + [_length(record.segments) for record in records]).astype(np.int64)
+        self.total = int(self.starts[-1])
+
+        # (doc start, doc end, position) of every segment, by document
+        by_doc: Dict[int, List[Tuple[int, int, int]]] = {}
+        for page, record in enumerate(records):
+            position = int(self.starts[page])
+            for doc_id, start, end in record.segments:
+                by_doc.setdefault(doc_id, []).append((start, end, position))
+                position += end - start
+        self._segments = {doc_id: np.array(segments, dtype=np.int64) for doc_id, segments in by_doc.items()}
+
+    def page_range(self, page: int) -> Tuple[int, int]:
+        """Positions of a page's text (pages past the old last one are empty, at the end)."""
+        if page >= len(self.records):
+            return self.total, self.total
+        return int(self.starts[page]), int(self.starts[page + 1])
+
+    def pages(self, lo: int, hi: int, changed: Set[int], count: int) -> List[int]:
+        """The pages (of the first count) region lo..hi re-indexes: those with text in it, and changed ones within it."""
+        pages = []
+        for page in range(max(int(np.searchsorted(self.starts, lo, side="left")) - 1, 0), count):
+            start, end = self.page_range(page)
+            if start > hi:
+                break
+            if start < hi and end > lo or (page in changed and lo <= start and end <= hi):
+                pages.append(page)
+        return list(range(pages[0], pages[-1] + 1)) if pages else []
+
+    def rows(self, lo: int, hi: int) -> np.ndarray:
+        """Live rows whose chunks cover any of the characters lo..hi."""
+        parts = [np.empty(0, dtype=np.int64)]
+        page = max(int(np.searchsorted(self.starts, lo, side="right")) - 1, 0)
+        while page < len(self.records) and self.starts[page] < hi:
+            start = int(self.starts[page])
+            for doc_id, a, b in _clip(self.records[page].segments, lo - start, hi - start):
+                parts.append(self.chunks.rows_in_range(doc_id, a, b, self.size))
+            page += 1
+        rows = np.unique(np.concatenate(parts))
+        return rows if self.deleted is None else rows[~self.deleted[rows]]
+
+    def spans(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """First and end position of the text each row covers."""
+        first = np.full(len(rows), self.total, dtype=np.int64)
+        last = np.zeros(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows.tolist()):
+            segments = self._segments.get(int(self.chunks.doc_id[row]))
+            if segments is None:
+                continue
+            start, end = int(self.chunks.start[row]), int(self.chunks.end[row])
+            hit = (segments[:, 0] < end) & (segments[:, 1] > start)
+            if hit.any():
+                doc_start, doc_end, position = segments[hit].T
+                first[i] = (np.maximum(doc_start, start) - doc_start + position).min()
+                last[i] = (np.minimum(doc_end, end) - doc_start + position).max()
+        return first, last
+
+
+def _regions(layout: _Layout, changed: Set[int]) -> List[Tuple[int, int, np.ndarray]]:
+    """
+    Group changed pages into (lo, hi, rows) regions to re-index.
+
+    A region starts as a run of consecutive changed pages and grows
+    until its rows (the live chunks touching changed text or lying
+    within the region) cover nothing outside it, and a surviving chunk
+    spans each of its ends, so no text is left uncovered and text split
+    between the region's new document and its neighbours still shares a
+    chunk. Regions that meet are merged.
+    """
+    ranges = [layout.page_range(page) for page in sorted(changed)]
+    changed_rows = np.unique(np.concatenate([layout.rows(a, b) for a, b in ranges]))
+
+    def bridged(position: int, stale: np.ndarray) -> bool:
+        """Whether a surviving chunk covers the characters on both sides of position."""
+        rows = layout.rows(position - 1, position + 1)
+        rows = rows[~np.isin(rows, stale) & ~np.isin(rows, changed_rows)]
+        first, last = layout.spans(rows)
+        return bool(((first < position) & (last > position)).any())
+
+    def expand(lo: int, hi: int) -> Tuple[int, int, np.ndarray]:
+        while True:
+            rows = layout.rows(lo, hi)
+            first, last = layout.spans(rows)
+            is_stale = np.isin(rows, changed_rows) | ((first >= lo) & (last <= hi))
+            stale = rows[is_stale]
+            new_lo = min(lo, int(first[is_stale].min())) if len(stale) else lo
+            new_hi = max(hi, int(last[is_stale].max())) if len(stale) else hi
+
+            if new_lo > 0 and not bridged(new_lo, stale):
+                cover, _ = layout.spans(layout.rows(new_lo - 1, new_lo))
+                new_lo = int(cover.min()) if len(cover) else new_lo
+            if new_hi < layout.total and not bridged(new_hi, stale):
+                _, cover = layout.spans(layout.rows(new_hi, new_hi + 1))
+                new_hi = int(cover.max()) if len(cover) else new_hi
+            # Changed pages are re-indexed whole
+            for a, b in ranges:
+                if a < new_lo < b:
+                    new_lo = a
+                if a < new_hi < b:
+                    new_hi = b
+
+            if (new_lo, new_hi) == (lo, hi):
+                return lo, hi, stale
+            lo, hi = new_lo, new_hi
+
+    runs = []
+    for page in sorted(changed):
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+
+    regions: List[Tuple[int, int, np.ndarray]] = []
+    for first, last in runs:
+        region = expand(layout.page_range(first)[0], layout.page_range(last)[1])
+        while regions and region[0] <= regions[-1][1]:
+            previous = regions.pop()
+            region = expand(min(previous[0], region[0]), max(previous[1], region[1]))
+        regions.append(region)
+    return regions
+
+
+def _length(segments: Tuple[Tuple[int, int, int], ...]) -> int:
+    return sum(end - start for _, start, end in segments)
+
+
+def _clip(segments: Tuple[Tuple[int, int, int], ...], lo: int, hi: int) -> Tuple[Tuple[int, int, int], ...]:
+    """The parts of a page's segments holding its characters lo..hi."""
+    clipped, position = [], 0
+    for doc_id, start, end in segments:
+        a, b = max(lo - position, 0), min(hi - position, end - start)
+        if a < b:
+            clipped.append((doc_id, start + a, start + b))
+        position += end - start
+    return tuple(clipped)
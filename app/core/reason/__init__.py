@@ -1,5 +1,26 @@
 # Reasoning module for answer generation
-from .generator import generate_answer
+from .generator import generate_answer, generate_answer_async, generate_answer_stream
+from .cache import AnswerCache, CachedAnswer, answer_cache_key, get_answer_cache
+from .semantic_cache import SemanticQueryCache
+from .scheduler import LLMScheduler, PRIORITY_ANSWER, PRIORITY_VERIFY, get_scheduler
+from .context import ContextSpan, estimate_text_tokens, pack_context
 from .prompt import SYSTEM_PROMPT
 
-__all__ = ["generate_answer", "SYSTEM_PROMPT"]
+__all__ = [
+    "generate_answer",
+    "generate_answer_async",
+    "generate_answer_stream",
+    "AnswerCache",
+    "CachedAnswer",
+    "answer_cache_key",
+    "get_answer_cache",
+    "SemanticQueryCache",
+    "LLMScheduler",
+    "PRIORITY_ANSWER",
+    "PRIORITY_VERIFY",
+    "get_scheduler",
+    "ContextSpan",
+    "estimate_text_tokens",
+    "pack_context",
+    "SYSTEM_PROMPT",
+]
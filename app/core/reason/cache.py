@@ -0,0 +1,220 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+from pydantic import BaseModel
+from app.core.reason.prompt import SYSTEM_PROMPT
+from app.core.core.config import settings, logger
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.verify.base import VerificationResult
+
+
+class CachedAnswer(BaseModel):
+    answer: str
+    verification: Optional[VerificationResult] = None
+    created: float
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivial variants share an entry."""
+    return " ".join(query.lower().split())
+
+
+def answer_cache_key(query: str, chunks: List[EmbeddedChunk]) -> str:
+    """
+    Cache key for an answer to a query over the given retrieved chunks.
+
+    Combines the normalized query, each chunk's source, id and content
+    hash, the model name and a hash of the system prompt, so re-indexing
+    a document or changing the prompt or model never serves stale answers.
+    """
+    key = {
+        "query": normalize_query(query),
+        "chunks": _chunk_fingerprints(chunks),
+        "model": settings.LLM_MODEL,
+        "prompt": hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def chunk_set_key(chunks: List[EmbeddedChunk]) -> str:
+    """
+    Key for the set of retrieved chunks alone, ignoring their order.
+
+    Like answer_cache_key it includes the model and prompt hashes, so
+    answers keyed by it are invalidated the same way.
+    """
+    key = {
+        "chunks": sorted(_chunk_fingerprints(chunks)),
+        "model": settings.LLM_MODEL,
+        "prompt": hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def _chunk_fingerprints(chunks: List[EmbeddedChunk]) -> List[list]:
+    return [
+        [c.source, c.chunk_id, hashlib.sha256(c.text.encode("utf-8")).hexdigest()]
+        for c in chunks
+    ]
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache: an in-memory LRU in front of a SQLite file.
+
+    Memory entries are evicted least-recently-used once there are more
+    than max_entries; entries in both tiers expire after ttl seconds.
+    Disk hits are promoted into memory. Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        """
+        Args:
+            path: SQLite file (defaults to settings.ANSWER_CACHE_PATH; "" for memory only)
+            max_entries: In-memory capacity (defaults to settings.ANSWER_CACHE_SIZE)
+            ttl: Entry lifetime in seconds, 0 for no expiry (defaults to settings.ANSWER_CACHE_TTL)
+        """
+        self.path = settings.ANSWER_CACHE_PATH if path is None else path
+        self.max_entries = settings.ANSWER_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path:
+            try:
+                self._db = _open_database(self.path)
+                self._prune()
+            except sqlite3.Error as e:
+                logger.warning(f"Answer cache disk store unavailable, using memory only: {e}")
+                self._db = None
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return bool(self.ttl) and time.time() - entry.created > self.ttl
+
+    def _remember(self, key: str, entry: CachedAnswer):
+        """Insert into the memory tier; caller holds the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        if self._db is None or not self.ttl:
+            return
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        """Look up an entry, checking memory first and then disk."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry
+                del self._memory[key]
+
+            entry = self._read(key)
+            if entry is None or self._expired(entry):
+                self.misses += 1
+                return None
+
+            self._remember(key, entry)
+            self.disk_hits += 1
+            return entry
+
+    def put(self, key: str, answer: str, verification: Optional[VerificationResult] = None):
+        """Store an answer (and its verification, if any) in both tiers."""
+        entry = CachedAnswer(answer=answer, verification=verification, created=time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is None:
+                return
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO answers (key, created, entry) VALUES (?, ?, ?)",
+                        (key, entry.created, entry.model_dump_json())
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write answer cache entry: {e}")
+
+    def _read(self, key: str) -> Optional[CachedAnswer]:
+        """Read an entry from disk; caller holds the lock."""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT entry FROM answers WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read answer cache entry: {e}")
+            return None
+        if row is None:
+            return None
+        return CachedAnswer.model_validate_json(row[0])
+
+    def clear(self):
+        """Drop every entry from both tiers (counters are kept)."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM answers")
+
+    def stats(self) -> dict:
+        """Hit/miss counters as a plain dict."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def __len__(self) -> int:
+        """Number of entries in the memory tier."""
+        return len(self._memory)
+
+
+def _open_database(path: str) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    # Server worker processes share the file; WAL lets them read while one writes
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS answers "
+        "(key TEXT PRIMARY KEY, created REAL NOT NULL, entry TEXT NOT NULL)"
+    )
+    db.commit()
+    return db
+
+
+_default_cache: Optional[AnswerCache] = None
+_default_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Return the process-wide answer cache, creating it on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AnswerCache()
+        return _default_cache
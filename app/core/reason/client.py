@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import weakref
+from typing import Optional
+from openai import AsyncOpenAI, OpenAI
+from app.core.core.config import settings
+
+# Retries are handled by the LLM scheduler (app/core/reason/scheduler.py),
+# which knows about the shared rate limits; the SDK's own retries would not.
+# The client timeout is therefore a per-attempt deadline.
+_SDK_MAX_RETRIES = 0
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+# httpx connections belong to the event loop that opened them,
+# so each running loop gets its own pooled client
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> OpenAI:
+    """
+    Return the process-wide OpenAI client used for blocking calls.
+
+    Created on first use, so importing the package does not require
+    an API key.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(
+                api_key=settings.GROQ_API_KEY,
+                base_url=settings.LLM_BASE_URL,
+                max_retries=_SDK_MAX_RETRIES,
+                timeout=settings.LLM_ATTEMPT_TIMEOUT
+            )
+        return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return the shared AsyncOpenAI client for the running event loop.
+
+    All coroutines on a loop share the client's keep-alive connection
+    pool instead of opening a connection per request.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.LLM_BASE_URL,
+            max_retries=_SDK_MAX_RETRIES,
+            timeout=settings.LLM_ATTEMPT_TIMEOUT
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,163 @@
+import re
+from typing import List, Optional
+from pydantic import BaseModel
+from app.core.core.config import settings
+from app.core.schemas.embedding import EmbeddedChunk
+
+# Words, numbers and individual punctuation marks; roughly one BPE token each
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Long words split into several BPE tokens; count one extra per this many characters
+_CHARS_PER_EXTRA_TOKEN = 8
+
+# Truncated spans shorter than this are dropped rather than sent
+_MIN_SPAN_TOKENS = 32
+
+
+class ContextSpan(BaseModel):
+    source: str
+    chunk_ids: List[int]
+    text: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+    truncated: bool = False
+
+    @property
+    def label(self) -> str:
+        """Citation label, e.g. "chunk 4" or "chunks 4-6"."""
+        if len(self.chunk_ids) == 1:
+            return f"chunk {self.chunk_ids[0]}"
+        return f"chunks {min(self.chunk_ids)}-{max(self.chunk_ids)}"
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Local estimate of a text's LLM token count, without a tokenizer model."""
+    return sum(1 + len(piece) // _CHARS_PER_EXTRA_TOKEN for piece in _TOKEN_PATTERN.findall(text))
+
+
+def pack_context(chunks: List[EmbeddedChunk], max_tokens: Optional[int] = None) -> List[ContextSpan]:
+    """
+    Assemble retrieved chunks into non-redundant spans within a token budget.
+
+    Chunks from the same source that overlap or touch are merged into one
+    span, so the overlap shared by neighboring chunks is sent only once.
+    Chunks with character offsets are merged on those, within the stored
+    document the offsets refer to (a refreshed source is stored as several
+    documents, see ingest.refresh); chunks without
+    them are merged when their chunk ids are consecutive and the text
+    of one continues the other. Spans keep the retrieval order of their
+    best-ranked chunk and are added until the budget is spent; the last
+    span is cut at a word boundary if it does not fit.
+
+    Args:
+        chunks: Retrieved chunks, most relevant first
+        max_tokens: Context budget (defaults to settings.CONTEXT_MAX_TOKENS; 0 for no limit)
+
+    Returns:
+        Spans in relevance order
+    """
+    if max_tokens is None:
+        max_tokens = settings.CONTEXT_MAX_TOKENS
+
+    spans = _merge_spans(chunks)
+    if not max_tokens:
+        return spans
+
+    packed, remaining = [], max_tokens
+    for span in spans:
+        tokens = estimate_text_tokens(span.text)
+        if tokens <= remaining:
+            packed.append(span)
+            remaining -= tokens
+            continue
+        if remaining >= _MIN_SPAN_TOKENS:
+            packed.append(_truncate(span, remaining))
+        break
+    return packed
+
+
+def _merge_spans(chunks: List[EmbeddedChunk]) -> List[ContextSpan]:
+    """Merge overlapping or adjacent chunks per source, keeping rank order."""
+    ranked = []  # (best rank, span)
+    by_source = {}
+    for rank, chunk in enumerate(chunks):
+        by_source.setdefault(chunk.source, []).append((rank, chunk))
+
+    for source, entries in by_source.items():
+        # Offsets are only comparable within one stored document
+        with_offsets = sorted(
+            (e for e in entries if e[1].start is not None and e[1].end is not None),
+            key=lambda e: (e[1].doc_id is not None, e[1].doc_id or 0, e[1].start)
+        )
+        without_offsets = sorted(
+            (e for e in entries if e[1].start is None or e[1].end is None),
+            key=lambda e: e[1].chunk_id
+        )
+
+        current, best, doc_id = None, None, None
+        for rank, chunk in with_offsets:
+            if current is not None and chunk.doc_id == doc_id and chunk.start <= current.end:
+                if chunk.end > current.end:
+                    current.text += chunk.text[current.end - chunk.start:]
+                    current.end = chunk.end
+                if chunk.chunk_id not in current.chunk_ids:
+                    current.chunk_ids.append(chunk.chunk_id)
+                best = min(best, rank)
+                continue
+            if current is not None:
+                ranked.append((best, current))
+            current = ContextSpan(
+                source=source, chunk_ids=[chunk.chunk_id], text=chunk.text,
+                start=chunk.start, end=chunk.end
+            )
+            best, doc_id = rank, chunk.doc_id
+        if current is not None:
+            ranked.append((best, current))
+
+        current, best, last_id = None, None, None
+        for rank, chunk in without_offsets:
+            if current is not None and chunk.chunk_id == last_id:
+                best = min(best, rank)  # duplicate retrieval of the same chunk
+                continue
+            overlap = _text_overlap(current.text, chunk.text) if current is not None else None
+            if current is not None and chunk.chunk_id == last_id + 1 and overlap is not None:
+                current.text += chunk.text[overlap:]
+                current.chunk_ids.append(chunk.chunk_id)
+                best, last_id = min(best, rank), chunk.chunk_id
+                continue
+            if current is not None:
+                ranked.append((best, current))
+            current = ContextSpan(source=source, chunk_ids=[chunk.chunk_id], text=chunk.text)
+            best, last_id = rank, chunk.chunk_id
+        if current is not None:
+            ranked.append((best, current))
+
+    ranked.sort(key=lambda item: item[0])
+    return [span for _, span in ranked]
+
+
+def _text_overlap(left: str, right: str) -> Optional[int]:
+    """
+    Length of the longest suffix of `left` that is a prefix of `right`,
+    up to the configured chunk overlap; None if they do not overlap.
+    """
+    if settings.CHUNK_OVERLAP == 0:
+        return 0
+    for size in range(min(settings.CHUNK_OVERLAP, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return None
+
+
+def _truncate(span: ContextSpan, max_tokens: int) -> ContextSpan:
+    """Cut a span's text to roughly max_tokens, at a word boundary."""
+    count, cut = 0, 0
+    for match in _TOKEN_PATTERN.finditer(span.text):
+        count += 1 + len(match.group()) // _CHARS_PER_EXTRA_TOKEN
+        if count > max_tokens:
+            break
+        cut = match.end()
+
+    text = span.text[:cut]
+    end = span.start + cut if span.start is not None else None
+    return span.model_copy(update={"text": text, "end": end, "truncated": True})
@@ -1,15 +1,33 @@
 import time
-from typing import List
-from openai import OpenAI, APIError, RateLimitError, APIConnectionError
+from typing import Iterator, List
+from openai import APIError
+from app.core.reason.client import get_async_client, get_client
+from app.core.reason.context import pack_context
 from app.core.reason.prompt import SYSTEM_PROMPT
+from app.core.reason.scheduler import PRIORITY_ANSWER, estimate_tokens, get_scheduler
 from app.core.core.config import settings, logger
+from app.core.core.tracing import span
 from app.core.schemas.embedding import EmbeddedChunk
 
 
-client = OpenAI(
-    api_key=settings.GROQ_API_KEY,
-    base_url="https://api.groq.com/openai/v1"
-)
+def build_messages(query: str, chunks: List[EmbeddedChunk]) -> List[dict]:
+    """
+    Build the chat messages for a query and its retrieved chunks.
+    
+    Overlapping and adjacent chunks are merged and the context is fitted
+    to settings.CONTEXT_MAX_TOKENS (see pack_context).
+    """
+    context = "\n\n".join(
+        f"[{span.source} | {span.label}]\n{span.text}"
+        for span in pack_context(chunks)
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"Context:\n{context}\n\nQuestion:\n{query}"
+        }
+    ]
 
 
 def generate_answer(
@@ -34,46 +52,138 @@ def generate_answer(
     if max_retries is None:
         max_retries = settings.MAX_RETRIES
         
-    context = "\n\n".join(
-        f"[{c.source} | chunk {c.chunk_id}]\n{c.text}"
-        for c in chunks
-    )
+    with span("generate", chunks=len(chunks)) as s:
+        messages = build_messages(query, chunks)
+        s.set(prompt_chars=_prompt_chars(messages))
+        
+        try:
+            response = get_scheduler().call(
+                lambda: get_client().chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=messages
+                ),
+                priority=PRIORITY_ANSWER,
+                tokens=estimate_tokens(messages),
+                max_retries=max_retries,
+                hedge=settings.LLM_HEDGING
+            )
+        except APIError as e:
+            logger.error(f"Failed after {max_retries} attempts: {e}")
+            raise Exception(f"Failed to generate answer after {max_retries} attempts: {e}")
+        answer = response.choices[0].message.content
+        s.set(answer_chars=len(answer or ""))
+        return answer
+
+
+def generate_answer_stream(
+    query: str,
+    chunks: List[EmbeddedChunk],
+    max_retries: int = None
+) -> Iterator[str]:
+    """
+    Streaming version of generate_answer that yields text as it arrives.
+    
+    Failures before the first token are retried like generate_answer.
+    Once text has been yielded a retry would repeat it, so later
+    errors are raised to the caller.
+    
+    Args:
+        query: The user's question
+        chunks: Retrieved document chunks for context
+        max_retries: Maximum retry attempts (defaults to settings.MAX_RETRIES)
+        
+    Yields:
+        Pieces of the answer text, in order
+        
+    Raises:
+        Exception: If all retry attempts fail
+    """
+    if max_retries is None:
+        max_retries = settings.MAX_RETRIES
+    
+    with span("generate", chunks=len(chunks), stream=True, retries=0) as s:
+        messages = build_messages(query, chunks)
+        s.set(prompt_chars=_prompt_chars(messages))
+        scheduler = get_scheduler()
+        last_error = None
+        start = time.perf_counter()
+        
+        for attempt in range(max_retries):
+            started = False
+            try:
+                # The slot is held until the stream is fully read
+                with scheduler.slot(PRIORITY_ANSWER, estimate_tokens(messages)):
+                    stream = get_client().chat.completions.create(
+                        model=settings.LLM_MODEL,
+                        messages=messages,
+                        stream=True
+                    )
+                    with stream:
+                        for event in stream:
+                            if not event.choices:
+                                continue
+                            token = event.choices[0].delta.content
+                            if token:
+                                if not started:
+                                    s.set(first_token_seconds=round(time.perf_counter() - start, 6))
+                                started = True
+                                s.add("answer_chars", len(token))
+                                yield token
+                return
+            
+            except APIError as e:
+                if started:
+                    raise
+                last_error = e
+                wait_time = scheduler.retry_delay(e, attempt, max_retries)
+                if wait_time is None:
+                    break
+                s.add("retries")
+                time.sleep(wait_time)
+        
+        logger.error(f"Failed after {max_retries} attempts: {last_error}")
+        raise Exception(f"Failed to generate answer after {max_retries} attempts: {last_error}")
+
+
+async def generate_answer_async(
+    query: str,
+    chunks: List[EmbeddedChunk],
+    max_retries: int = None
+) -> str:
+    """
+    Async version of generate_answer.
     
-    last_error = None
+    Uses the event loop's pooled AsyncOpenAI client and backs off with
+    asyncio.sleep, so many answers can be in flight on one loop.
     
-    for attempt in range(max_retries):
+    Raises:
+        Exception: If all retry attempts fail
+    """
+    if max_retries is None:
+        max_retries = settings.MAX_RETRIES
+    
+    with span("generate", chunks=len(chunks)) as s:
+        messages = build_messages(query, chunks)
+        s.set(prompt_chars=_prompt_chars(messages))
+        
         try:
-            response = client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {
-                        "role": "user",
-                        "content": f"Context:\n{context}\n\nQuestion:\n{query}"
-                    }
-                ]
+            response = await get_scheduler().call_async(
+                lambda: get_async_client().chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=messages
+                ),
+                priority=PRIORITY_ANSWER,
+                tokens=estimate_tokens(messages),
+                max_retries=max_retries,
+                hedge=settings.LLM_HEDGING
             )
-            return response.choices[0].message.content
-            
-        except RateLimitError as e:
-            last_error = e
-            wait_time = settings.RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-            logger.warning(f"Rate limited. Retrying in {wait_time:.1f}s (attempt {attempt + 1}/{max_retries})")
-            time.sleep(wait_time)
-            
-        except APIConnectionError as e:
-            last_error = e
-            wait_time = settings.RETRY_DELAY * (2 ** attempt)
-            logger.warning(f"Connection error. Retrying in {wait_time:.1f}s (attempt {attempt + 1}/{max_retries})")
-            time.sleep(wait_time)
-            
         except APIError as e:
-            last_error = e
-            logger.error(f"API error: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(settings.RETRY_DELAY)
-            else:
-                break
-    
-    logger.error(f"Failed after {max_retries} attempts: {last_error}")
-    raise Exception(f"Failed to generate answer after {max_retries} attempts: {last_error}")
+            logger.error(f"Failed after {max_retries} attempts: {e}")
+            raise Exception(f"Failed to generate answer after {max_retries} attempts: {e}")
+        answer = response.choices[0].message.content
+        s.set(answer_chars=len(answer or ""))
+        return answer
+
+
+def _prompt_chars(messages: List[dict]) -> int:
+    return sum(len(m.get("content") or "") for m in messages)
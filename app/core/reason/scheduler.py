@@ -0,0 +1,612 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, List, Optional
+from openai import APIConnectionError, APIStatusError, RateLimitError
+from app.core.core.config import settings, logger
+from app.core.core.tracing import current_span, span
+
+# Lower values are admitted first
+PRIORITY_ANSWER = 0
+PRIORITY_VERIFY = 1
+
+# Wait times and latencies kept for the percentile metrics
+_WAIT_SAMPLES = 1024
+
+
+def estimate_tokens(messages: List[dict], completion_tokens: Optional[int] = None) -> int:
+    """
+    Rough token count of a chat request, used to pre-charge the token bucket.
+
+    Prompt text is counted at about four characters per token, plus the
+    expected completion size (defaults to settings.LLM_COMPLETION_TOKENS).
+    """
+    if completion_tokens is None:
+        completion_tokens = settings.LLM_COMPLETION_TOKENS
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + completion_tokens
+
+
+class _TokenBucket:
+    """Continuously refilling budget of `per_minute` units per minute; 0 means unlimited."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._refill_rate = per_minute / 60.0
+        self._updated = now
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._refill_rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self._refill_rate
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        """Return (or, if negative, further charge) units after the fact."""
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("tokens", "wake", "enqueued", "admitted", "cancelled")
+
+    def __init__(self, tokens: int, wake: Callable[[], None], enqueued: float):
+        self.tokens = tokens
+        self.wake = wake
+        self.enqueued = enqueued
+        self.admitted = False
+        self.cancelled = False
+
+
+class LLMScheduler:
+    """
+    Admission control and retry policy shared by every LLM call.
+
+    Requests wait in a priority queue (answers ahead of verification)
+    and are admitted when a concurrency slot is free and both the
+    requests-per-minute and tokens-per-minute buckets can cover them.
+    Failed calls are retried with jittered exponential backoff; a 429
+    with a Retry-After header pauses admissions for everyone until it
+    expires, so callers stop hammering the quota together rather than
+    each backing off on its own schedule.
+
+    Works from threads and from any number of event loops at once.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            requests_per_minute: Request budget, 0 for unlimited (defaults to settings.LLM_REQUESTS_PER_MINUTE)
+            tokens_per_minute: Token budget, 0 for unlimited (defaults to settings.LLM_TOKENS_PER_MINUTE)
+            max_concurrency: Requests in flight at once (defaults to settings.LLM_MAX_CONCURRENCY)
+            clock: Monotonic time in seconds, for the buckets, pauses and metrics
+        """
+        if requests_per_minute is None:
+            requests_per_minute = settings.LLM_REQUESTS_PER_MINUTE
+        if tokens_per_minute is None:
+            tokens_per_minute = settings.LLM_TOKENS_PER_MINUTE
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = _TokenBucket(requests_per_minute, clock())
+        self._tokens = _TokenBucket(tokens_per_minute, clock())
+        self._queue: list = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+
+        # Metrics
+        self._queued_by_priority: dict = {}
+        self._max_queue_depth = 0
+        self._waits: deque = deque(maxlen=_WAIT_SAMPLES)
+        self._total_wait = 0.0
+        self.admitted = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+        # Hedging
+        self._latencies: deque = deque(maxlen=_WAIT_SAMPLES)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.attempts = 0  # requests sent, each leg of a hedge counted separately
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # Admission
+
+    def _enqueue(self, priority: int, tokens: int, wake: Callable[[], None]) -> _Waiter:
+        waiter = _Waiter(tokens, wake, self._clock())
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+            self._queued_by_priority[priority] = self._queued_by_priority.get(priority, 0) + 1
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._dispatch()
+        return waiter
+
+    def _dispatch(self):
+        """Admit queued requests while capacity allows; caller holds the lock."""
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                self._queued_by_priority[priority] -= 1
+                continue
+            if self._active >= self.max_concurrency:
+                return  # release() dispatches again
+
+            now = self._clock()
+            delay = max(
+                self._paused_until - now,
+                self._requests.wait_time(1, now),
+                self._tokens.wait_time(waiter.tokens, now)
+            )
+            if delay > 0:
+                self._schedule(now + delay)
+                return
+
+            heapq.heappop(self._queue)
+            self._queued_by_priority[priority] -= 1
+            self._requests.take(1, now)
+            self._tokens.take(waiter.tokens, now)
+            self._active += 1
+            self.admitted += 1
+            wait = now - waiter.enqueued
+            self._waits.append(wait)
+            self._total_wait += wait
+            waiter.admitted = True
+            waiter.wake()
+
+    def _schedule(self, at: float):
+        """Run _dispatch again once the buckets have refilled; caller holds the lock."""
+        if self._timer is not None and self._timer_at <= at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = at
+        self._timer = threading.Timer(max(0.0, at - self._clock()), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _release(self, reserved: int, used: Optional[int] = None):
+        with self._lock:
+            self._active -= 1
+            if used is not None:
+                self._tokens.give_back(reserved - used)
+            self._dispatch()
+
+    def acquire(self, priority: int = PRIORITY_ANSWER, tokens: int = 0):
+        """Block until a request may be sent. Pair with release()."""
+        event = threading.Event()
+        self._enqueue(priority, tokens, event.set)
+        event.wait()
+
+    async def acquire_async(self, priority: int = PRIORITY_ANSWER, tokens: int = 0):
+        """Wait (without blocking the event loop) until a request may be sent."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, tokens, wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                admitted = waiter.admitted
+                waiter.cancelled = True
+            if admitted:
+                self._release(tokens)
+            raise
+
+    def release(self, reserved: int = 0, used: Optional[int] = None):
+        """
+        Free the slot taken by acquire().
+
+        Args:
+            reserved: Tokens passed to acquire()
+            used: Actual tokens used, if known; the difference is credited
+                back to (or charged to) the token bucket
+        """
+        self._release(reserved, used)
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_ANSWER, tokens: int = 0):
+        """Hold an admission slot for the duration of the block."""
+        self.acquire(priority, tokens)
+        with self._lock:
+            self.attempts += 1
+        try:
+            yield
+        finally:
+            self.release(tokens)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: int = PRIORITY_ANSWER, tokens: int = 0):
+        """Async version of slot."""
+        await self.acquire_async(priority, tokens)
+        with self._lock:
+            self.attempts += 1
+        try:
+            yield
+        finally:
+            self.release(tokens)
+
+    # Retries
+
+    def retry_delay(self, error: Exception, attempt: int, max_retries: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying after an error, or None to give up.
+
+        Rate limits, connection errors and 5xx responses are retried with
+        jittered exponential backoff. A Retry-After header is honored and
+        also pauses all other admissions until it expires.
+        """
+        if attempt >= max_retries - 1 or not _is_retryable(error):
+            return None
+
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = retry_after * random.uniform(1.0, 1.2)
+        else:
+            backoff = min(settings.RETRY_MAX_DELAY, settings.RETRY_DELAY * (2 ** attempt))
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+
+        with self._lock:
+            self.retries += 1
+            if isinstance(error, RateLimitError):
+                self.rate_limited += 1
+                if retry_after is not None:
+                    self._paused_until = max(self._paused_until, self._clock() + retry_after)
+
+        if isinstance(error, RateLimitError):
+            logger.warning(f"Rate limited. Retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        elif isinstance(error, APIConnectionError):
+            logger.warning(f"Connection error. Retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        else:
+            logger.warning(f"API error: {error}. Retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        return delay
+
+    # Calls
+
+    def _run_once(
+        self,
+        fn: Callable[[], Any],
+        priority: int,
+        tokens: int,
+        on_admit: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """One request under admission control, recording its latency."""
+        queued = self._clock()
+        self.acquire(priority, tokens)
+        with self._lock:
+            self.attempts += 1
+        if on_admit is not None:
+            on_admit()
+        used = None
+        start = self._clock()
+        current_span().add("queue_seconds", round(start - queued, 6))
+        try:
+            response = fn()
+            used = _usage_tokens(response)
+            self._record_latency(self._clock() - start)
+            return response
+        finally:
+            self.release(tokens, used)
+            if used is not None:
+                current_span().set(usage_tokens=used)
+
+    async def _run_once_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        priority: int,
+        tokens: int,
+        admitted: Optional[asyncio.Event] = None
+    ) -> Any:
+        """Async version of _run_once."""
+        queued = self._clock()
+        await self.acquire_async(priority, tokens)
+        with self._lock:
+            self.attempts += 1
+        if admitted is not None:
+            admitted.set()
+        used = None
+        start = self._clock()
+        current_span().add("queue_seconds", round(start - queued, 6))
+        try:
+            response = await fn()
+            used = _usage_tokens(response)
+            self._record_latency(self._clock() - start)
+            return response
+        finally:
+            self.release(tokens, used)
+            if used is not None:
+                current_span().set(usage_tokens=used)
+
+    def _hedged(self, fn: Callable[[], Any], priority: int, tokens: int) -> Any:
+        """
+        Run fn, sending a duplicate if it is slower than hedge_delay().
+
+        The delay is counted from the primary's admission, so requests
+        held back by the rate limits are not duplicated. The first
+        successful response wins. A blocking call cannot be interrupted,
+        so the loser runs to completion in the background and its
+        result is discarded.
+        """
+        admitted = threading.Event()
+        # Pool threads inherit the caller's context so attempts report to its span
+        primary = self._hedge_pool().submit(
+            contextvars.copy_context().run, self._run_once, fn, priority, tokens, admitted.set
+        )
+        admitted.wait()
+        try:
+            return primary.result(timeout=self.hedge_delay())
+        except FuturesTimeout:
+            pass
+
+        with self._lock:
+            self.hedges += 1
+        current_span().set(hedged=True)
+        secondary = self._hedge_pool().submit(
+            contextvars.copy_context().run, self._run_once, fn, priority, tokens
+        )
+
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                        current_span().set(hedge_won=True)
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _hedged_async(self, fn: Callable[[], Awaitable[Any]], priority: int, tokens: int) -> Any:
+        """Async version of _hedged; here the losing request is cancelled."""
+        admitted = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._run_once_async(fn, priority, tokens, admitted))]
+        try:
+            await admitted.wait()
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                return tasks[0].result()
+
+            with self._lock:
+                self.hedges += 1
+            current_span().set(hedged=True)
+            tasks.append(asyncio.ensure_future(self._run_once_async(fn, priority, tokens)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            with self._lock:
+                                self.hedge_wins += 1
+                            current_span().set(hedge_won=True)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: int = PRIORITY_ANSWER,
+        tokens: int = 0,
+        max_retries: Optional[int] = None,
+        hedge: bool = False
+    ) -> Any:
+        """
+        Run a blocking LLM call under admission control, with retries.
+
+        Args:
+            fn: Makes the request and returns the response
+            priority: PRIORITY_ANSWER or PRIORITY_VERIFY
+            tokens: Estimated tokens for the token bucket (see estimate_tokens)
+            max_retries: Attempts before giving up (defaults to settings.MAX_RETRIES)
+            hedge: Send a duplicate request when an attempt is slow (see _hedged)
+
+        Raises:
+            The last error, once it is not retryable or attempts run out
+        """
+        if max_retries is None:
+            max_retries = settings.MAX_RETRIES
+
+        with span("llm.call", priority=priority, tokens_estimate=tokens, retries=0) as s:
+            for attempt in range(max(1, max_retries)):
+                try:
+                    if hedge:
+                        return self._hedged(fn, priority, tokens)
+                    return self._run_once(fn, priority, tokens)
+                except Exception as e:
+                    delay = self.retry_delay(e, attempt, max_retries)
+                    if delay is None:
+                        raise
+                    s.add("retries")
+                    s.add("backoff_seconds", delay)
+                time.sleep(delay)
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_ANSWER,
+        tokens: int = 0,
+        max_retries: Optional[int] = None,
+        hedge: bool = False
+    ) -> Any:
+        """Async version of call; fn returns an awaitable."""
+        if max_retries is None:
+            max_retries = settings.MAX_RETRIES
+
+        with span("llm.call", priority=priority, tokens_estimate=tokens, retries=0) as s:
+            for attempt in range(max(1, max_retries)):
+                try:
+                    if hedge:
+                        return await self._hedged_async(fn, priority, tokens)
+                    return await self._run_once_async(fn, priority, tokens)
+                except Exception as e:
+                    delay = self.retry_delay(e, attempt, max_retries)
+                    if delay is None:
+                        raise
+                    s.add("retries")
+                    s.add("backoff_seconds", delay)
+                await asyncio.sleep(delay)
+
+    # Hedging
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """
+        How long an attempt may run before a duplicate is sent.
+
+        The LLM_HEDGE_PERCENTILE of recent successful attempt latencies,
+        or LLM_HEDGE_DELAY until LLM_HEDGE_MIN_SAMPLES have been seen.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DELAY
+        return _percentile(latencies, settings.LLM_HEDGE_PERCENTILE)
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2 * self.max_concurrency,
+                    thread_name_prefix="llm-hedge"
+                )
+            return self._executor
+
+    # Metrics
+
+    def stats(self) -> dict:
+        """Queue depth, wait times and retry counters as a plain dict."""
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": sum(1 for _, _, w in self._queue if not w.cancelled),
+                "queue_depth_by_priority": {p: n for p, n in self._queued_by_priority.items() if n},
+                "max_queue_depth": self._max_queue_depth,
+                "active": self._active,
+                "admitted": self.admitted,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "paused_seconds": round(max(0.0, self._paused_until - self._clock()), 3),
+                "wait_mean_seconds": round(self._total_wait / self.admitted, 4) if self.admitted else 0.0,
+                "wait_p50_seconds": round(_percentile(waits, 0.50), 4),
+                "wait_p95_seconds": round(_percentile(waits, 0.95), 4),
+                "wait_max_seconds": round(waits[-1], 4) if waits else 0.0,
+                "attempts": self.attempts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409)
+    return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a Retry-After (or retry-after-ms) header, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+_default_scheduler: Optional[LLMScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Return the process-wide LLM scheduler, creating it on first use."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = LLMScheduler()
+        return _default_scheduler
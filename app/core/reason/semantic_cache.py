@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+from app.core.reason.cache import CachedAnswer, chunk_set_key
+from app.core.core.config import settings
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.verify.base import VerificationResult
+
+# Similarity at which put() treats two queries as the same one
+_SAME_QUERY = 0.9999
+
+# Negations invert a question, but the TF-IDF vectors drop them as stop words
+_NEGATION = re.compile(
+    r"\b(?:no|not|nor|never|none|nothing|nobody|nowhere|neither|without|cannot)\b|n['\u2019]t\b",
+    re.IGNORECASE
+)
+
+
+class SemanticQueryCache:
+    """
+    Reuses answers for paraphrased questions over the same evidence.
+
+    Recent queries are embedded with the index's own embedder and kept
+    as rows of a small normalized matrix, so a lookup is one
+    matrix-vector product. An entry is reused only when its cosine
+    similarity to the new query reaches the threshold AND it was
+    answered from exactly the same set of retrieved chunks, so an answer
+    is never served from different evidence. The query vectors leave out
+    stop words, negations among them, so a negated query only matches
+    negated ones ("Is the screen not covered?" never reuses the answer
+    to "Is the screen covered?").
+
+    Entries are replaced oldest-first once the cache is full, and the
+    whole cache is dropped when the store's embedder is refitted or
+    replaced (vectors from different fits are not comparable). Safe to
+    share between threads.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        max_entries: Optional[int] = None,
+        threshold: Optional[float] = None
+    ):
+        """
+        Args:
+            vector_store: Store whose embedder is used for queries
+            max_entries: Queries to remember (defaults to settings.SEMANTIC_CACHE_SIZE)
+            threshold: Minimum cosine similarity for a hit (defaults to settings.SEMANTIC_CACHE_THRESHOLD)
+        """
+        self.vector_store = vector_store
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_SIZE
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+
+        self._lock = threading.Lock()
+        self._fit_id: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._chunk_keys: List[Optional[str]] = []
+        self._negated: List[Optional[bool]] = []
+        self._entries: List[Optional[CachedAnswer]] = []
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, query: str):
+        """Return (fit_id, unit query vector, negated), or (None, None, None) if unusable."""
+        embedder = self.vector_store.embedder
+        fit_id = embedder.fit_id
+        if fit_id is None:
+            return None, None, None
+        vector = embedder.transform([query]).toarray()[0]
+        norm = np.linalg.norm(vector)
+        if not norm or embedder.fit_id != fit_id:
+            return None, None, None
+        return fit_id, vector / norm, _NEGATION.search(query) is not None
+
+    def _reset(self, fit_id: int, dim: int):
+        """Start over for a new embedder fit; caller holds the lock."""
+        self._fit_id = fit_id
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._chunk_keys = [None] * self.max_entries
+        self._negated = [None] * self.max_entries
+        self._entries = [None] * self.max_entries
+        self._next = 0
+
+    def _find(self, vector: np.ndarray, negated: bool, chunk_key: str, threshold: float) -> Optional[int]:
+        """Slot of the most similar entry, negated alike, over the same chunks; caller holds the lock."""
+        scores = self._vectors @ vector
+        for i in np.argsort(-scores, kind="stable"):
+            if scores[i] < threshold:
+                break
+            if self._chunk_keys[i] == chunk_key and self._negated[i] == negated:
+                return int(i)
+        return None
+
+    def get(self, query: str, chunks: List[EmbeddedChunk]) -> Optional[CachedAnswer]:
+        """Return the answer of the most similar cached query over the same chunks."""
+        fit_id, vector, negated = self._embed(query)
+        chunk_key = chunk_set_key(chunks)
+
+        with self._lock:
+            if vector is None or fit_id != self._fit_id:
+                self.misses += 1
+                return None
+
+            slot = self._find(vector, negated, chunk_key, self.threshold)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._entries[slot]
+
+    def put(
+        self,
+        query: str,
+        chunks: List[EmbeddedChunk],
+        answer: str,
+        verification: Optional[VerificationResult] = None
+    ):
+        """
+        Remember the answer to a query.
+
+        An existing entry for the same query and chunks is updated in
+        place; otherwise the oldest entry is replaced once the cache is full.
+        """
+        fit_id, vector, negated = self._embed(query)
+        if vector is None:
+            return
+
+        entry = CachedAnswer(answer=answer, verification=verification, created=time.time())
+        chunk_key = chunk_set_key(chunks)
+        with self._lock:
+            if fit_id != self._fit_id or self._vectors.shape[1] != len(vector):
+                self._reset(fit_id, len(vector))
+
+            slot = self._find(vector, negated, chunk_key, _SAME_QUERY)
+            if slot is None:
+                slot = self._next
+                self._next = (slot + 1) % self.max_entries
+            self._vectors[slot] = vector
+            self._chunk_keys[slot] = chunk_key
+            self._negated[slot] = negated
+            self._entries[slot] = entry
+
+    def stats(self) -> dict:
+        """Hit/miss counters as a plain dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": sum(1 for entry in self._entries if entry is not None),
+            }
+
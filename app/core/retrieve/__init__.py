@@ -1,6 +1,9 @@
 # Retrieval module for embeddings and vector search
-from .embedder import embed_text, add_to_corpus, fit_vectorizer
+from .embedder import TfidfEmbedder
 from .vector_store import VectorStore
-from .retriever import retrieve_relevant_chunks
+from .retriever import retrieve_relevant_chunks, retrieve_relevant_chunks_batch
+from .bm25 import BM25Index, retrieve_bm25
+from .ann import IVFIndex, update_ann_index
+from .quantize import Int8Codes, PQCodes, update_quantization
 
-__all__ = ["embed_text", "add_to_corpus", "fit_vectorizer", "VectorStore", "retrieve_relevant_chunks"]
+__all__ = ["TfidfEmbedder", "VectorStore", "retrieve_relevant_chunks", "retrieve_relevant_chunks_batch", "BM25Index", "retrieve_bm25", "IVFIndex", "update_ann_index", "Int8Codes", "PQCodes", "update_quantization"]
@@ -0,0 +1,226 @@
+import math
+from pathlib import Path
+from typing import Optional, Sequence, Union
+import numpy as np
+from scipy import sparse
+from app.core.core.config import settings, logger
+
+# Rows scored against the centroids at once while assigning them to lists
+_ASSIGN_BLOCK = 8192
+
+# Rows added since the last assignment are filed once they exceed
+# 1/_PENDING_FRACTION of the index (and _MIN_PENDING); until then
+# VectorStore.similarity_search scans them exactly
+_PENDING_FRACTION = 64
+_MIN_PENDING = 1024
+
+Matrix = Union[np.ndarray, sparse.spmatrix]
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index for approximate cosine search.
+
+    Spherical k-means splits the store's unit-length embedding rows into
+    n_lists clusters and each row is filed under its nearest centroid.
+    A query is compared with the centroids only, and just the rows in its
+    n_probe closest lists are scored exactly, so a search scans roughly
+    n_probe / n_lists of the store. More probes trade latency for recall;
+    probing every list is exact search.
+
+    Instances are never modified: extend() returns a new index, so a
+    search running on another thread always sees a consistent one.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        assignments: np.ndarray,
+        trained_on: int,
+        order: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            centroids: Unit-length list centroids, one per row
+            assignments: List id of every indexed row
+            trained_on: Store size when the centroids were trained
+            order: Row ids grouped by list (computed if omitted)
+            offsets: Start of each list in order, plus the end (computed if omitted)
+        """
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_on = trained_on
+        if order is None or offsets is None:
+            order = np.argsort(assignments, kind="stable").astype(np.int64)
+            counts = np.bincount(assignments, minlength=len(centroids))
+            offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def size(self) -> int:
+        """Number of rows filed under a list; later store rows are not indexed yet."""
+        return len(self.assignments)
+
+    @classmethod
+    def train(
+        cls,
+        matrix: Matrix,
+        n_lists: int,
+        sample_size: int,
+        iterations: int,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Train centroids on a sample of the rows, then file every row.
+
+        Args:
+            matrix: Unit-length embeddings, dense or CSR
+            n_lists: Number of lists (clusters)
+            sample_size: Rows sampled for k-means (at least 8 per list)
+            iterations: Maximum k-means iterations
+            seed: Seed for sampling and initialization
+
+        Returns:
+            An index covering every row of the matrix
+        """
+        n = matrix.shape[0]
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+
+        sample = np.sort(rng.choice(n, size=min(n, max(sample_size, n_lists * 8)), replace=False))
+        data = matrix[sample]
+        centroids = _unit(_dense(data[np.sort(rng.choice(len(sample), n_lists, replace=False))]))
+
+        labels = None
+        for _ in range(max(1, iterations)):
+            new_labels = _nearest(data, centroids)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            centroids = _update_centroids(data, labels, n_lists, rng)
+
+        return cls(centroids, np.empty(0, dtype=np.int32), trained_on=n).extend(matrix)
+
+    def extend(self, matrix: Matrix) -> "IVFIndex":
+        """Return a new index that also files rows size..len(matrix) under the existing centroids."""
+        if matrix.shape[0] <= self.size:
+            return self
+        labels = _nearest(matrix[self.size:], self.centroids)
+        return IVFIndex(self.centroids, np.concatenate([self.assignments, labels]), self.trained_on)
+
+    def take(self, keep: np.ndarray) -> "IVFIndex":
+        """Return a new index over the rows where keep is True, renumbered in order (see VectorStore.compact)."""
+        return IVFIndex(self.centroids, self.assignments[keep[:self.size]], self.trained_on)
+
+    def probe(self, queries: Matrix, n_probe: int) -> np.ndarray:
+        """
+        The n_probe lists closest to each query.
+
+        Args:
+            queries: Query embeddings, one per row (dense or sparse)
+            n_probe: Lists per query
+
+        Returns:
+            A (queries x n_probe) array of list ids
+        """
+        scores = queries @ self.centroids.T
+        scores = np.asarray(scores.toarray() if sparse.issparse(scores) else scores, dtype=np.float32)
+        scores = np.atleast_2d(scores)
+        if n_probe >= self.n_lists:
+            return np.broadcast_to(np.arange(self.n_lists), (scores.shape[0], self.n_lists))
+        return np.argpartition(-scores, n_probe - 1, axis=1)[:, :n_probe]
+
+    def candidates(self, lists: Sequence[int]) -> np.ndarray:
+        """Row ids filed under the given lists, in ascending (insertion) order."""
+        rows = [self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+        return np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+    def save(self, directory: Path) -> dict:
+        """Write the index arrays into an index directory; returns the manifest entry."""
+        directory = Path(directory)
+        np.save(directory / "ann.centroids.npy", np.ascontiguousarray(self.centroids, dtype=np.float32))
+        np.save(directory / "ann.assignments.npy", np.asarray(self.assignments, dtype=np.int32))
+        np.save(directory / "ann.order.npy", np.asarray(self.order, dtype=np.int64))
+        np.save(directory / "ann.offsets.npy", np.asarray(self.offsets, dtype=np.int64))
+        return {"kind": "ivf", "n_lists": self.n_lists, "size": self.size, "trained_on": self.trained_on}
+
+    @classmethod
+    def load(cls, directory: Path, meta: dict, mmap_mode: Optional[str] = None) -> "IVFIndex":
+        """Read an index written by save(); meta is its manifest entry."""
+        directory = Path(directory)
+        return cls(
+            np.load(directory / "ann.centroids.npy", mmap_mode=mmap_mode),
+            np.load(directory / "ann.assignments.npy", mmap_mode=mmap_mode),
+            meta["trained_on"],
+            np.load(directory / "ann.order.npy", mmap_mode=mmap_mode),
+            np.load(directory / "ann.offsets.npy", mmap_mode=mmap_mode),
+        )
+
+
+def update_ann_index(vector_store) -> Optional[IVFIndex]:
+    """
+    Bring the store's IVF index up to date as the store grows.
+
+    Stores smaller than settings.ANN_MIN_CHUNKS keep no index and are
+    searched exactly. The index is trained once a store reaches that
+    size and retrained whenever it has grown settings.ANN_RETRAIN_GROWTH
+    times since, so lists stay near their intended size. Rows added in
+    between are filed under the existing centroids in batches.
+    """
+    # Rows must not be renumbered by a compaction while they are filed
+    with vector_store.writing():
+        index: Optional[IVFIndex] = vector_store.ann_index
+        size = len(vector_store)
+        if size < settings.ANN_MIN_CHUNKS:
+            return index
+
+        matrix = vector_store.embedding_matrix()
+        if index is None or size >= index.trained_on * settings.ANN_RETRAIN_GROWTH:
+            n_lists = settings.ANN_LISTS or round(math.sqrt(size))
+            index = IVFIndex.train(matrix, n_lists, settings.ANN_TRAIN_SAMPLE, settings.ANN_TRAIN_ITERATIONS)
+            logger.info(f"Trained IVF index: {index.n_lists} lists over {size} chunks")
+        elif size - index.size >= max(_MIN_PENDING, index.size // _PENDING_FRACTION):
+            index = index.extend(matrix)
+
+        vector_store.ann_index = index
+        return index
+
+
+def _dense(matrix: Matrix) -> np.ndarray:
+    return np.asarray(matrix.toarray() if sparse.issparse(matrix) else matrix, dtype=np.float32)
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _nearest(matrix: Matrix, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest (highest cosine) centroid for every row."""
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for lo in range(0, matrix.shape[0], _ASSIGN_BLOCK):
+        scores = matrix[lo:lo + _ASSIGN_BLOCK] @ centroids.T
+        labels[lo:lo + _ASSIGN_BLOCK] = np.asarray(scores).argmax(axis=1)
+    return labels
+
+
+def _update_centroids(data: Matrix, labels: np.ndarray, n_lists: int, rng) -> np.ndarray:
+    """Spherical k-means update: each centroid is the normalized sum of its rows."""
+    n = data.shape[0]
+    members = sparse.csr_matrix(
+        (np.ones(n, dtype=np.float32), (labels, np.arange(n))), shape=(n_lists, n)
+    )
+    centroids = _dense(members @ data)
+
+    # Reseed empty lists with random rows rather than leaving them unused
+    empty = np.flatnonzero(np.bincount(labels, minlength=n_lists) == 0)
+    if len(empty):
+        centroids[empty] = _dense(data[np.sort(rng.choice(n, size=len(empty), replace=False))])
+    return _unit(centroids)
@@ -0,0 +1,195 @@
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.schemas.filter import SearchFilter
+from app.core.core.config import settings
+
+_TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, using the same stop words as the TF-IDF embedder."""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in ENGLISH_STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25.
+
+    Each term maps to a postings list of (chunk index, term frequency)
+    pairs, stored as compact integer arrays. Chunks can be appended at
+    any time, and a query only reads the postings of its own terms.
+    Appends are copy-on-write: touched postings and the length array are
+    replaced by extended copies, never resized in place, so a search
+    running alongside keeps valid views of the arrays it read.
+    Deleted chunks are skipped at query time (their terms still count
+    towards document frequencies) until the store is compacted.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, tuple] = {}
+        # (chunk lengths, total length), replaced together by add()
+        self._lengths = (array("I"), 0)
+
+    def __len__(self) -> int:
+        """Return the number of indexed chunks."""
+        return len(self._lengths[0])
+
+    def add(self, texts: Iterable[str]):
+        """Append chunks; their indices continue from the current size."""
+        doc_lengths, total_length = self._lengths
+        first = len(doc_lengths)
+        new_lengths = array("I")
+        new_postings: Dict[str, tuple] = {}
+        for doc_id, text in enumerate(texts, first):
+            tokens = tokenize(text)
+
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+
+            for term, tf in counts.items():
+                postings = new_postings.get(term)
+                if postings is None:
+                    postings = (array("I"), array("I"))
+                    new_postings[term] = postings
+                postings[0].append(doc_id)
+                postings[1].append(tf)
+
+            new_lengths.append(len(tokens))
+            total_length += len(tokens)
+
+        # Postings first: a search only reads ids below the length count it saw
+        for term, (ids, tfs) in new_postings.items():
+            old = self._postings.get(term)
+            if old is not None:
+                ids, tfs = old[0] + ids, old[1] + tfs
+            self._postings[term] = (ids, tfs)
+        self._lengths = (doc_lengths + new_lengths, total_length)
+
+    def take(self, keep: np.ndarray) -> "BM25Index":
+        """Return a new index over the chunks where keep is True, renumbered in order (see VectorStore.compact)."""
+        keep = np.asarray(keep[:len(self)], dtype=bool)
+        new_ids = (np.cumsum(keep) - 1).astype(np.uint32)
+        index = BM25Index(self.k1, self.b)
+        for term, (ids, tfs) in self._postings.items():
+            ids = np.frombuffer(ids, dtype=np.uint32)
+            kept = keep[ids]
+            if kept.any():
+                index._postings[term] = (
+                    array("I", new_ids[ids[kept]].tobytes()),
+                    array("I", np.frombuffer(tfs, dtype=np.uint32)[kept].tobytes())
+                )
+        lengths = np.frombuffer(self._lengths[0], dtype=np.uint32)[keep]
+        index._lengths = (array("I", lengths.tobytes()), int(lengths.sum()))
+        return index
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        rows: Optional[np.ndarray] = None,
+        deleted: Optional[np.ndarray] = None
+    ) -> List[int]:
+        """
+        Return the indices of the top-k chunks for the query.
+
+        Only chunks containing at least one query term are returned,
+        only chunks among the sorted ``rows`` when given, and never
+        chunks flagged in the ``deleted`` mask.
+        """
+        lengths, total_length = self._lengths
+        n_docs = len(lengths)
+        if not n_docs or top_k <= 0:
+            return []
+
+        avg_length = total_length / n_docs or 1.0
+        doc_lengths = np.frombuffer(lengths, dtype=np.uint32)
+
+        doc_ids, contributions = [], []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            ids = np.frombuffer(postings[0], dtype=np.uint32)
+            tf = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+            if len(ids) and ids[-1] >= n_docs:
+                # Chunks appended after this search read the lengths
+                count = int(np.searchsorted(ids, n_docs))
+                ids, tf = ids[:count], tf[:count]
+                if not count:
+                    continue
+
+            df = len(ids)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[ids] / avg_length)
+            doc_ids.append(ids)
+            contributions.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        if not doc_ids:
+            return []
+
+        # Sum contributions per chunk over the touched postings only
+        matched, inverse = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        if rows is not None or deleted is not None:
+            keep = np.ones(len(matched), dtype=bool) if rows is None else np.isin(matched, rows, assume_unique=True)
+            if deleted is not None:
+                keep &= ~deleted[matched]
+            matched, scores = matched[keep], scores[keep]
+            if not len(matched):
+                return []
+
+        k = min(top_k, len(matched))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return matched[best].tolist()
+
+
+def update_bm25_index(vector_store) -> BM25Index:
+    """
+    Bring the store's BM25 index up to date, creating it if needed.
+
+    Only chunks added to the store since the last update are indexed.
+    """
+    index: Optional[BM25Index] = vector_store.bm25_index
+    if index is not None and len(index) >= len(vector_store):
+        return index
+
+    # Rows must not be renumbered by a compaction while they are read
+    with vector_store.writing():
+        index = vector_store.bm25_index
+        if index is None:
+            index = BM25Index()
+            vector_store.bm25_index = index
+        if len(index) < len(vector_store):
+            index.add(vector_store.iter_texts(len(index)))
+    return index
+
+
+def retrieve_bm25(
+    query: str,
+    vector_store,
+    top_k: Optional[int] = None,
+    search_filter: Optional[SearchFilter] = None
+) -> List[EmbeddedChunk]:
+    """Retrieve the top-k chunks for the query using BM25, optionally only among chunks matching a filter."""
+    if top_k is None:
+        top_k = settings.TOP_K
+
+    update_bm25_index(vector_store)
+    index, chunks, deleted = vector_store.bm25_snapshot()
+    if index is None:
+        return []
+    rows = None
+    if search_filter is not None:
+        rows = chunks.filter_rows(search_filter, len(index))
+        if not len(rows):
+            return []
+    return [chunks.view(i).to_embedded_chunk() for i in index.search(query, top_k, rows, deleted)]
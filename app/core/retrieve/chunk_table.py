@@ -0,0 +1,283 @@
+import numpy as np
+from typing import Iterator, Optional, Sequence
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.schemas.filter import SearchFilter
+from app.core.retrieve.text_store import TextStore
+
+# Initial row capacity of the columns; they double whenever they fill up
+_INITIAL_CAPACITY = 1024
+
+_COLUMNS = {
+    "doc_id": np.int32,
+    "chunk_id": np.int32,
+    "start": np.int64,
+    "end": np.int64,
+}
+
+
+class ChunkView:
+    """
+    Lightweight read-only view of one row of a ChunkTable.
+    
+    Nothing is copied until ``text`` is read or ``to_embedded_chunk``
+    is called.
+    """
+    
+    __slots__ = ("_table", "index")
+    
+    def __init__(self, table: "ChunkTable", index: int):
+        self._table = table
+        self.index = index
+    
+    @property
+    def doc_id(self) -> int:
+        return int(self._table.doc_id[self.index])
+    
+    @property
+    def chunk_id(self) -> int:
+        return int(self._table.chunk_id[self.index])
+    
+    @property
+    def start(self) -> int:
+        return int(self._table.start[self.index])
+    
+    @property
+    def end(self) -> int:
+        return int(self._table.end[self.index])
+    
+    @property
+    def source(self) -> str:
+        return self._table.texts.source(self.doc_id)
+    
+    @property
+    def text(self) -> str:
+        return self._table.texts.slice(self.doc_id, self.start, self.end)
+    
+    def to_embedded_chunk(self) -> EmbeddedChunk:
+        """Materialize the row as an EmbeddedChunk."""
+        doc_id, start, end = self.doc_id, self.start, self.end
+        standalone = self._table.texts.is_standalone(doc_id)
+        return EmbeddedChunk(
+            chunk_id=self.chunk_id,
+            text=self._table.texts.slice(doc_id, start, end),
+            source=self._table.texts.source(doc_id),
+            start=None if standalone else start,
+            end=None if standalone else end,
+            doc_id=None if standalone else doc_id
+        )
+    
+    def __repr__(self) -> str:
+        return f"ChunkView(index={self.index}, source={self.source!r}, chunk_id={self.chunk_id})"
+
+
+class ChunkTable:
+    """
+    Columnar table of chunks.
+    
+    Each chunk is one row of four NumPy columns (doc_id, chunk_id, start,
+    end) into a shared TextStore, which holds each document's text once
+    and interns source names. Rows are appended in bulk and read through
+    ChunkView objects. Rows are appended one document at a time, so the
+    doc_id column is sorted and each document's chunks are one run of it.
+    """
+    
+    def __init__(self, texts: Optional[TextStore] = None):
+        self.texts = texts or TextStore()
+        self._size = 0
+        self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in _COLUMNS.items()}
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def doc_id(self) -> np.ndarray:
+        return self._columns["doc_id"][:self._size]
+    
+    @property
+    def chunk_id(self) -> np.ndarray:
+        return self._columns["chunk_id"][:self._size]
+    
+    @property
+    def start(self) -> np.ndarray:
+        return self._columns["start"][:self._size]
+    
+    @property
+    def end(self) -> np.ndarray:
+        return self._columns["end"][:self._size]
+    
+    def append(
+        self,
+        doc_ids: Sequence[int],
+        chunk_ids: Sequence[int],
+        starts: Sequence[int],
+        ends: Sequence[int]
+    ):
+        """Append rows given as parallel sequences."""
+        n = len(doc_ids)
+        if not n:
+            return
+        self._ensure_capacity(self._size + n)
+        for name, values in zip(_COLUMNS, (doc_ids, chunk_ids, starts, ends)):
+            self._columns[name][self._size:self._size + n] = values
+        self._size += n
+    
+    def append_document(self, doc_id: int, starts: Sequence[int], ends: Sequence[int], first_chunk_id: int = 0):
+        """Append the chunks of one document, numbered from first_chunk_id."""
+        n = len(starts)
+        self.append(np.full(n, doc_id), np.arange(first_chunk_id, first_chunk_id + n), starts, ends)
+    
+    def append_standalone(self, chunks: Sequence):
+        """
+        Append chunk objects (anything with chunk_id, text and source),
+        storing each chunk's text as its own entry in the text store.
+        """
+        doc_ids = [self.texts.add(c.text, c.source, standalone=True) for c in chunks]
+        self.append(doc_ids, [c.chunk_id for c in chunks], [0] * len(chunks), [len(c.text) for c in chunks])
+    
+    def _ensure_capacity(self, required: int):
+        capacity = len(self._columns["doc_id"])
+        if required <= capacity:
+            return
+        capacity = max(capacity, _INITIAL_CAPACITY)
+        while capacity < required:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+    
+    def view(self, index: int) -> ChunkView:
+        if not 0 <= index < self._size:
+            raise IndexError(f"Chunk index {index} out of range")
+        return ChunkView(self, index)
+    
+    def rows_for_docs(self, doc_ids: Sequence[int], size: Optional[int] = None) -> np.ndarray:
+        """
+        Row indices of the given documents' chunks, ascending.
+        
+        Each document is found by binary search on the doc_id column, so
+        the cost depends on the documents and rows returned, not the table.
+        
+        Args:
+            doc_ids: Sorted document ids
+            size: Only consider the first size rows (defaults to all)
+        """
+        column = self._columns["doc_id"][:self._size if size is None else size]
+        doc_ids = np.asarray(doc_ids, dtype=column.dtype)
+        starts = np.searchsorted(column, doc_ids, "left")
+        lengths = np.searchsorted(column, doc_ids, "right") - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the runs start..start+length without a Python loop
+        offsets = np.cumsum(lengths) - lengths
+        return np.arange(total, dtype=np.int64) + np.repeat(starts - offsets, lengths)
+    
+    def rows_in_range(self, doc_id: int, start: int, end: int, size: Optional[int] = None) -> np.ndarray:
+        """Rows of one document whose text overlaps the characters start..end, ascending."""
+        rows = self.rows_for_docs([doc_id], size)
+        if start >= end:
+            return rows[:0]
+        overlaps = (self._columns["start"][rows] < end) & (self._columns["end"][rows] > start)
+        return rows[overlaps]
+    
+    def filter_rows(self, search_filter: SearchFilter, size: Optional[int] = None) -> np.ndarray:
+        """
+        Row indices of the chunks a SearchFilter selects, ascending.
+        
+        Sources pick their partitions directly; ingestion time and metadata
+        are checked once per remaining document; pages once per chunk of
+        the matching documents.
+        
+        Args:
+            search_filter: Conditions the chunks must meet
+            size: Only consider the first size rows (defaults to all)
+        """
+        texts = self.texts
+        if search_filter.sources is not None:
+            docs = texts.docs_for_sources(search_filter.sources)
+        else:
+            docs = np.arange(len(texts), dtype=np.int32)
+        
+        if search_filter.ingested_after is not None or search_filter.ingested_before is not None:
+            ingested = texts.ingestion_times(docs)
+            keep = np.ones(len(docs), dtype=bool)
+            if search_filter.ingested_after is not None:
+                keep &= ingested >= search_filter.ingested_after.timestamp()
+            if search_filter.ingested_before is not None:
+                keep &= ingested < search_filter.ingested_before.timestamp()
+            docs = docs[keep]
+        
+        if search_filter.metadata:
+            docs = [d for d in docs if _metadata_matches(texts.metadata(int(d)), search_filter.metadata)]
+        
+        if search_filter.pages is None:
+            return self.rows_for_docs(docs, size)
+        
+        first, last = search_filter.pages
+        parts = []
+        for doc_id in docs:
+            page_offsets = texts.page_offsets(int(doc_id))
+            if not page_offsets:
+                continue
+            rows = self.rows_for_docs([doc_id], size)
+            # 1-based pages holding each chunk's first and last character
+            start_page = np.searchsorted(page_offsets, self._columns["start"][rows], "right")
+            end_page = np.searchsorted(page_offsets, np.maximum(self._columns["end"][rows] - 1, 0), "right")
+            parts.append(rows[(start_page <= last) & (end_page >= first)])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    
+    def text(self, index: int) -> str:
+        """Slice the text of one row."""
+        doc_id, start, end = self._columns["doc_id"][index], self._columns["start"][index], self._columns["end"][index]
+        return self.texts.slice(int(doc_id), int(start), int(end))
+    
+    def iter_texts(self, start: int = 0) -> Iterator[str]:
+        """Yield row texts from a row index onwards."""
+        for index in range(start, self._size):
+            yield self.text(index)
+    
+    def take(self, rows: np.ndarray, texts: TextStore, doc_remap: np.ndarray) -> "ChunkTable":
+        """
+        A new table holding only the given rows over another text store.
+        
+        Args:
+            rows: Ascending row indices to keep
+            texts: Store the new table refers to (see TextStore.take)
+            doc_remap: New doc_id of every old one
+        """
+        table = ChunkTable(texts)
+        table._columns = {name: column[rows] for name, column in self._columns.items()}
+        table._columns["doc_id"] = doc_remap[table._columns["doc_id"]].astype(_COLUMNS["doc_id"])
+        table._size = len(rows)
+        return table
+    
+    def save_columns(self, directory) -> None:
+        """Write the columns as .npy files named chunks.<column>.npy."""
+        for name in _COLUMNS:
+            np.save(directory / f"chunks.{name}.npy", getattr(self, name))
+    
+    @classmethod
+    def load_columns(cls, directory, texts: TextStore, size: int, mmap_mode: Optional[str] = None) -> "ChunkTable":
+        """Restore a table written by save_columns(); columns may be memory-mapped."""
+        table = cls(texts)
+        table._columns = {
+            name: np.load(directory / f"chunks.{name}.npy", mmap_mode=mmap_mode)
+            for name in _COLUMNS
+        }
+        table._size = size
+        return table
+
+
+def _metadata_matches(metadata: dict, conditions: dict) -> bool:
+    """Every condition key is present with an equal value, or one of the listed values."""
+    for key, expected in conditions.items():
+        if key not in metadata:
+            return False
+        value = metadata[key]
+        if isinstance(expected, list) and not isinstance(value, list):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
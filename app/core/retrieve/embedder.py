@@ -1,63 +1,157 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+import itertools
+import json
+import re
 import numpy as np
-from typing import List
-
-_vectorizer = None
-_corpus = []
-
-def _get_vectorizer():
-    """Get or create the TF-IDF vectorizer"""
-    global _vectorizer
-    if _vectorizer is None:
-        _vectorizer = TfidfVectorizer(
-            max_features=512,  
-            stop_words='english',
-            ngram_range=(1, 2)  
-        )
-    return _vectorizer
-
-def add_to_corpus(text: str):
-    global _corpus
-    _corpus.append(text)
-
-def fit_vectorizer():
-    """Fit the vectorizer on all collected texts"""
-    global _vectorizer, _corpus
-    if _corpus:
-        _vectorizer = TfidfVectorizer(
-            max_features=512,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-        _vectorizer.fit(_corpus)
-
-def embed_texts_batch(texts: List[str]) -> List[List[float]]:
+import threading
+from pathlib import Path
+from scipy import sparse
+from collections import Counter
+from typing import Iterable, List, Optional
+from app.core.core.config import settings
+
+# Source of TfidfEmbedder.fit_id values, unique across all embedders
+_fit_ids = itertools.count(1)
+
+# The vectorizer's default token pattern
+_WORD = re.compile(r"(?u)\b\w\w+\b")
+
+# count_misses looks at this many of a text's most frequent words
+_TOP_WORDS = 5
+
+
+class TfidfEmbedder:
     """
-    Generate embeddings for multiple texts in one batch (much faster).
+    TF-IDF embedder with an explicit fit/transform lifecycle.
+
+    Each VectorStore owns its own embedder, so documents indexed in the
+    same process never share (or grow) a global corpus. Fitting builds a
+    new vectorizer and swaps it in under a lock, so concurrent transforms
+    always see a complete vectorizer.
     """
-    vectorizer = _get_vectorizer()
-    
-    try:
-        vectors = vectorizer.transform(texts).toarray()
-        return [v.tolist() for v in vectors]
-    except Exception:
-        # Fallback for each text
-        result = []
+
+    def __init__(self, max_features: Optional[int] = None):
+        self.max_features = max_features or settings.TFIDF_MAX_FEATURES
+        self._vectorizer: Optional[TfidfVectorizer] = None
+        self._lock = threading.Lock()
+        self.fit_id: Optional[int] = None  # changes on every fit, so vectors from different fits are never compared
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether fit() has been called successfully."""
+        return self._vectorizer is not None
+
+    @property
+    def n_features(self) -> int:
+        """Embedding dimension (the fitted vocabulary size)."""
+        vectorizer = self._vectorizer
+        if vectorizer is None:
+            return self.max_features
+        return len(vectorizer.vocabulary_)
+
+    def fit(self, texts: List[str]) -> "TfidfEmbedder":
+        """Fit a fresh vocabulary and IDF weights on the given texts."""
+        vectorizer = _new_vectorizer(self.max_features)
+        vectorizer.fit(texts)
+        with self._lock:
+            self._vectorizer = vectorizer
+            self.fit_id = next(_fit_ids)
+        return self
+
+    def transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        """
+        Embed texts as L2-normalized sparse TF-IDF rows.
+        Returns all-zero rows if the embedder has not been fitted.
+        """
+        with self._lock:
+            vectorizer = self._vectorizer
+
+        if vectorizer is None:
+            n_texts = sum(1 for _ in texts)
+            return sparse.csr_matrix((n_texts, self.n_features), dtype=np.float32)
+        return vectorizer.transform(texts).astype(np.float32).tocsr()
+
+    def fit_transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        """Fit on the texts and embed them in a single pass."""
+        vectorizer = _new_vectorizer(self.max_features)
+        matrix = vectorizer.fit_transform(texts)
+        with self._lock:
+            self._vectorizer = vectorizer
+            self.fit_id = next(_fit_ids)
+        return matrix.astype(np.float32).tocsr()
+
+    def count_misses(self, texts: Iterable[str]) -> int:
+        """
+        Number of texts the fitted vocabulary covers poorly: most of their
+        _TOP_WORDS most frequent words (stop words aside) are outside it,
+        so their embeddings miss what they are about. Every text with any
+        such words counts before fit().
+        """
+        with self._lock:
+            vectorizer = self._vectorizer
+        vocabulary = vectorizer.vocabulary_ if vectorizer is not None else {}
+
+        misses = 0
         for text in texts:
-            np.random.seed(hash(text) % (2**32))
-            result.append(np.random.rand(512).tolist())
-        return result
+            counts = Counter(_WORD.findall(text.lower())).most_common()
+            top = list(itertools.islice((w for w, _ in counts if w not in ENGLISH_STOP_WORDS), _TOP_WORDS))
+            if top and sum(word not in vocabulary for word in top) * 2 > len(top):
+                misses += 1
+        return misses
 
-def embed_text(text: str) -> list[float]:
-    """
-    Generate an embedding for text using TF-IDF.
-    Falls back to simple vector if vectorizer not fitted.
-    """
-    vectorizer = _get_vectorizer()
-    
-    try:
-        vector = vectorizer.transform([text]).toarray()[0]
-        return vector.tolist()
-    except Exception:
-        np.random.seed(hash(text) % (2**32))
-        return np.random.rand(512).tolist()
\ No newline at end of file
+    def save(self, directory: Path):
+        """
+        Write the fitted vocabulary and IDF weights to a directory.
+        Uses JSON and .npy files rather than pickle.
+        """
+        with self._lock:
+            vectorizer = self._vectorizer
+
+        state = {"max_features": self.max_features, "vocabulary": None}
+        if vectorizer is not None:
+            state["vocabulary"] = {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+            np.save(directory / "vectorizer_idf.npy", vectorizer.idf_.astype(np.float64))
+
+        with open(directory / "vectorizer.json", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, directory: Path) -> "TfidfEmbedder":
+        """Restore an embedder written by save()."""
+        with open(directory / "vectorizer.json", encoding="utf-8") as f:
+            state = json.load(f)
+
+        embedder = cls(state["max_features"])
+        if state["vocabulary"] is not None:
+            vectorizer = _new_vectorizer(embedder.max_features)
+            vectorizer.vocabulary_ = state["vocabulary"]
+            vectorizer.idf_ = np.load(directory / "vectorizer_idf.npy")
+            embedder._vectorizer = vectorizer
+            embedder.fit_id = next(_fit_ids)
+        return embedder
+
+    def embed_texts_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate dense embeddings for multiple texts in one batch.
+        Falls back to seeded random vectors if the embedder is not fitted.
+        """
+        if not self.is_fitted:
+            return [_fallback_vector(text, self.max_features) for text in texts]
+        return [v.tolist() for v in self.transform(texts).toarray()]
+
+    def embed_text(self, text: str) -> List[float]:
+        """Generate a dense embedding for a single text."""
+        return self.embed_texts_batch([text])[0]
+
+
+def _new_vectorizer(max_features: int) -> TfidfVectorizer:
+    return TfidfVectorizer(
+        max_features=max_features,
+        stop_words='english',
+        ngram_range=(1, 2)
+    )
+
+
+def _fallback_vector(text: str, dim: int) -> List[float]:
+    rng = np.random.default_rng(hash(text) % (2**32))
+    return rng.random(dim).tolist()
@@ -0,0 +1,424 @@
+import math
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+from scipy import sparse
+from app.core.core.config import settings, logger
+
+# Rows scored at once when scanning sparse int8 codes
+_SCORE_BLOCK = 65536
+
+# Dense int8 codes are decoded into a reused float32 buffer of about this
+# many elements, small enough to stay in cache between decode and score
+_DECODE_ELEMENTS = 1 << 17
+
+# Rows encoded at once while building codes
+_ENCODE_BLOCK = 8192
+
+# PQ centroids per subspace; each code is one byte
+_PQ_CENTROIDS = 256
+
+# Rows added since the codes were built are encoded once they exceed
+# 1/_PENDING_FRACTION of the codes (and _MIN_PENDING); until then
+# VectorStore.similarity_search scores them with their float vectors
+_PENDING_FRACTION = 64
+_MIN_PENDING = 1024
+
+# Scales and codebooks are refit once the store has grown this many times
+_RETRAIN_GROWTH = 4.0
+
+Matrix = Union[np.ndarray, sparse.spmatrix]
+
+
+class Int8Codes:
+    """
+    Per-dimension scaled int8 codes.
+
+    Dimension j is stored as round(x_j / scale_j), with scale_j chosen so
+    the largest magnitude seen in that dimension maps to 127; a score is
+    then (query * scales) . codes. Sparse stores keep the codes as an int8
+    CSR matrix (one byte per nonzero instead of four), dense stores as an
+    int8 matrix (four times smaller).
+    """
+
+    kind = "int8"
+
+    def __init__(self, scales: np.ndarray, codes: Matrix, trained_on: int):
+        """
+        Args:
+            scales: Per-dimension scale factors
+            codes: int8 codes, one row per chunk (CSR or dense)
+            trained_on: Store size when the scales were computed
+        """
+        self.scales = scales
+        self.codes = codes
+        self.trained_on = trained_on
+
+    @property
+    def size(self) -> int:
+        """Number of encoded rows; later store rows are not encoded yet."""
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return _nbytes(self.codes) + self.scales.nbytes
+
+    @classmethod
+    def build(cls, matrix: Matrix) -> "Int8Codes":
+        """Fit the scales on every row and encode them."""
+        if sparse.issparse(matrix):
+            peak = np.asarray(abs(matrix).max(axis=0).toarray()).ravel()
+        else:
+            peak = np.zeros(matrix.shape[1], dtype=np.float32)
+            for lo in range(0, matrix.shape[0], _ENCODE_BLOCK):
+                np.maximum(peak, np.abs(matrix[lo:lo + _ENCODE_BLOCK]).max(axis=0), out=peak)
+        scales = (peak / 127).astype(np.float32)
+        scales[scales == 0] = 1.0
+        return cls(scales, _encode_int8(matrix, scales), trained_on=matrix.shape[0])
+
+    def extend(self, matrix: Matrix) -> "Int8Codes":
+        """Return new codes that also cover rows size..len(matrix), with the same scales."""
+        if matrix.shape[0] <= self.size:
+            return self
+        added = _encode_int8(matrix[self.size:], self.scales)
+        if sparse.issparse(added):
+            codes = sparse.vstack([self.codes, added], format="csr")
+        else:
+            codes = np.concatenate([self.codes, added])
+        return Int8Codes(self.scales, codes, self.trained_on)
+
+    def take(self, keep: np.ndarray) -> "Int8Codes":
+        """Return codes for the rows where keep is True, renumbered in order (see VectorStore.compact)."""
+        return Int8Codes(self.scales, self.codes[np.flatnonzero(keep[:self.size])], self.trained_on)
+
+    def scores(self, query: Matrix, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate dot products of the query with encoded rows.
+
+        Args:
+            query: Query embedding, dense or a 1-row sparse matrix
+            rows: Row ids to score (all encoded rows if omitted)
+
+        Returns:
+            One float32 score per row
+        """
+        weights = _dense_query(query) * self.scales
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+
+        # Blocks bound the float copy of the codes that scoring makes
+        if sparse.issparse(codes):
+            for lo in range(0, codes.shape[0], _SCORE_BLOCK):
+                scores[lo:lo + _SCORE_BLOCK] = codes[lo:lo + _SCORE_BLOCK] @ weights
+            return scores
+
+        step = max(1, _DECODE_ELEMENTS // codes.shape[1])
+        buffer = np.empty((step, codes.shape[1]), dtype=np.float32)
+        for lo in range(0, codes.shape[0], step):
+            block = codes[lo:lo + step]
+            decoded = buffer[:len(block)]
+            np.copyto(decoded, block, casting="unsafe")
+            scores[lo:lo + step] = decoded @ weights
+        return scores
+
+    def save(self, directory: Path) -> dict:
+        """Write the codes into an index directory; returns the manifest entry."""
+        directory = Path(directory)
+        np.save(directory / "quant.scales.npy", self.scales)
+        if sparse.issparse(self.codes):
+            np.save(directory / "quant.data.npy", self.codes.data)
+            np.save(directory / "quant.indices.npy", self.codes.indices.astype(np.int32))
+            np.save(directory / "quant.indptr.npy", self.codes.indptr.astype(np.int64))
+        else:
+            np.save(directory / "quant.codes.npy", np.ascontiguousarray(self.codes))
+        return {
+            "kind": self.kind,
+            "sparse": sparse.issparse(self.codes),
+            "size": self.size,
+            "dim": len(self.scales),
+            "trained_on": self.trained_on,
+        }
+
+    @classmethod
+    def load(cls, directory: Path, meta: dict, mmap_mode: Optional[str] = None) -> "Int8Codes":
+        directory = Path(directory)
+        if meta["sparse"]:
+            codes = sparse.csr_matrix(
+                (
+                    np.load(directory / "quant.data.npy", mmap_mode=mmap_mode),
+                    np.load(directory / "quant.indices.npy", mmap_mode=mmap_mode),
+                    np.load(directory / "quant.indptr.npy", mmap_mode=mmap_mode),
+                ),
+                shape=(meta["size"], meta["dim"]),
+                copy=False
+            )
+        else:
+            codes = np.load(directory / "quant.codes.npy", mmap_mode=mmap_mode)
+        return cls(np.load(directory / "quant.scales.npy"), codes, meta["trained_on"])
+
+
+class PQCodes:
+    """
+    Product-quantization codes scored by asymmetric distance computation.
+
+    The dimensions are split into n_subspaces contiguous sub-vectors and
+    k-means learns 256 centroids for each, so a row is stored as one byte
+    per subspace. A query is not quantized: it is compared with every
+    centroid once, building a small lookup table per subspace, and a
+    row's score is the sum of its codes' table entries. Subspaces where
+    the query is all zero contribute nothing and are skipped, which keeps
+    sparse TF-IDF queries cheap.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks: np.ndarray, codes: np.ndarray, dim: int, trained_on: int):
+        """
+        Args:
+            codebooks: (n_subspaces, centroids, sub_dim) centroids
+            codes: (n_subspaces, rows) centroid ids, one column per chunk
+            dim: Embedding dimension (sub-vectors are zero-padded to fit)
+            trained_on: Store size when the codebooks were trained
+        """
+        self.codebooks = codebooks
+        self.codes = codes
+        self.dim = dim
+        self.trained_on = trained_on
+
+    @property
+    def n_subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def size(self) -> int:
+        """Number of encoded rows; later store rows are not encoded yet."""
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        matrix: Matrix,
+        n_subspaces: int,
+        sample_size: int,
+        iterations: int = 10,
+        seed: int = 0
+    ) -> "PQCodes":
+        """
+        Train one codebook per subspace on a sample of the rows, then encode every row.
+
+        Args:
+            matrix: Unit-length embeddings, dense or CSR
+            n_subspaces: Sub-vectors per embedding
+            sample_size: Rows sampled for k-means
+            iterations: Maximum k-means iterations per subspace
+            seed: Seed for sampling and initialization
+        """
+        n, dim = matrix.shape
+        n_subspaces = max(1, min(n_subspaces, dim))
+        sub_dim = math.ceil(dim / n_subspaces)
+        rng = np.random.default_rng(seed)
+
+        sample = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        data = _column_view(matrix[sample])
+        codebooks = np.stack([
+            _kmeans(_subspace(data, m, sub_dim), _PQ_CENTROIDS, iterations, rng)
+            for m in range(n_subspaces)
+        ])
+        empty = cls(codebooks, np.empty((n_subspaces, 0), dtype=np.uint8), dim, trained_on=n)
+        return empty.extend(matrix)
+
+    def extend(self, matrix: Matrix) -> "PQCodes":
+        """Return new codes that also cover rows size..len(matrix), with the same codebooks."""
+        if matrix.shape[0] <= self.size:
+            return self
+        added = self._encode(matrix[self.size:])
+        return PQCodes(self.codebooks, np.concatenate([self.codes, added], axis=1), self.dim, self.trained_on)
+
+    def take(self, keep: np.ndarray) -> "PQCodes":
+        """Return codes for the rows where keep is True, renumbered in order (see VectorStore.compact)."""
+        return PQCodes(self.codebooks, self.codes[:, keep[:self.size]], self.dim, self.trained_on)
+
+    def _encode(self, matrix: Matrix) -> np.ndarray:
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((self.n_subspaces, matrix.shape[0]), dtype=np.uint8)
+        for lo in range(0, matrix.shape[0], _ENCODE_BLOCK):
+            block = _column_view(matrix[lo:lo + _ENCODE_BLOCK])
+            for m in range(self.n_subspaces):
+                codes[m, lo:lo + _ENCODE_BLOCK] = _closest(_subspace(block, m, sub_dim), self.codebooks[m])
+        return codes
+
+    def scores(self, query: Matrix, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate dot products of the query with encoded rows.
+
+        Args:
+            query: Query embedding, dense or a 1-row sparse matrix
+            rows: Row ids to score (all encoded rows if omitted)
+
+        Returns:
+            One float32 score per row
+        """
+        sub_dim = self.codebooks.shape[2]
+        padded = np.zeros(self.n_subspaces * sub_dim, dtype=np.float32)
+        padded[:self.dim] = _dense_query(query)
+        parts = padded.reshape(self.n_subspaces, sub_dim)
+
+        active = np.flatnonzero(parts.any(axis=1))
+        tables = np.einsum("mkd,md->mk", self.codebooks[active], parts[active])
+        scores = np.zeros(self.size if rows is None else len(rows), dtype=np.float32)
+        for m, table in zip(active, tables):
+            codes = self.codes[m] if rows is None else self.codes[m, rows]
+            scores += table[codes]
+        return scores
+
+    def save(self, directory: Path) -> dict:
+        """Write the codebooks and codes into an index directory; returns the manifest entry."""
+        directory = Path(directory)
+        np.save(directory / "quant.codebooks.npy", self.codebooks)
+        np.save(directory / "quant.codes.npy", np.ascontiguousarray(self.codes))
+        return {"kind": self.kind, "size": self.size, "dim": self.dim, "trained_on": self.trained_on}
+
+    @classmethod
+    def load(cls, directory: Path, meta: dict, mmap_mode: Optional[str] = None) -> "PQCodes":
+        directory = Path(directory)
+        return cls(
+            np.load(directory / "quant.codebooks.npy"),
+            np.load(directory / "quant.codes.npy", mmap_mode=mmap_mode),
+            meta["dim"],
+            meta["trained_on"],
+        )
+
+
+QuantizedCodes = Union[Int8Codes, PQCodes]
+
+
+def load_codes(directory: Path, meta: dict, mmap_mode: Optional[str] = None) -> QuantizedCodes:
+    """Load codes saved by Int8Codes.save or PQCodes.save from their manifest entry."""
+    kinds = {"int8": Int8Codes, "pq": PQCodes}
+    if meta.get("kind") not in kinds:
+        raise ValueError(f"Unknown quantization kind: {meta.get('kind')}")
+    return kinds[meta["kind"]].load(directory, meta, mmap_mode)
+
+
+def compression_ratio(codes: QuantizedCodes, matrix: Matrix) -> float:
+    """Size of the float32 embeddings the codes cover, divided by the size of the codes."""
+    if sparse.issparse(matrix):
+        covered = matrix.indptr[codes.size]
+        float_bytes = covered * (matrix.data.itemsize + matrix.indices.itemsize) + (codes.size + 1) * matrix.indptr.itemsize
+    else:
+        float_bytes = codes.size * matrix.shape[1] * matrix.itemsize
+    return float_bytes / max(1, codes.nbytes)
+
+
+def update_quantization(vector_store) -> Optional[QuantizedCodes]:
+    """
+    Bring the store's quantized codes up to date as the store grows.
+
+    The codes are built with settings.QUANTIZATION ("int8" or "pq") and
+    refit once the store has grown _RETRAIN_GROWTH times since; rows
+    added in between are encoded in batches with the existing scales or
+    codebooks.
+    """
+    kind = settings.QUANTIZATION
+    if kind and kind not in ("int8", "pq"):
+        raise ValueError(f"Unknown QUANTIZATION: {kind}")
+
+    # Rows must not be renumbered by a compaction while they are encoded
+    with vector_store.writing():
+        codes: Optional[QuantizedCodes] = vector_store.quantized
+        size = len(vector_store)
+        if not kind or not size:
+            return codes
+
+        matrix = vector_store.embedding_matrix()
+        if codes is None or codes.kind != kind or size >= codes.trained_on * _RETRAIN_GROWTH:
+            if kind == "int8":
+                codes = Int8Codes.build(matrix)
+            else:
+                n_subspaces = settings.QUANT_PQ_SUBSPACES or max(1, matrix.shape[1] // 8)
+                codes = PQCodes.build(matrix, n_subspaces, settings.QUANT_TRAIN_SAMPLE)
+            logger.info(
+                f"Quantized {size} chunks ({kind}): "
+                f"{compression_ratio(codes, matrix):.1f}x smaller than float32"
+            )
+        elif size - codes.size >= max(_MIN_PENDING, codes.size // _PENDING_FRACTION):
+            codes = codes.extend(matrix)
+
+        vector_store.quantized = codes
+        return codes
+
+
+def _nbytes(matrix: Matrix) -> int:
+    if sparse.issparse(matrix):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return matrix.nbytes
+
+
+def _dense_query(query: Matrix) -> np.ndarray:
+    if sparse.issparse(query):
+        return query.toarray().ravel().astype(np.float32)
+    return np.asarray(query, dtype=np.float32).ravel()
+
+
+def _encode_int8(matrix: Matrix, scales: np.ndarray) -> Matrix:
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix)
+        data = np.clip(np.rint(matrix.data / scales[matrix.indices]), -127, 127).astype(np.int8)
+        return sparse.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape)
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    for lo in range(0, matrix.shape[0], _ENCODE_BLOCK):
+        block = np.rint(matrix[lo:lo + _ENCODE_BLOCK] / scales)
+        codes[lo:lo + _ENCODE_BLOCK] = np.clip(block, -127, 127)
+    return codes
+
+
+def _column_view(matrix: Matrix) -> Matrix:
+    """CSC for sparse rows, so each subspace's columns slice cheaply."""
+    return sparse.csc_matrix(matrix) if sparse.issparse(matrix) else np.asarray(matrix, dtype=np.float32)
+
+
+def _subspace(matrix: Matrix, m: int, sub_dim: int) -> np.ndarray:
+    """Dense columns of subspace m, zero-padded to sub_dim."""
+    lo = m * sub_dim
+    part = matrix[:, lo:lo + sub_dim]
+    part = part.toarray() if sparse.issparse(part) else part
+    part = np.asarray(part, dtype=np.float32)
+    if part.shape[1] < sub_dim:
+        part = np.pad(part, ((0, 0), (0, sub_dim - part.shape[1])))
+    return part
+
+
+def _closest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest (Euclidean) centroid for every vector."""
+    sq_norms = (centroids * centroids).sum(axis=1)
+    # Sparse embeddings leave many sub-vectors all zero; they share one nearest centroid
+    labels = np.full(len(vectors), sq_norms.argmin(), dtype=np.int64)
+    nonzero = np.flatnonzero(vectors.any(axis=1))
+    if len(nonzero):
+        distances = vectors[nonzero] @ centroids.T
+        distances *= -2
+        distances += sq_norms
+        labels[nonzero] = distances.argmin(axis=1)
+    return labels
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int, rng) -> np.ndarray:
+    """Euclidean k-means; returns (k, dim) centroids, repeating rows if there are fewer than k distinct points."""
+    n = len(vectors)
+    centroids = vectors[rng.choice(n, size=k, replace=n < k)].copy()
+    labels = None
+    for _ in range(max(1, iterations)):
+        new_labels = _closest(vectors, centroids)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        members = sparse.csr_matrix((np.ones(n, dtype=np.float32), (labels, np.arange(n))), shape=(k, n))
+        sums = np.asarray(members @ vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids.astype(np.float32)
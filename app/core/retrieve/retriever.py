@@ -1,13 +1,85 @@
-from app.core.retrieve.embedder import embed_text #Converts raw text to embedded text
+from typing import List, Optional
 from app.core.retrieve.vector_store import VectorStore 
+from app.core.retrieve.bm25 import retrieve_bm25
 from app.core.core.config import settings
+from app.core.core.tracing import span
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.schemas.filter import SearchFilter
+
+# Tries at embedding and searching before a vocabulary that keeps changing is an error
+_EMBED_ATTEMPTS = 3
+
+
+def _embed_and_search(queries:List[str], vector_store:VectorStore, search):
+    """
+    Embed queries with the store's embedder and run search on them.
+
+    Adding documents can refit the store's vocabulary between the two
+    steps (see VectorStore.refit_embedder); the queries are then embedded
+    again with the new embedder, so they are never scored against vectors
+    from another fit. Refits are rare, so after _EMBED_ATTEMPTS tries
+    that each overlapped one a RuntimeError is raised.
+    """
+    for _ in range(_EMBED_ATTEMPTS):
+        embedder = vector_store.embedder
+        with span("retrieve.embed"):
+            query_embeddings = embedder.transform(queries) #Sparse embedding with the store's vocabulary
+        try:
+            with span("retrieve.search"):
+                results = search(query_embeddings)
+        except ValueError:
+            if vector_store.embedder is embedder:
+                raise
+            continue
+        if vector_store.embedder is embedder:
+            return results
+    raise RuntimeError(f"The vector store's vocabulary changed during each of {_EMBED_ATTEMPTS} searches")
+
+
 def retrieve_relevant_chunks(
         query:str, #The user question
-        vector_store:VectorStore
+        vector_store:VectorStore,
+        search_filter:Optional[SearchFilter]=None #Only search chunks matching this filter
 ):
     
-    query_embedding=embed_text(query)
-    return vector_store.similarity_search(
-        query_embedding,
-        settings.TOP_K
-    )
+    with span("retrieve", engine=settings.RETRIEVAL_ENGINE, top_k=settings.TOP_K, store_chunks=len(vector_store), filtered=search_filter is not None) as s:
+        if settings.RETRIEVAL_ENGINE == "bm25":
+            with span("retrieve.search"):
+                chunks = retrieve_bm25(query, vector_store, settings.TOP_K, search_filter)
+        elif settings.RETRIEVAL_ENGINE == "tfidf":
+            chunks = _embed_and_search([query], vector_store, lambda query_embedding: vector_store.similarity_search(
+                query_embedding,
+                settings.TOP_K,
+                search_filter=search_filter
+            ))
+        else:
+            raise ValueError(f"Unknown RETRIEVAL_ENGINE: {settings.RETRIEVAL_ENGINE}")
+        s.set(chunks=len(chunks))
+        return chunks
+
+
+def retrieve_relevant_chunks_batch(
+        queries:List[str],
+        vector_store:VectorStore,
+        search_filter:Optional[SearchFilter]=None
+) -> List[List[EmbeddedChunk]]:
+    """
+    retrieve_relevant_chunks for many queries at once.
+
+    With the TF-IDF engine all queries are embedded in one transform
+    call and scored with one matrix product; BM25 is searched per query.
+    """
+    with span("retrieve.batch", engine=settings.RETRIEVAL_ENGINE, top_k=settings.TOP_K, queries=len(queries)):
+        if settings.RETRIEVAL_ENGINE == "bm25":
+            with span("retrieve.search"):
+                return [retrieve_bm25(query, vector_store, settings.TOP_K, search_filter) for query in queries]
+        if settings.RETRIEVAL_ENGINE != "tfidf":
+            raise ValueError(f"Unknown RETRIEVAL_ENGINE: {settings.RETRIEVAL_ENGINE}")
+        if not queries:
+            return []
+
+        return _embed_and_search(queries, vector_store, lambda query_embeddings: vector_store.similarity_search_batch(
+            query_embeddings,
+            settings.TOP_K,
+            search_filter=search_filter
+        ))
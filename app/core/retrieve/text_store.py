@@ -0,0 +1,225 @@
+import json
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+
+class PageRecord(NamedTuple):
+    """
+    The hash one page of a source was indexed from, and where its text lives.
+    
+    segments are (doc_id, start, end) ranges whose texts, joined in
+    order, are the page; a page re-indexed together with part of its
+    neighbour's text spans two documents.
+    """
+    hash: str
+    segments: Tuple[Tuple[int, int, int], ...]
+
+
+class TextStore:
+    """
+    Append-only store of document texts.
+    
+    Each document's text is held once; chunks refer to it by
+    (doc_id, start, end) offsets and are sliced only when needed.
+    Source names are interned, so documents from the same source
+    share one string, and each source keeps the list of its doc_ids:
+    the partition a source filter selects without scanning the rest.
+    Documents also record when they were added, optional metadata and,
+    for paged formats, the offset where each page starts. Sources that
+    were indexed page by page keep one PageRecord per page, so a later
+    refresh can tell which pages changed (see ingest.refresh).
+    """
+    
+    def __init__(self):
+        self._texts: List[str] = []
+        self._doc_source = array("i")
+        self._standalone = bytearray()
+        self._ingested_at = array("d")
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._page_offsets: List[Optional[List[int]]] = []
+        self.sources: List[str] = []
+        self._source_ids: Dict[str, int] = {}
+        self._source_docs: List[array] = []
+        self._pages: Dict[str, List[PageRecord]] = {}
+    
+    def intern_source(self, source: str) -> int:
+        """Return the id of a source name, adding it to the table if new."""
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = len(self.sources)
+            self.sources.append(source)
+            self._source_ids[source] = source_id
+            self._source_docs.append(array("i"))
+        return source_id
+    
+    def add(
+        self,
+        text: str,
+        source: str,
+        standalone: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        page_offsets: Optional[List[int]] = None
+    ) -> int:
+        """
+        Store a text and return its doc_id.
+        
+        ``standalone`` marks a text that is a single chunk rather than a
+        whole document, so offsets into it say nothing about the source.
+        """
+        doc_id = len(self._texts)
+        source_id = self.intern_source(source)
+        self._texts.append(text)
+        self._doc_source.append(source_id)
+        self._standalone.append(standalone)
+        self._ingested_at.append(time.time())
+        self._metadata.append(metadata or None)
+        self._page_offsets.append(list(page_offsets) if page_offsets else None)
+        self._source_docs[source_id].append(doc_id)
+        return doc_id
+    
+    def text(self, doc_id: int) -> str:
+        return self._texts[doc_id]
+    
+    def source_id(self, doc_id: int) -> int:
+        return self._doc_source[doc_id]
+    
+    def source(self, doc_id: int) -> str:
+        return self.sources[self._doc_source[doc_id]]
+    
+    def is_standalone(self, doc_id: int) -> bool:
+        return bool(self._standalone[doc_id])
+    
+    def ingested_at(self, doc_id: int) -> float:
+        """Unix time the document was added (0 for indexes saved before this was recorded)."""
+        return self._ingested_at[doc_id]
+    
+    def ingestion_times(self, doc_ids: np.ndarray) -> np.ndarray:
+        """ingested_at for many documents at once."""
+        # Index the array item by item: a buffer view would block add() from
+        # growing it, and a copy would cost the whole corpus per query
+        ingested_at = self._ingested_at
+        return np.array([ingested_at[int(doc_id)] for doc_id in doc_ids], dtype=np.float64)
+    
+    def metadata(self, doc_id: int) -> Dict[str, Any]:
+        return self._metadata[doc_id] or {}
+    
+    def page_offsets(self, doc_id: int) -> Optional[List[int]]:
+        """Character offset where each page of the document starts, if known."""
+        return self._page_offsets[doc_id]
+    
+    def docs_for_sources(self, sources: Iterable[str]) -> np.ndarray:
+        """Sorted doc_ids of the given sources; unknown sources match nothing."""
+        # Read copies, not views: add() may append to these arrays while a search reads them
+        parts = [
+            np.frombuffer(self._source_docs[self._source_ids[source]].tobytes(), dtype=np.int32)
+            for source in set(sources) if source in self._source_ids
+        ]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+    
+    def pages(self, source: str) -> Optional[List[PageRecord]]:
+        """The source's page records in page order, or None if it was not indexed page by page."""
+        return self._pages.get(source)
+    
+    def set_pages(self, source: str, records: Optional[List[PageRecord]]):
+        """Replace (or with None, forget) the page records of a source."""
+        if records is None:
+            self._pages.pop(source, None)
+        else:
+            self._pages[source] = list(records)
+    
+    def take(self, doc_ids: np.ndarray) -> Tuple["TextStore", np.ndarray]:
+        """
+        A new store holding only the given documents, renumbered in order.
+        
+        Source ids are unchanged. Page records lose the segments that
+        were in a dropped document, and their hash if that removed any
+        text, so the next refresh re-indexes those pages.
+        
+        Args:
+            doc_ids: Sorted doc_ids to keep
+            
+        Returns:
+            The new store and the new doc_id of every old one (-1 if dropped)
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        remap = np.full(len(self._texts), -1, dtype=np.int64)
+        remap[doc_ids] = np.arange(len(doc_ids))
+        
+        store = TextStore()
+        store.sources = list(self.sources)
+        store._source_ids = dict(self._source_ids)
+        store._source_docs = [array("i") for _ in self.sources]
+        for old_id in doc_ids.tolist():
+            store._texts.append(self._texts[old_id])
+            store._doc_source.append(self._doc_source[old_id])
+            store._standalone.append(self._standalone[old_id])
+            store._ingested_at.append(self._ingested_at[old_id])
+            store._metadata.append(self._metadata[old_id])
+            store._page_offsets.append(self._page_offsets[old_id])
+            store._source_docs[self._doc_source[old_id]].append(len(store._texts) - 1)
+        
+        for source, records in self._pages.items():
+            kept = []
+            for record in records:
+                segments = tuple(
+                    (int(remap[doc_id]), start, end) for doc_id, start, end in record.segments if remap[doc_id] >= 0
+                )
+                lost = len(segments) < len(record.segments)
+                kept.append(PageRecord("" if lost else record.hash, segments))
+            store._pages[source] = kept
+        return store, remap
+    
+    def slice(self, doc_id: int, start: int, end: int) -> str:
+        """Return the text between two offsets of a document."""
+        return self._texts[doc_id][start:end]
+    
+    def save(self, directory: Path):
+        """Write the texts and source table to documents.json."""
+        with open(directory / "documents.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "sources": self.sources,
+                "source_id": self._doc_source.tolist(),
+                "standalone": list(self._standalone),
+                "ingested_at": self._ingested_at.tolist(),
+                "metadata": self._metadata,
+                "page_offsets": self._page_offsets,
+                "pages": self._pages,
+                "text": self._texts,
+            }, f)
+    
+    @classmethod
+    def load(cls, directory: Path) -> "TextStore":
+        """Restore a store written by save()."""
+        with open(directory / "documents.json", encoding="utf-8") as f:
+            data = json.load(f)
+        
+        store = cls()
+        for source in data["sources"]:
+            store.intern_source(source)
+        store._texts = data["text"]
+        store._doc_source = array("i", data["source_id"])
+        store._standalone = bytearray(data["standalone"])
+        
+        # Indexes saved before these fields existed load with empty values
+        n_docs = len(store._texts)
+        store._ingested_at = array("d", data.get("ingested_at") or [0.0] * n_docs)
+        store._metadata = data.get("metadata") or [None] * n_docs
+        store._page_offsets = data.get("page_offsets") or [None] * n_docs
+        store._pages = {
+            source: [PageRecord(page_hash, tuple(map(tuple, segments))) for page_hash, segments in records]
+            for source, records in (data.get("pages") or {}).items()
+        }
+        for doc_id, source_id in enumerate(store._doc_source):
+            store._source_docs[source_id].append(doc_id)
+        return store
+    
+    @property
+    def total_characters(self) -> int:
+        return sum(len(t) for t in self._texts)
+    
+    def __len__(self) -> int:
+        """Return the number of documents."""
+        return len(self._texts)
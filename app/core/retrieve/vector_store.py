@@ -1,9 +1,41 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 import numpy as np
-import pickle
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+from scipy import sparse
+from sklearn.preprocessing import normalize
 from app.core.schemas.embedding import EmbeddedChunk
-from app.core.core.config import logger
+from app.core.schemas.filter import SearchFilter
+from app.core.retrieve.embedder import TfidfEmbedder
+from app.core.retrieve.text_store import PageRecord, TextStore
+from app.core.retrieve.ann import IVFIndex
+from app.core.retrieve.quantize import QuantizedCodes, load_codes
+from app.core.retrieve.chunk_table import ChunkTable, ChunkView
+from app.core.core.config import settings, logger
+
+
+# Bumped whenever the on-disk layout written by VectorStore.save changes
+INDEX_FORMAT_VERSION = 3
+
+# Initial row capacity of the embedding matrix; it doubles whenever it fills up
+_INITIAL_CAPACITY = 1024
+
+# Upper bound on (chunks x queries) scores held at once by similarity_search_batch
+_BATCH_SCORE_ELEMENTS = 1 << 24
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place, leaving all-zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
 
 
 class VectorStore:
@@ -11,64 +43,620 @@ class VectorStore:
     In-memory vector store with persistence support.
     
     Stores embedded document chunks and provides similarity search.
+    Embeddings are kept in one contiguous float32 matrix whose rows are
+    normalized once when added, so a query is a single mat-vec. Sparse
+    embeddings (e.g. TF-IDF) are kept as a CSR matrix instead, so memory
+    scales with the number of nonzeros rather than the vocabulary.
+    Each store owns the embedder that produced its vectors, so several
+    stores can be indexed and queried concurrently in one process.
+    Chunks are rows of a columnar ChunkTable: (doc_id, start, end) offsets
+    into a shared TextStore. EmbeddedChunk objects are only built for the
+    results that are returned.
+    Large stores can carry an IVF index (see retrieve.ann) so a search
+    scores only the rows in the lists closest to the query, and int8 or
+    product-quantized codes (see retrieve.quantize) so it scans compact
+    codes and reads float vectors only to re-rank the best candidates.
+    Chunks and documents are deleted by tombstoning their rows: searches
+    skip them at once, and a compaction (in the background once enough
+    rows are deleted, and always before save) removes them for good.
     Can save/load state to disk for caching.
     """
     
-    def __init__(self):
-        self.vectors: List[EmbeddedChunk] = []
+    def __init__(self, embedder: Optional[TfidfEmbedder] = None):
+        self.embedder = embedder or TfidfEmbedder()
+        self._lock = threading.RLock()
+        self.chunks = ChunkTable()
         self._source_file: Optional[str] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._sparse: Optional[sparse.csr_matrix] = None
+        self._sparse_blocks: List[sparse.csr_matrix] = []
+        # Optional BM25 inverted index over the same chunks (see retrieve.bm25)
+        self.bm25_index = None
+        # Optional approximate nearest-neighbor index (see retrieve.ann)
+        self.ann_index: Optional[IVFIndex] = None
+        # Optional compressed copy of the embeddings (see retrieve.quantize)
+        self.quantized: Optional[QuantizedCodes] = None
+        # Rows added since the embedder was fitted that its vocabulary covers poorly (see ingest.indexer.refit_due)
+        self.vocabulary_misses = 0
+        # Tombstones: True for deleted rows, at least _size long; None until something is deleted
+        self._deleted: Optional[np.ndarray] = None
+        self._n_deleted = 0
+        # Held by writers and for the whole of a compaction; searches only take _lock
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._compactor: Optional[threading.Thread] = None
     
     def add(self, embedded_chunk: EmbeddedChunk):
         """Add an embedded chunk to the store."""
-        self.vectors.append(embedded_chunk)
+        self.add_batch([embedded_chunk])
+    
+    def add_batch(self, embedded_chunks: List[EmbeddedChunk]):
+        """Add several embedded chunks, growing the matrix at most once."""
+        if not embedded_chunks:
+            return
+        
+        rows = np.array([c.embedding for c in embedded_chunks], dtype=np.float32)
+        if rows.ndim != 2:
+            raise ValueError("All embeddings must have the same dimension")
+        
+        with self.writing(), self._lock:
+            block = self._prepare_rows(rows)
+            self._commit_rows(block)
+            self.chunks.append_standalone(embedded_chunks)
+    
+    def add_sparse(self, embedded_chunks: Sequence, matrix: sparse.spmatrix):
+        """
+        Add chunks whose embeddings are the rows of a sparse matrix.
+        
+        Any objects with chunk_id, text and source work (EmbeddedChunk or
+        DocumentChunk); their ``embedding`` lists, if any, are not used.
+        
+        Args:
+            embedded_chunks: Chunks in the same order as the matrix rows
+            matrix: Sparse embeddings, one row per chunk
+        """
+        if len(embedded_chunks) != matrix.shape[0]:
+            raise ValueError(
+                f"Got {len(embedded_chunks)} chunks for {matrix.shape[0]} embedding rows"
+            )
+        if not embedded_chunks:
+            return
+        
+        with self.writing(), self._lock:
+            block = self._prepare_rows(sparse.csr_matrix(matrix))
+            self._commit_rows(block)
+            self.chunks.append_standalone(embedded_chunks)
+    
+    def add_document(
+        self,
+        text: str,
+        source: str,
+        offsets: List[Tuple[int, int]],
+        matrix: Union[np.ndarray, sparse.spmatrix],
+        metadata: Optional[dict] = None,
+        page_offsets: Optional[List[int]] = None,
+        page_hashes: Optional[List[str]] = None,
+        first_chunk_id: int = 0
+    ) -> int:
+        """
+        Add a document's chunks as offsets into its text.
+        
+        The text is stored once, however much the chunks overlap.
+        
+        Args:
+            text: Full document text
+            source: Document name
+            offsets: (start, end) of each chunk, in chunk_id order
+            matrix: Embeddings (dense or sparse), one row per chunk
+            metadata: Values a SearchFilter can match the document on
+            page_offsets: Character offset where each page starts, if known
+            page_hashes: Hash of each page (one page if page_offsets is
+                None), recorded as the source's pages for later refreshes
+            first_chunk_id: chunk_id of the first chunk
+            
+        Returns:
+            The doc_id assigned to the document
+        """
+        if len(offsets) != matrix.shape[0]:
+            raise ValueError(f"Got {len(offsets)} chunks for {matrix.shape[0]} embedding rows")
+        
+        bounds = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        with self.writing(), self._lock:
+            block = self._prepare_rows(matrix)
+            self._commit_rows(block)
+            texts = self.chunks.texts
+            doc_id = texts.add(text, source, metadata=metadata, page_offsets=page_offsets)
+            self.chunks.append_document(doc_id, bounds[:, 0], bounds[:, 1], first_chunk_id)
+            if page_hashes is not None:
+                starts = list(page_offsets or [0])
+                ends = starts[1:] + [len(text)]
+                texts.set_pages(source, [
+                    PageRecord(page_hash, ((doc_id, start, end),) if end > start else ())
+                    for page_hash, start, end in zip(page_hashes, starts, ends)
+                ])
+        return doc_id
+    
+    def _prepare_rows(self, matrix: Union[np.ndarray, sparse.spmatrix]):
+        """Validate new embedding rows against the store and L2-normalize them."""
+        if sparse.issparse(matrix):
+            if self._matrix is not None:
+                raise ValueError("Cannot add sparse embeddings to a dense vector store")
+            dim = self._sparse_dim()
+            block = normalize(sparse.csr_matrix(matrix, dtype=np.float32), norm="l2", copy=False)
+        else:
+            if self.is_sparse:
+                raise ValueError("Cannot add dense embeddings to a sparse vector store")
+            dim = self._matrix.shape[1] if self._matrix is not None else None
+            block = _normalize_rows(np.array(matrix, dtype=np.float32))
+        
+        if dim is not None and dim != block.shape[1]:
+            raise ValueError(f"Embedding dimension mismatch: store has {dim}, got {block.shape[1]}")
+        return block
+    
+    def _commit_rows(self, block):
+        """Append prepared embedding rows; caller holds the lock and adds the chunk rows."""
+        n = block.shape[0]
+        if sparse.issparse(block):
+            self._sparse_blocks.append(block)
+        else:
+            self._ensure_capacity(self._size + n, block.shape[1])
+            self._matrix[self._size:self._size + n] = block
+        if self._deleted is not None and len(self._deleted) < self._size + n:
+            grown = np.zeros(max(2 * len(self._deleted), self._size + n), dtype=bool)
+            grown[:self._size] = self._deleted[:self._size]
+            self._deleted = grown
+        self._size += n
+    
+    @property
+    def vectors(self) -> List[EmbeddedChunk]:
+        """
+        All chunks as EmbeddedChunk objects.
+        
+        Builds a new object (and slices text) for every chunk; prefer
+        view() or iter_texts() on large stores. Deleted chunks are left out.
+        """
+        deleted = self._deleted
+        return [
+            self.chunks.view(i).to_embedded_chunk()
+            for i in range(self._size) if deleted is None or not deleted[i]
+        ]
+    
+    def view(self, index: int) -> ChunkView:
+        """Return a lightweight view of the chunk at a row index."""
+        return self.chunks.view(index)
+    
+    def get_chunk(self, index: int) -> EmbeddedChunk:
+        """Return the chunk at a row index as an EmbeddedChunk."""
+        return self.chunks.view(index).to_embedded_chunk()
+    
+    def iter_texts(self, start: int = 0) -> Iterator[str]:
+        """Yield chunk texts from a row index onwards."""
+        return self.chunks.iter_texts(start)
+    
+    @property
+    def is_sparse(self) -> bool:
+        """Whether the store holds sparse embeddings."""
+        return self._sparse is not None or bool(self._sparse_blocks)
+    
+    def _sparse_dim(self) -> Optional[int]:
+        if self._sparse is not None:
+            return self._sparse.shape[1]
+        if self._sparse_blocks:
+            return self._sparse_blocks[0].shape[1]
+        return None
+    
+    def _sparse_matrix(self) -> sparse.csr_matrix:
+        """Return the CSR matrix, stacking pending blocks in one go."""
+        if self._sparse_blocks:
+            blocks = [self._sparse] if self._sparse is not None else []
+            self._sparse = sparse.vstack(blocks + self._sparse_blocks, format="csr")
+            self._sparse_blocks = []
+        return self._sparse
+    
+    def _ensure_capacity(self, required: int, dim: int):
+        """Allocate or grow the embedding matrix in amortized steps."""
+        if self._matrix is None:
+            capacity = max(_INITIAL_CAPACITY, required)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            return
+        
+        if self._matrix.shape[1] != dim:
+            raise ValueError(
+                f"Embedding dimension mismatch: store has {self._matrix.shape[1]}, got {dim}"
+            )
+        
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        grown = np.zeros((capacity, dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
     
     def clear(self):
-        """Clear all vectors from the store."""
-        self.vectors = []
-        self._source_file = None
+        """Clear all vectors from the store, along with its fitted embedder."""
+        with self._write_lock, self._lock:
+            self.chunks = ChunkTable()
+            self._source_file = None
+            self._matrix = None
+            self._size = 0
+            self._sparse = None
+            self._sparse_blocks = []
+            self.bm25_index = None
+            self.ann_index = None
+            self.quantized = None
+            self._deleted = None
+            self._n_deleted = 0
+            self.vocabulary_misses = 0
+            self.embedder = TfidfEmbedder(self.embedder.max_features)
     
     def __len__(self) -> int:
-        """Return the number of chunks in the store."""
-        return len(self.vectors)
+        """Return the number of chunk rows in the store, including deleted ones not compacted yet."""
+        return self._size
+    
+    @property
+    def deleted_count(self) -> int:
+        """Number of deleted rows still waiting for compaction."""
+        return self._n_deleted
+    
+    def deleted_mask(self) -> Optional[np.ndarray]:
+        """Boolean tombstone per row (at least len(self) long), or None if nothing is deleted."""
+        return self._deleted
+    
+    @contextmanager
+    def writing(self):
+        """
+        Run a multi-step update without a compaction in between.
+        
+        Other writers wait too, while searches carry on. Row indices and
+        doc_ids read inside the block stay valid until it exits; a
+        compaction made due by deletes inside it starts when the
+        outermost block exits.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._maybe_compact()
+    
+    def delete_rows(self, rows: Sequence[int]) -> int:
+        """
+        Delete chunks by row index.
+        
+        The rows are tombstoned: searches skip them straight away and
+        compaction removes them later (see compact). Row indices are
+        only stable until then, so read them inside writing() when they
+        come from an earlier call.
+        
+        Args:
+            rows: Row indices to delete
+            
+        Returns:
+            The number of rows newly deleted
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        with self.writing(), self._lock:
+            if not len(rows):
+                return 0
+            if rows.min() < 0 or rows.max() >= self._size:
+                raise IndexError(f"Chunk rows out of range for a store of {self._size}")
+            if self._deleted is None:
+                self._deleted = np.zeros(max(self._size, _INITIAL_CAPACITY), dtype=bool)
+            rows = np.unique(rows[~self._deleted[rows]])
+            self._deleted[rows] = True
+            self._n_deleted += len(rows)
+        return len(rows)
     
-    def similarity_search(self, query_vector: List[float], top_k: int) -> List[EmbeddedChunk]:
+    def delete_chunks(self, source: str, chunk_ids: Sequence[int]) -> int:
+        """Delete a source's chunks by chunk_id; returns the number deleted."""
+        with self.writing():
+            chunks = self.chunks
+            rows = chunks.rows_for_docs(chunks.texts.docs_for_sources([source]), self._size)
+            return self.delete_rows(rows[np.isin(chunks.chunk_id[rows], chunk_ids)])
+    
+    def delete_source(self, source: str) -> int:
+        """
+        Delete every chunk of a source (all documents added under that name)
+        and forget its page records, so it is indexed afresh if added again.
+        
+        Returns:
+            The number of rows deleted
+        """
+        with self.writing():
+            chunks = self.chunks
+            chunks.texts.set_pages(source, None)
+            return self.delete_rows(chunks.rows_for_docs(chunks.texts.docs_for_sources([source]), self._size))
+    
+    def compact(self) -> int:
+        """
+        Remove deleted rows for good, renumbering the rest in order.
+        
+        The embeddings, chunk rows, documents left without chunks and the
+        BM25, IVF and quantized indexes are rebuilt without the deleted
+        rows (IVF centroids, int8 scales and PQ codebooks are reused, so
+        nothing is retrained). Searches keep running on the old arrays
+        while the new ones are built and see the new ones all at once;
+        writers wait. Row indices and doc_ids read before are invalid after.
+        
+        Returns:
+            The number of rows removed
+        """
+        with self._write_lock:
+            with self._lock:
+                size, n_deleted = self._size, self._n_deleted
+                if not n_deleted:
+                    return 0
+                chunks = self.chunks
+                is_sparse = self.is_sparse
+                matrix = self._sparse_matrix() if is_sparse else self._matrix[:size]
+                keep = ~self._deleted[:size]
+                ann, codes, bm25 = self.ann_index, self.quantized, self.bm25_index
+            
+            rows = np.flatnonzero(keep)
+            texts, doc_remap = chunks.texts.take(np.unique(chunks.doc_id[rows]))
+            chunks = chunks.take(rows, texts, doc_remap)
+            matrix = matrix[rows]
+            ann = ann.take(keep) if ann is not None else None
+            codes = codes.take(keep) if codes is not None else None
+            bm25 = bm25.take(keep) if bm25 is not None else None
+            
+            with self._lock:
+                self.chunks = chunks
+                if is_sparse:
+                    self._sparse, self._sparse_blocks = matrix, []
+                else:
+                    self._matrix = matrix if len(rows) else None
+                self._size = len(rows)
+                self.ann_index, self.quantized, self.bm25_index = ann, codes, bm25
+                self._deleted = None
+                self._n_deleted = 0
+        
+        logger.info(f"Compacted vector store: removed {n_deleted} deleted chunks, {len(rows)} remain")
+        return n_deleted
+    
+    def _maybe_compact(self):
+        """Compact once settings.COMPACT_DELETED_FRACTION of the rows are deleted."""
+        fraction = settings.COMPACT_DELETED_FRACTION
+        if fraction <= 0 or not self._n_deleted or self._n_deleted < fraction * self._size:
+            return
+        if not settings.COMPACT_IN_BACKGROUND:
+            self.compact()
+            return
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._compact_in_background, name="compact", daemon=True)
+            self._compactor.start()
+    
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Background compaction failed: {e}")
+    
+    def refit_embedder(self):
+        """
+        Fit a fresh embedder on every live chunk and re-embed the chunks with it.
+        
+        Adding to a fitted store keeps its vocabulary, so words first seen
+        in a later document are dropped from its vectors; a refit brings
+        them in. The new embedder and matrix replace the old ones
+        together; deleted rows get empty vectors. The IVF index and
+        quantized codes were built on the old vectors, so they are
+        dropped: call ingest.indexer.refit_index, which rebuilds them,
+        rather than this directly.
+        """
+        with self.writing():
+            size = self._size
+            if not size:
+                return
+            if not self.is_sparse:
+                raise ValueError("Only a sparse (TF-IDF) vector store can refit its embedder")
+            deleted = self._deleted
+            live = np.arange(size) if deleted is None else np.flatnonzero(~deleted[:size])
+            chunks = self.chunks
+            texts = [chunks.text(int(i)) for i in live]
+            
+            embedder = TfidfEmbedder(self.embedder.max_features)
+            embeddings = embedder.fit_transform(texts)
+            # Spread the live rows back over their row indices, leaving deleted rows empty
+            spread = sparse.csr_matrix(
+                (np.ones(len(live), dtype=np.float32), (live, np.arange(len(live)))),
+                shape=(size, len(live))
+            )
+            matrix = normalize(spread @ embeddings, norm="l2", copy=False).tocsr()
+            
+            with self._lock:
+                self.embedder = embedder
+                self._sparse, self._sparse_blocks = matrix, []
+                self.ann_index = None
+                self.quantized = None
+                self.vocabulary_misses = 0
+        logger.info(f"Refitted embedder on {len(texts)} chunks ({embedder.n_features} features)")
+    
+    def similarity_search(
+        self,
+        query_vector: Union[List[float], np.ndarray, sparse.spmatrix],
+        top_k: int,
+        n_probe: Optional[int] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[EmbeddedChunk]:
         """
         Find the top-k most similar chunks to the query vector.
         
+        Stores with an IVF index and at least settings.ANN_MIN_CHUNKS
+        chunks are searched approximately: only the rows in the n_probe
+        lists closest to the query, plus rows not yet filed, are scored.
+        With settings.QUANTIZATION set, those rows are scored on their
+        quantized codes and the best settings.QUANT_RERANK * top_k are
+        re-scored with their float vectors.
+        
+        A search_filter selects the matching rows first (see
+        ChunkTable.filter_rows) and only those are scored, so a filtered
+        search costs about the size of the matching partitions.
+        
         Args:
-            query_vector: The query embedding
+            query_vector: The query embedding, dense or a 1-row sparse matrix
             top_k: Number of results to return
+            n_probe: IVF lists to scan (defaults to settings.ANN_PROBES);
+                0 forces exact search
+            search_filter: Only return chunks that match this filter
             
         Returns:
-            List of most similar EmbeddedChunks
+            List of most similar EmbeddedChunks (fewer if the filter
+            matches fewer than top_k chunks)
         """
-        if not self.vectors:
+        size, chunks, matrix, ann, codes, deleted = self._snapshot()
+        
+        if not size or top_k <= 0:
             return []
+        
+        allowed = None
+        if search_filter is not None:
+            allowed = _live_rows(chunks.filter_rows(search_filter, size), deleted)
+            if not len(allowed):
+                return []
+        
+        query, query_norm = _query_row(query_vector, matrix)
+        
+        # Every score is zero for an empty query; keep insertion order
+        if query_norm == 0:
+            return [chunks.view(int(i)).to_embedded_chunk() for i in _first_rows(size, top_k, allowed, deleted)]
+        
+        rows = allowed
+        probes = _probe_count(ann, size if allowed is None else len(allowed), n_probe)
+        if probes:
+            rows = _candidate_rows(ann, ann.probe(query, probes)[0], size, top_k, allowed)
+        
+        indices = _ranked_rows(matrix, codes, size, query, query_norm, top_k, rows, deleted)
+        return [chunks.view(int(i)).to_embedded_chunk() for i in indices]
+    
+    def similarity_search_batch(
+        self,
+        query_vectors: Union[np.ndarray, sparse.spmatrix],
+        top_k: int,
+        n_probe: Optional[int] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[List[EmbeddedChunk]]:
+        """
+        Find the top-k chunks for every row of a query matrix.
+        
+        Gives the same results as calling similarity_search once per row,
+        but scores the whole batch with one matrix-matrix product instead
+        of one scan per query. Very large batches are split into blocks
+        so the score matrix stays around _BATCH_SCORE_ELEMENTS entries.
+        When the IVF index, quantized codes or a filter are used, each
+        query is scored on its own (the IVF lists for every query are
+        still picked with one product against the centroids, and the
+        filter is applied once for the whole batch).
+        
+        Args:
+            query_vectors: Query embeddings, one per row (dense or sparse)
+            top_k: Number of results per query
+            n_probe: IVF lists to scan per query (see similarity_search)
+            search_filter: Only return chunks that match this filter
             
-        query = np.array(query_vector)
-        query_norm = np.linalg.norm(query)
-
-        scored = []
-        for item in self.vectors:
-            vec = np.array(item.embedding)
-            vec_norm = np.linalg.norm(vec)
+        Returns:
+            One list of EmbeddedChunks per query row, in row order
+        """
+        size, chunks, matrix, ann, codes, deleted = self._snapshot()
+        
+        if sparse.issparse(query_vectors):
+            queries = sparse.csr_matrix(query_vectors, dtype=np.float32)
+            norms = np.sqrt(np.asarray(queries.multiply(queries).sum(axis=1)).ravel())
+        else:
+            queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+            norms = np.linalg.norm(queries, axis=1)
+        n_queries = queries.shape[0]
+        
+        if not size or top_k <= 0:
+            return [[] for _ in range(n_queries)]
+        
+        allowed = None
+        if search_filter is not None:
+            allowed = _live_rows(chunks.filter_rows(search_filter, size), deleted)
+            if not len(allowed):
+                return [[] for _ in range(n_queries)]
+        
+        probes = _probe_count(ann, size if allowed is None else len(allowed), n_probe)
+        if probes or _use_codes(codes) or allowed is not None:
+            results = []
+            lists = ann.probe(queries, probes) if probes else None
+            for i, norm in enumerate(norms):
+                if norm == 0:
+                    indices = _first_rows(size, top_k, allowed, deleted)
+                else:
+                    query, _ = _query_row(queries[i], matrix)
+                    rows = _candidate_rows(ann, lists[i], size, top_k, allowed) if probes else allowed
+                    indices = _ranked_rows(matrix, codes, size, query, norm, top_k, rows, deleted)
+                results.append([chunks.view(int(j)).to_embedded_chunk() for j in indices])
+            return results
+        
+        results = []
+        block = max(1, _BATCH_SCORE_ELEMENTS // size)
+        for lo in range(0, n_queries, block):
+            batch = queries[lo:lo + block]
+            if not sparse.issparse(matrix) and sparse.issparse(batch):
+                batch = batch.toarray()
+            scores = matrix @ batch.T
+            scores = scores.toarray() if sparse.issparse(scores) else np.asarray(scores)
+            # One contiguous row of scores per query
+            scores = np.ascontiguousarray(scores.T, dtype=np.float32)
             
-            # Avoid division by zero
-            if query_norm == 0 or vec_norm == 0:
-                score = 0.0
+            for row, norm in zip(scores, norms[lo:lo + block]):
+                if norm == 0:
+                    indices = _first_rows(size, top_k, None, deleted)
+                else:
+                    row = row / norm
+                    if deleted is not None:
+                        row[deleted[:size]] = -np.inf
+                    indices = _top_k_indices(row, top_k)
+                results.append([chunks.view(int(i)).to_embedded_chunk() for i in indices])
+        return results
+    
+    def embedding_matrix(self) -> Optional[Union[np.ndarray, sparse.csr_matrix]]:
+        """The normalized float embeddings, one row per chunk (CSR for sparse stores)."""
+        return self._snapshot()[2]
+    
+    def bm25_snapshot(self):
+        """The BM25 index with the chunk table and tombstones it refers to, read together."""
+        with self._lock:
+            return self.bm25_index, self.chunks, self._deleted
+    
+    def _snapshot(self):
+        """Size, chunk table, embedding matrix, ANN index, codes and tombstones, read under the lock; scoring runs without it."""
+        with self._lock:
+            size = self._size
+            chunks = self.chunks
+            if self.is_sparse:
+                matrix = self._sparse_matrix()
             else:
-                score = np.dot(query, vec) / (query_norm * vec_norm)
-            scored.append((score, item))
-
-        scored.sort(reverse=True, key=lambda x: x[0])
-        return [item for _, item in scored[:top_k]]
+                matrix = self._matrix[:size] if self._matrix is not None else None
+            ann = self.ann_index
+            codes = self.quantized
+            deleted = self._deleted
+        return size, chunks, matrix, ann, codes, deleted
     
     def save(self, path: str) -> bool:
         """
         Save the vector store to disk.
         
+        The store is written as a directory in a versioned format: the
+        embeddings and chunk table columns as .npy arrays that load()
+        memory-maps, a JSON sidecar with the document texts and source
+        table, the fitted embedder and, if built, the IVF index and the
+        quantized codes. Deleted rows are compacted away first, so the
+        saved index holds only live chunks.
+        The directory is written under a temporary name and renamed into
+        place, so a crash never leaves a half-written index behind.
+        
         Args:
-            path: File path to save to (will use .pkl extension)
+            path: Directory to save to
             
         Returns:
             True if successful, False otherwise
@@ -76,44 +664,122 @@ class VectorStore:
         try:
             save_path = Path(path)
             save_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = Path(tempfile.mkdtemp(dir=save_path.parent, prefix=f".{save_path.name}."))
+            
+            # Writers wait until the compacted store has been snapshotted
+            with self._write_lock:
+                self.compact()
+                with self._lock:
+                    n_chunks = self._size
+                    self.chunks.save_columns(tmp_path)
+                    self.chunks.texts.save(tmp_path)
+                    is_sparse = self.is_sparse
+                    if is_sparse:
+                        matrix = self._sparse_matrix()
+                    else:
+                        matrix = self._matrix[:self._size] if self._matrix is not None else None
+                    ann = self.ann_index
+                    codes = self.quantized
+                    misses = self.vocabulary_misses
+            
+            if is_sparse:
+                np.save(tmp_path / "embeddings.data.npy", matrix.data.astype(np.float32))
+                np.save(tmp_path / "embeddings.indices.npy", matrix.indices.astype(np.int32))
+                np.save(tmp_path / "embeddings.indptr.npy", matrix.indptr.astype(np.int64))
+            elif matrix is not None:
+                np.save(tmp_path / "embeddings.npy", np.ascontiguousarray(matrix))
+            
+            self.embedder.save(tmp_path)
+            ann_meta = ann.save(tmp_path) if ann is not None else None
+            codes_meta = codes.save(tmp_path) if codes is not None else None
             
-            with open(save_path, 'wb') as f:
-                pickle.dump({
-                    'vectors': self.vectors,
-                    'source_file': self._source_file
+            # The manifest goes last; load() treats a directory without one as absent
+            with open(tmp_path / "manifest.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "format_version": INDEX_FORMAT_VERSION,
+                    "kind": "sparse" if is_sparse else "dense",
+                    "n_chunks": n_chunks,
+                    "dim": int(matrix.shape[1]) if matrix is not None else 0,
+                    "source_file": self._source_file,
+                    "ann": ann_meta,
+                    "quantization": codes_meta,
+                    "vocabulary_misses": misses,
                 }, f)
             
-            logger.info(f"Vector store saved to {save_path} ({len(self.vectors)} chunks)")
+            if save_path.exists():
+                shutil.rmtree(save_path)
+            os.replace(tmp_path, save_path)
+            
+            logger.info(f"Vector store saved to {save_path} ({n_chunks} chunks)")
             return True
             
         except Exception as e:
             logger.error(f"Failed to save vector store: {e}")
+            if 'tmp_path' in locals():
+                shutil.rmtree(tmp_path, ignore_errors=True)
             return False
     
-    def load(self, path: str) -> bool:
+    def load(self, path: str, mmap: bool = True) -> bool:
         """
         Load the vector store from disk.
         
         Args:
-            path: File path to load from
+            path: Directory written by save()
+            mmap: Memory-map the embedding arrays instead of reading them
             
         Returns:
             True if successful, False otherwise
         """
         try:
             load_path = Path(path)
+            manifest_path = load_path / "manifest.json"
             
-            if not load_path.exists():
-                logger.warning(f"Vector store file not found: {load_path}")
+            if not manifest_path.exists():
+                logger.warning(f"Vector store not found: {load_path}")
                 return False
             
-            with open(load_path, 'rb') as f:
-                data = pickle.load(f)
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            
+            if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+                logger.warning(
+                    f"Vector store {load_path} has format version "
+                    f"{manifest.get('format_version')}, expected {INDEX_FORMAT_VERSION}"
+                )
+                return False
             
-            self.vectors = data.get('vectors', [])
-            self._source_file = data.get('source_file')
+            mmap_mode = "r" if mmap else None
+            n_chunks = manifest["n_chunks"]
+            chunks = ChunkTable.load_columns(load_path, TextStore.load(load_path), n_chunks, mmap_mode)
+            embedder = TfidfEmbedder.load(load_path)
             
-            logger.info(f"Vector store loaded from {load_path} ({len(self.vectors)} chunks)")
+            with self._write_lock, self._lock:
+                self.clear()
+                self.embedder = embedder
+                self._source_file = manifest.get("source_file")
+                self._size = n_chunks
+                self.vocabulary_misses = manifest.get("vocabulary_misses", 0)
+                self.chunks = chunks
+                
+                if manifest["kind"] == "sparse":
+                    self._sparse = sparse.csr_matrix(
+                        (
+                            np.load(load_path / "embeddings.data.npy", mmap_mode=mmap_mode),
+                            np.load(load_path / "embeddings.indices.npy", mmap_mode=mmap_mode),
+                            np.load(load_path / "embeddings.indptr.npy", mmap_mode=mmap_mode),
+                        ),
+                        shape=(n_chunks, manifest["dim"]),
+                        copy=False
+                    )
+                elif n_chunks:
+                    self._matrix = np.load(load_path / "embeddings.npy", mmap_mode=mmap_mode)
+                
+                if manifest.get("ann"):
+                    self.ann_index = IVFIndex.load(load_path, manifest["ann"], mmap_mode)
+                if manifest.get("quantization"):
+                    self.quantized = load_codes(load_path, manifest["quantization"], mmap_mode)
+            
+            logger.info(f"Vector store loaded from {load_path} ({len(self)} chunks)")
             return True
             
         except Exception as e:
@@ -123,16 +789,173 @@ class VectorStore:
     @staticmethod
     def get_cache_path(source_file: str, cache_dir: str = ".verilens_cache") -> str:
         """
-        Generate a cache file path for a source document.
+        Generate a cache directory path for a source document.
+        
+        The key is a hash of the file contents together with the chunking
+        and embedding settings, so renaming a file keeps its cache while
+        editing it (or changing those settings) produces a new one.
         
         Args:
-            source_file: Original document filename
+            source_file: Path to the original document
             cache_dir: Directory for cache files
             
         Returns:
-            Path string for the cache file
+            Path string for the cache directory
         """
-        import hashlib
-        file_hash = hashlib.md5(source_file.encode()).hexdigest()[:8]
+        digest = hashlib.sha256()
+        digest.update(
+            f"v{INDEX_FORMAT_VERSION}:{settings.CHUNK_SIZE}:{settings.CHUNK_OVERLAP}:"
+            f"{settings.TFIDF_MAX_FEATURES}:".encode()
+        )
+        with open(source_file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
         safe_name = Path(source_file).stem
-        return str(Path(cache_dir) / f"{safe_name}_{file_hash}.pkl")
+        return str(Path(cache_dir) / f"{safe_name}_{digest.hexdigest()[:16]}")
+
+
+def _query_row(query_vector, matrix):
+    """A query as a 1-row CSR matrix (or a flat array against a dense store), with its norm."""
+    if sparse.issparse(query_vector):
+        query = sparse.csr_matrix(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query.data)
+        if not sparse.issparse(matrix):
+            query = query.toarray().ravel()
+        return query, norm
+    query = np.asarray(query_vector, dtype=np.float32).ravel()
+    return query, np.linalg.norm(query)
+
+
+def _probe_count(ann: Optional[IVFIndex], size: int, n_probe: Optional[int]) -> int:
+    """IVF lists to scan for a search, or 0 for an exact scan."""
+    if ann is None or not settings.ANN_ENABLED or size < settings.ANN_MIN_CHUNKS:
+        return 0
+    n_probe = settings.ANN_PROBES if n_probe is None else n_probe
+    # Probing every list would score every row anyway
+    return n_probe if 0 < n_probe < ann.n_lists else 0
+
+
+def _candidate_rows(
+    ann: IVFIndex,
+    lists,
+    size: int,
+    top_k: int,
+    allowed: Optional[np.ndarray] = None
+) -> Optional[np.ndarray]:
+    """
+    Rows filed under the probed lists plus rows added since, limited to
+    the allowed rows if given. Falls back to every (allowed) row, i.e.
+    exact search, when that leaves fewer than top_k.
+    """
+    rows = ann.candidates(lists)
+    if ann.size < size:
+        rows = np.concatenate([rows, np.arange(ann.size, size)])
+    if allowed is not None:
+        rows = np.intersect1d(rows, allowed, assume_unique=True)
+    if len(rows) >= top_k:
+        return rows
+    return allowed
+
+
+def _live_rows(rows: np.ndarray, deleted: Optional[np.ndarray]) -> np.ndarray:
+    """The rows that are not tombstoned."""
+    return rows if deleted is None else rows[~deleted[rows]]
+
+
+def _first_rows(size: int, top_k: int, allowed: Optional[np.ndarray], deleted: Optional[np.ndarray]) -> np.ndarray:
+    """The first top_k live (and allowed) rows: the result for a query that scores zero everywhere."""
+    if allowed is None and deleted is None:
+        return np.arange(min(top_k, size))
+    rows = np.arange(size) if allowed is None else allowed
+    return _live_rows(rows, deleted)[:top_k]
+
+
+def _row_scores(matrix, query, query_norm: float, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cosine of the query with every row, or with the given rows only."""
+    # Rows are already unit length, so the dot product is the cosine
+    candidates = matrix if rows is None else matrix[rows]
+    scores = candidates @ query.T if sparse.issparse(query) else candidates @ query
+    scores = scores.toarray() if sparse.issparse(scores) else scores
+    return np.asarray(scores, dtype=np.float32).ravel() / query_norm
+
+
+def _top_k_rows(
+    matrix,
+    query,
+    query_norm: float,
+    top_k: int,
+    rows: Optional[np.ndarray] = None,
+    deleted: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Top-k live row indices by cosine, over all rows or only the given (ascending) ones."""
+    if rows is not None:
+        rows = _live_rows(rows, deleted)
+    scores = _row_scores(matrix, query, query_norm, rows)
+    if rows is None and deleted is not None:
+        scores[deleted[:len(scores)]] = -np.inf
+    best = _top_k_indices(scores, top_k)
+    return best if rows is None else rows[best]
+
+
+def _use_codes(codes: Optional[QuantizedCodes]) -> bool:
+    return codes is not None and bool(settings.QUANTIZATION)
+
+
+def _ranked_rows(
+    matrix,
+    codes: Optional[QuantizedCodes],
+    size: int,
+    query,
+    query_norm: float,
+    top_k: int,
+    rows: Optional[np.ndarray] = None,
+    deleted: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Top-k live row indices by cosine, scanning quantized codes when there are any.
+
+    Encoded rows are ranked by their codes, and the best
+    settings.QUANT_RERANK * top_k are re-scored with their float vectors
+    together with any rows not encoded yet. Without re-ranking, the
+    code scores decide the order.
+    """
+    if not _use_codes(codes):
+        return _top_k_rows(matrix, query, query_norm, top_k, rows, deleted)
+    
+    if rows is None:
+        coded, pending = None, _live_rows(np.arange(codes.size, size), deleted)
+    else:
+        rows = _live_rows(rows, deleted)
+        split = np.searchsorted(rows, codes.size)
+        coded, pending = rows[:split], rows[split:]
+    
+    approx = codes.scores(query, coded) / query_norm
+    if coded is None and deleted is not None:
+        approx[deleted[:codes.size]] = -np.inf
+    rerank = settings.QUANT_RERANK
+    best = _top_k_indices(approx, top_k * rerank if rerank > 0 else top_k)
+    ids = best if coded is None else coded[best]
+    candidates = np.concatenate([ids, pending])
+    
+    if rerank > 0:
+        return _top_k_rows(matrix, query, query_norm, top_k, np.sort(candidates))
+    
+    # Rows not encoded yet are scored with their float vectors
+    scores = np.concatenate([approx[best], _row_scores(matrix, query, query_norm, pending)])
+    order = np.argsort(candidates, kind="stable")
+    return candidates[order][_top_k_indices(scores[order], top_k)]
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the top-k scores in descending order, ties broken by
+    insertion order. Scores of -inf (deleted rows) are never returned.
+    """
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates.sort()
+    else:
+        candidates = np.arange(len(scores))
+    order = np.argsort(-scores[candidates], kind="stable")
+    best = candidates[order]
+    return best[scores[best] > -np.inf]
@@ -1,6 +1,8 @@
 # Schema models for VERILENS
 from .document import Document, DocumentChunk
 from .embedding import EmbeddedChunk
-from .response import Evidence, VerifiedAnswer
+from .response import Evidence, VerifiedAnswer, BatchAnswer
+from .request import QueryRequest, IngestRequest
+from .filter import SearchFilter
 
-__all__ = ["Document", "DocumentChunk", "EmbeddedChunk", "Evidence", "VerifiedAnswer"]
+__all__ = ["Document", "DocumentChunk", "EmbeddedChunk", "Evidence", "VerifiedAnswer", "BatchAnswer", "QueryRequest", "IngestRequest", "SearchFilter"]
@@ -1,8 +1,12 @@
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 
 class Document(BaseModel):
     content:str
     source:str
+    metadata:Dict[str,Any]={}  # arbitrary JSON values, matched by SearchFilter.metadata
+    page_offsets:Optional[List[int]]=None  # character offset where each page starts, when known
+    page_hashes:Optional[List[str]]=None  # hash of each page's content; a refresh re-indexes only pages whose hash changed
 
 class DocumentChunk(BaseModel):
     chunk_id:int
@@ -1,8 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class EmbeddedChunk(BaseModel):
     chunk_id:int
     text:str
     source:str
-    embedding:List[float]
\ No newline at end of file
+    embedding:List[float]=[]
+    start:Optional[int]=None  # character offsets into the stored document, when known
+    end:Optional[int]=None
+    doc_id:Optional[int]=None  # stored document the offsets refer to; a refreshed source spans several
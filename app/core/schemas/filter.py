@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+class SearchFilter(BaseModel):
+    """
+    Restricts a search to matching chunks before any scoring happens.
+
+    All given conditions must hold. Sources select whole partitions;
+    the other conditions are checked per document, and pages per chunk.
+    """
+    sources:Optional[List[str]]=None  # exact source names
+    metadata:Dict[str,Any]={}  # document metadata values that must match; a list matches any of its items
+    ingested_after:Optional[datetime]=None
+    ingested_before:Optional[datetime]=None
+    pages:Optional[Tuple[int,int]]=None  # 1-based inclusive page range a chunk must overlap
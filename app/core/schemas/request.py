@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from app.core.schemas.document import Document
+from app.core.schemas.filter import SearchFilter
+
+class QueryRequest(BaseModel):
+    query:str
+    verify:bool=False
+    filter:Optional[SearchFilter]=None  # only answer from matching chunks
+
+class IngestRequest(BaseModel):
+    path:Optional[str]=None  # file or directory on the server
+    documents:List[Document]=[]  # or the documents themselves
+    delete:List[str]=[]  # sources to remove from the index first
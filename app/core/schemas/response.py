@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from app.core.schemas.embedding import EmbeddedChunk
 
 class Evidence(BaseModel):
     source:str
@@ -8,4 +9,11 @@ class Evidence(BaseModel):
 
 class VerifiedAnswer(BaseModel):
     answer:str
-    evidence:List[Evidence]
\ No newline at end of file
+    evidence:List[Evidence]
+
+class BatchAnswer(BaseModel):
+    index:int  # position in the submitted batch
+    query:str
+    answer:Optional[str]=None
+    sources:List[EmbeddedChunk]=[]
+    error:Optional[str]=None  # set instead of answer when this item failed
@@ -0,0 +1,5 @@
+# HTTP query service for VERILENS
+from .server import ServerConfig, VeriLensServer, run_worker, serve
+from .service import QueryService
+
+__all__ = ["ServerConfig", "VeriLensServer", "QueryService", "run_worker", "serve"]
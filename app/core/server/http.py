@@ -0,0 +1,125 @@
+import asyncio
+import json
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Request line plus headers
+_MAX_HEAD_BYTES = 64 * 1024
+
+
+class HTTPError(Exception):
+    """Raised by handlers to send an error status with a JSON body."""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class HTTPRequest:
+    __slots__ = ("method", "path", "query", "headers", "body", "version")
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> dict:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        return data
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[HTTPRequest]:
+    """
+    Read one HTTP/1.1 request; None if the client closed the connection.
+
+    Only Content-Length bodies are supported.
+
+    Raises:
+        HTTPError: For malformed or oversized requests
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(400, "Incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(400, "Malformed header")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Chunked request bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, f"Request body larger than {max_body} bytes")
+
+    body = await reader.readexactly(length) if length else b""
+    return HTTPRequest(method.upper(), target, version, headers, body)
+
+
+def encode_response(
+    status: int,
+    body: bytes,
+    content_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+    keep_alive: bool = True
+) -> bytes:
+    """Serialize a complete response with a Content-Length body."""
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+    lines = [
+        f"HTTP/1.1 {status} {reason}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def json_body(data) -> bytes:
+    return json.dumps(data, default=str).encode("utf-8")
+
+
+def error_body(error: HTTPError) -> Tuple[bytes, Dict[str, str]]:
+    return json_body({"error": error.message, "status": error.status}), error.headers
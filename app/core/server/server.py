@@ -0,0 +1,313 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from typing import Optional
+from pydantic import BaseModel, Field, ValidationError
+from app.core.core.config import settings, logger
+from app.core.core.tracing import PrometheusExporter, add_exporter
+from app.core.reason.scheduler import get_scheduler
+from app.core.schemas.request import IngestRequest, QueryRequest
+from app.core.server.http import HTTPError, HTTPRequest, encode_response, error_body, json_body, read_request
+from app.core.server.service import QueryService
+
+# Request line and headers; bodies are bounded by settings.SERVER_MAX_BODY_BYTES
+_STREAM_LIMIT = 64 * 1024
+
+
+class ServerConfig(BaseModel):
+    """
+    Everything a worker process needs; defaults come from settings.
+
+    Workers are spawned, so changes made to settings at runtime in the
+    parent do not reach them; pass them here instead.
+    """
+    host: str = Field(default_factory=lambda: settings.SERVER_HOST)
+    port: int = Field(default_factory=lambda: settings.SERVER_PORT)
+    workers: int = Field(default_factory=lambda: settings.SERVER_WORKERS)
+    index_path: str = Field(default_factory=lambda: settings.SERVER_INDEX_PATH)
+    max_concurrency: int = Field(default_factory=lambda: settings.SERVER_MAX_CONCURRENCY)
+    max_queue: int = Field(default_factory=lambda: settings.SERVER_MAX_QUEUE)
+    request_timeout: float = Field(default_factory=lambda: settings.SERVER_REQUEST_TIMEOUT)
+    retrieval_threads: int = Field(default_factory=lambda: settings.SERVER_RETRIEVAL_THREADS)
+    ingest_root: str = Field(default_factory=lambda: settings.SERVER_INGEST_ROOT)
+
+
+class VeriLensServer:
+    """
+    Asyncio HTTP/1.1 server for one worker process.
+
+    Endpoints:
+        POST /query   {"query": "...", "verify": false, "filter": {...}} -> answer and evidence
+        POST /ingest  {"path": "..."} and/or {"documents": [{"content", "source"}]}, {"delete": ["source"]}
+        GET  /health  index size and load
+        GET  /metrics Prometheus text: per-stage span histograms, server and LLM scheduler gauges
+
+    At most max_concurrency queries run at once; up to max_queue more
+    wait for a slot and anything beyond that is rejected straight away
+    with 503 and Retry-After, so overload shows up as fast failures
+    rather than unbounded latency. Retrieval runs on a thread pool and
+    LLM calls on the shared async client, so one process keeps many
+    LLM-bound queries in flight.
+    """
+
+    def __init__(self, config: ServerConfig, service: Optional[QueryService] = None):
+        self.config = config
+        self.service = service or QueryService(config.index_path)
+        self._slots = asyncio.Semaphore(config.max_concurrency)
+        self.metrics = add_exporter(PrometheusExporter())
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        # Counters for /health and /metrics
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.responses: dict = {}
+        self.started = time.time()
+
+    async def start(self, reuse_port: bool = False):
+        """Load the index and start listening."""
+        loop = asyncio.get_running_loop()
+        threads = self.config.retrieval_threads or min(32, (os.cpu_count() or 1) + 4)
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=threads, thread_name_prefix="retrieve"))
+
+        chunks = await loop.run_in_executor(None, self.service.load)
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            self.config.host,
+            self.config.port,
+            limit=_STREAM_LIMIT,
+            reuse_port=reuse_port or None,
+            backlog=max(128, self.config.max_queue)
+        )
+        host, port = self._server.sockets[0].getsockname()[:2]
+        logger.info(f"Worker {os.getpid()} serving http://{host}:{port} ({chunks} chunks)")
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # Connections
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader, settings.SERVER_MAX_BODY_BYTES),
+                        settings.SERVER_KEEPALIVE_TIMEOUT
+                    )
+                except HTTPError as e:
+                    body, headers = error_body(e)
+                    self._count(e.status)
+                    writer.write(encode_response(e.status, body, headers=headers, keep_alive=False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+
+                status, body, content_type, headers = await self._dispatch(request)
+                self._count(status)
+                writer.write(encode_response(status, body, content_type, headers, request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    return
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: HTTPRequest):
+        routes = {
+            "/query": ("POST", self._query),
+            "/ingest": ("POST", self._ingest),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+        }
+        try:
+            if request.path not in routes:
+                raise HTTPError(404, f"Not found: {request.path}")
+            method, handler = routes[request.path]
+            if request.method != method:
+                raise HTTPError(405, f"Use {method} for {request.path}", {"Allow": method})
+            result = await handler(request)
+            if isinstance(result, str):
+                return 200, result.encode("utf-8"), "text/plain; version=0.0.4", None
+            return 200, json_body(result), "application/json", None
+        except HTTPError as e:
+            body, headers = error_body(e)
+            return e.status, body, "application/json", headers
+        except Exception as e:
+            logger.error(f"{request.method} {request.path} failed: {e}")
+            body, _ = error_body(HTTPError(500, str(e)))
+            return 500, body, "application/json", None
+
+    def _count(self, status: int):
+        self.responses[status] = self.responses.get(status, 0) + 1
+
+    # Handlers
+
+    async def _query(self, request: HTTPRequest) -> dict:
+        query = _parse(QueryRequest, request)
+        start = time.perf_counter()
+
+        # Shed load instead of queueing without bound
+        if self._slots.locked() and self.waiting >= self.config.max_queue:
+            self.rejected += 1
+            raise HTTPError(503, "Server busy, retry later", {"Retry-After": "1"})
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            result = await asyncio.wait_for(self.service.query(query), self.config.request_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPError(504, f"Query did not finish within {self.config.request_timeout}s")
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        response = result.model_dump()
+        response["seconds"] = round(time.perf_counter() - start, 4)
+        return response
+
+    async def _ingest(self, request: HTTPRequest) -> dict:
+        return await self.service.ingest(_parse(IngestRequest, request))
+
+    async def _health(self, request: HTTPRequest) -> dict:
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "chunks": len(self.service.store),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+    async def _metrics(self, request: HTTPRequest) -> str:
+        worker = f'worker="{os.getpid()}"'
+        lines = [self.metrics.render().rstrip("\n")]
+        gauges = {
+            "server_in_flight": self.in_flight,
+            "server_waiting": self.waiting,
+            "server_rejected_total": self.rejected,
+            "server_timeouts_total": self.timeouts,
+            "index_chunks": len(self.service.store),
+        }
+        for name, value in get_scheduler().stats().items():
+            if isinstance(value, (int, float)):
+                gauges[f"llm_{name}"] = value
+        for name, value in gauges.items():
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE verilens_{name} {kind}")
+            lines.append(f"verilens_{name}{{{worker}}} {value}")
+        lines.append("# TYPE verilens_server_responses_total counter")
+        for status, count in sorted(self.responses.items()):
+            lines.append(f'verilens_server_responses_total{{{worker},status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _parse(model, request: HTTPRequest):
+    try:
+        return model(**request.json())
+    except ValidationError as e:
+        raise HTTPError(400, str(e))
+
+
+# Processes
+
+def run_worker(config: ServerConfig, reuse_port: bool = False):
+    """Run one worker's event loop until interrupted."""
+    settings.SERVER_INGEST_ROOT = config.ingest_root
+    if config.workers > 1:
+        # Rate limits are per process; split the quota between the workers
+        settings.LLM_REQUESTS_PER_MINUTE = _share(settings.LLM_REQUESTS_PER_MINUTE, config.workers)
+        settings.LLM_TOKENS_PER_MINUTE = _share(settings.LLM_TOKENS_PER_MINUTE, config.workers)
+
+    async def main():
+        server = VeriLensServer(config)
+        await server.start(reuse_port)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def _share(limit: int, workers: int) -> int:
+    return max(1, limit // workers) if limit else 0
+
+
+def serve(config: Optional[ServerConfig] = None):
+    """
+    Serve with config.workers processes (0 for one per CPU).
+
+    Workers bind the same port with SO_REUSEPORT and the kernel spreads
+    connections across them, so CPU-bound retrieval scales with cores.
+    Each worker memory-maps the same index files. Workers that exit are
+    restarted. Without SO_REUSEPORT (e.g. Windows) a single worker runs.
+    """
+    config = config or ServerConfig()
+    workers = config.workers or os.cpu_count() or 1
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("SO_REUSEPORT is not available; running a single worker")
+        workers = 1
+    if workers > 1 and config.port == 0:
+        raise ValueError("Multiple workers need a fixed port")
+    config = config.model_copy(update={"workers": workers})
+
+    if workers == 1:
+        run_worker(config)
+        return
+
+    # Spawned (not forked) workers start clean, without this process's threads or clients
+    context = multiprocessing.get_context("spawn")
+
+    def start() -> multiprocessing.Process:
+        # Not daemonic: ingestion starts its own extraction processes
+        process = context.Process(target=run_worker, args=(config, True))
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    previous = signal.signal(signal.SIGTERM, stop)
+    processes = [start() for _ in range(workers)]
+    logger.info(f"Started {workers} workers on http://{config.host}:{config.port}")
+    try:
+        while True:
+            wait([p.sentinel for p in processes])
+            for i, process in enumerate(processes):
+                if process.exitcode is not None:
+                    logger.warning(f"Worker {process.pid} exited with code {process.exitcode}; restarting")
+                    time.sleep(1)
+                    processes[i] = start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from app.core.agent.verilens_agent import VeriLensAgent
+from app.core.ingest.indexer import index_documents, refit_due, refit_index
+from app.core.ingest.loader import SUPPORTED_SUFFIXES
+from app.core.ingest.pipeline import ingest_directory
+from app.core.ingest.refresh import refresh_document, refresh_file
+from app.core.reason.semantic_cache import SemanticQueryCache
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.request import IngestRequest, QueryRequest
+from app.core.schemas.response import Evidence, VerifiedAnswer
+from app.core.core.config import settings, logger
+from app.core.server.http import HTTPError
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one worker process, so no cross-process lock is needed
+    fcntl = None
+
+
+class QueryService:
+    """
+    Serves queries and ingestion against one on-disk index.
+
+    The index is memory-mapped (VectorStore.load), so every worker process
+    on the machine shares one copy of the embeddings in the page cache.
+    Ingestion rewrites the index directory atomically under a file lock;
+    the other workers notice the new manifest within
+    settings.SERVER_RELOAD_INTERVAL and swap it in between queries.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, reload_interval: Optional[float] = None):
+        """
+        Args:
+            index_path: Index directory (defaults to settings.SERVER_INDEX_PATH)
+            reload_interval: Seconds between checks for a newer index
+                (defaults to settings.SERVER_RELOAD_INTERVAL)
+        """
+        self.index_path = Path(index_path or settings.SERVER_INDEX_PATH)
+        if reload_interval is None:
+            reload_interval = settings.SERVER_RELOAD_INTERVAL
+        self.reload_interval = reload_interval
+        self.store = VectorStore()
+        self._agents: Dict[bool, VeriLensAgent] = {}
+        self._stamp = None
+        self._checked = 0.0
+        self._reload_lock = asyncio.Lock()
+        self._ingest_lock = asyncio.Lock()
+
+    # Index
+
+    def load(self) -> int:
+        """(Re)load the index from disk; returns its chunk count."""
+        store = VectorStore()
+        stamp = _index_stamp(self.index_path)
+        if stamp is not None and not store.load(str(self.index_path)):
+            raise RuntimeError(f"Could not load index {self.index_path}")
+        self._swap(store, stamp)
+        return len(store)
+
+    def _swap(self, store: VectorStore, stamp):
+        # Both agents share one paraphrase cache; the answer cache is process-wide
+        semantic_cache = SemanticQueryCache(store) if settings.SEMANTIC_CACHE_ENABLED else None
+        self._agents = {
+            verify: VeriLensAgent(store, enable_verification=verify, semantic_cache=semantic_cache)
+            for verify in (False, True)
+        }
+        self.store = store
+        self._stamp = stamp
+        self._checked = time.monotonic()
+
+    async def maybe_reload(self):
+        """Pick up an index written by another worker, at most once per reload_interval."""
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        if _index_stamp(self.index_path) == self._stamp:
+            return
+        async with self._reload_lock:
+            if _index_stamp(self.index_path) != self._stamp:
+                chunks = await asyncio.get_running_loop().run_in_executor(None, self.load)
+                logger.info(f"Worker {os.getpid()} reloaded {self.index_path} ({chunks} chunks)")
+
+    # Queries
+
+    async def query(self, request: QueryRequest) -> VerifiedAnswer:
+        query = request.query.strip()
+        if not query:
+            raise HTTPError(400, "Query must not be empty")
+        await self.maybe_reload()
+
+        agent = self._agents[request.verify]
+        answer, chunks = await agent.answer_with_sources_async(query, request.filter)
+        return VerifiedAnswer(
+            answer=answer,
+            evidence=[Evidence(source=c.source, chunk_id=c.chunk_id, text=c.text) for c in chunks]
+        )
+
+    # Ingestion
+
+    async def ingest(self, request: IngestRequest) -> dict:
+        """
+        Add, update or delete documents and serve the result from this worker immediately.
+
+        Sources the index already holds are refreshed page by page (see
+        ingest.refresh), so re-sending an unchanged document does nothing.
+        """
+        path = self._ingest_path(request.path) if request.path else None
+        if path is None and not request.documents and not request.delete:
+            raise HTTPError(400, "Provide a path, documents or sources to delete")
+
+        async with self._ingest_lock:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                None, contextvars.copy_context().run, self._ingest_sync, path, request
+            )
+            # Serve the saved (memory-mapped) index rather than the in-memory copy
+            await loop.run_in_executor(None, self.load)
+        return result
+
+    def _ingest_path(self, value: str) -> Path:
+        if not settings.SERVER_INGEST_ROOT:
+            raise HTTPError(403, "Ingesting server paths is disabled (set SERVER_INGEST_ROOT)")
+        root = Path(settings.SERVER_INGEST_ROOT).resolve()
+        path = (root / value).resolve()
+        if path != root and root not in path.parents:
+            raise HTTPError(403, f"Path is outside SERVER_INGEST_ROOT: {value}")
+        if not path.exists():
+            raise HTTPError(404, f"No such file or directory: {value}")
+        if path.is_file() and path.suffix.lower() not in SUPPORTED_SUFFIXES:
+            raise HTTPError(415, f"Unsupported file type: {path.suffix}")
+        return path
+
+    def _ingest_sync(self, path: Optional[Path], request: IngestRequest) -> dict:
+        with _index_lock(self.index_path):
+            # Start from the latest index on disk; another worker may have written it
+            store = VectorStore()
+            if _index_stamp(self.index_path) is not None:
+                store.load(str(self.index_path), mmap=False)
+            added = 0
+            deleted = sum(store.delete_source(source) for source in request.delete)
+            # Files and documents are embedded with the current vocabulary; the
+            # store is refit once at the end if due (ingest_directory checks itself)
+            result = {}
+
+            if path is not None and path.is_dir():
+                _, stats = ingest_directory(str(path), vector_store=store)
+                result["files"] = stats.summary()
+                added += stats.total_chunks
+                deleted += stats.total_chunks_deleted
+            elif path is not None:
+                # Same source naming as directory ingestion: relative to the ingest root
+                source = path.relative_to(Path(settings.SERVER_INGEST_ROOT).resolve()).as_posix()
+                refreshed = refresh_file(str(path), store, source)
+                added += refreshed.chunks_added
+                deleted += refreshed.chunks_deleted
+
+            new = []
+            for document in request.documents:
+                if not document.content.strip():
+                    continue
+                if len(store) and len(store.chunks.texts.docs_for_sources([document.source])):
+                    refreshed = refresh_document(document, store)
+                    added += refreshed.chunks_added
+                    deleted += refreshed.chunks_deleted
+                else:
+                    new.append(document)
+            if new:
+                # New sources are embedded in one batch, fitting an empty store's vocabulary on all of them
+                added += index_documents(new, store, refit=False)
+            if refit_due(store):
+                refit_index(store)
+
+            if (added or deleted) and not store.save(str(self.index_path)):
+                raise HTTPError(500, f"Could not save index {self.index_path}")
+            result.update(chunks_added=added, chunks_deleted=deleted, chunks=len(store) - store.deleted_count)
+            return result
+
+
+def _index_stamp(path: Path):
+    """Identity of the index currently on disk; save() replaces the manifest, changing it."""
+    try:
+        stat = (path / "manifest.json").stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@contextmanager
+def _index_lock(path: Path):
+    """Exclusive lock on an index across worker processes (no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    lock_path = path.with_name(f"{path.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
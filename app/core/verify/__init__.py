@@ -1,5 +1,5 @@
-
 from .base import VerificationIssue, VerificationResult
+from .grounding import GroundingChecker, parse_answer
 from .verifier import AnswerVerifier
 
-__all__ = ["VerificationIssue", "VerificationResult", "AnswerVerifier"]
+__all__ = ["VerificationIssue", "VerificationResult", "GroundingChecker", "parse_answer", "AnswerVerifier"]
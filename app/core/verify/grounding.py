@@ -0,0 +1,228 @@
+import re
+import threading
+import unicodedata
+from typing import List, Optional, Set, Tuple
+from pydantic import BaseModel
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from app.core.core.config import settings
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.verify.base import VerificationIssue, VerificationResult
+
+_SECTION_PATTERN = re.compile(r"^\s*(ANSWER|EVIDENCE|CONFIDENCE)\s*:\s*", re.IGNORECASE | re.MULTILINE)
+_QUOTE_PATTERN = re.compile(r'"([^"]+)"')
+_ELLIPSIS_PATTERN = re.compile(r"\.\.\.|…")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD_PATTERN = re.compile(r"\w+")
+
+# An answer that is only rule 4 of SYSTEM_PROMPT makes no claims to check
+_NOT_FOUND = "I could not find this information in the provided document."
+
+# Quotes are matched on word n-grams of this length (shorter quotes on single words)
+_NGRAM = 3
+
+
+class ParsedAnswer(BaseModel):
+    answer: str
+    quotes: List[str]
+    confidence: Optional[str] = None
+
+
+def parse_answer(text: str) -> ParsedAnswer:
+    """
+    Split a response in the SYSTEM_PROMPT format into its parts.
+
+    Text outside the ANSWER:/EVIDENCE:/CONFIDENCE: sections is treated
+    as the answer, so free-form responses still yield claims to check.
+    """
+    sections = {}
+    matches = list(_SECTION_PATTERN.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[match.group(1).upper()] = text[match.end():end].strip()
+
+    answer = sections.get("ANSWER", text if not matches else "")
+    quotes = []
+    for quote in _QUOTE_PATTERN.findall(_normalize_quotes(sections.get("EVIDENCE", ""))):
+        quotes.extend(part.strip() for part in _ELLIPSIS_PATTERN.split(quote) if part.strip())
+
+    confidence = sections.get("CONFIDENCE")
+    if confidence:
+        confidence = confidence.split()[0].strip(".").capitalize()
+    return ParsedAnswer(answer=answer, quotes=quotes, confidence=confidence or None)
+
+
+class GroundingChecker:
+    """
+    Cheap local grounding check for generated answers.
+
+    Quoted evidence is matched against the retrieved chunks on word
+    n-grams, and the answer's content words are checked against the
+    chunks' vocabulary. Clearly grounded and clearly ungrounded answers
+    get a VerificationResult immediately; anything in between returns
+    None so the caller can fall back to the LLM verifier.
+
+    Counts how often a decision was made locally (see stats()).
+    """
+
+    def __init__(self, high: Optional[float] = None, low: Optional[float] = None):
+        """
+        Args:
+            high: Score at or above which an answer is VERIFIED (defaults to settings.GROUNDING_HIGH)
+            low: Score below which an answer is NOT_VERIFIED (defaults to settings.GROUNDING_LOW)
+        """
+        self.high = settings.GROUNDING_HIGH if high is None else high
+        self.low = settings.GROUNDING_LOW if low is None else low
+        self._lock = threading.Lock()
+        self.verified = 0
+        self.not_verified = 0
+        self.deferred = 0
+
+    def check(self, answer: str, evidence_chunks: List[EmbeddedChunk]) -> Optional[VerificationResult]:
+        """
+        Return a VerificationResult when grounding is clear, else None.
+
+        Args:
+            answer: The generated answer, ideally in SYSTEM_PROMPT format
+            evidence_chunks: The chunks the answer was generated from
+
+        Returns:
+            A VERIFIED or NOT_VERIFIED result, or None if ambiguous
+        """
+        parsed = parse_answer(answer)
+        result = self._decide(parsed, evidence_chunks)
+
+        with self._lock:
+            if result is None:
+                self.deferred += 1
+            elif result.overall_status == "VERIFIED":
+                self.verified += 1
+            else:
+                self.not_verified += 1
+        return result
+
+    def _decide(self, parsed: ParsedAnswer, evidence_chunks: List[EmbeddedChunk]) -> Optional[VerificationResult]:
+        if _words(parsed.answer) == _NOT_FOUND_WORDS:
+            return _result("VERIFIED", 1.0, [
+                VerificationIssue(check="Answer claims", status="PASS",
+                                  reason="The answer states the information was not found")
+            ])
+
+        ngrams, words = _evidence_index(evidence_chunks)
+        quote_scores = [_quote_score(quote, ngrams, words) for quote in parsed.quotes]
+        support, unsupported = _claim_support(parsed.answer, words)
+
+        issues = [
+            VerificationIssue(
+                check=f'Quoted evidence: "{_shorten(quote)}"',
+                status="PASS" if score >= self.high else ("FAIL" if score < self.low else "WARNING"),
+                reason=f"{score:.0%} of the quote's word sequences appear in the retrieved chunks"
+            )
+            for quote, score in zip(parsed.quotes, quote_scores)
+        ]
+        issues.append(VerificationIssue(
+            check="Answer claims",
+            status="PASS" if support >= self.high and not unsupported else "WARNING",
+            reason=f"{support:.0%} of the answer's content words appear in the retrieved chunks"
+                   + (f"; {len(unsupported)} sentence(s) mostly unsupported" if unsupported else "")
+        ))
+
+        if quote_scores:
+            score = 0.5 * min(quote_scores) + 0.5 * support
+        else:
+            score = support
+
+        if quote_scores and min(quote_scores) >= self.high and support >= self.high and not unsupported:
+            return _result("VERIFIED", score, issues)
+        if score < self.low or (quote_scores and max(quote_scores) < self.low):
+            return _result("NOT_VERIFIED", score, issues)
+        return None
+
+    @property
+    def skip_rate(self) -> float:
+        """Fraction of checks decided locally, without an LLM call."""
+        with self._lock:
+            total = self.verified + self.not_verified + self.deferred
+            return (self.verified + self.not_verified) / total if total else 0.0
+
+    def stats(self) -> dict:
+        """Decision counters as a plain dict."""
+        skip_rate = self.skip_rate
+        with self._lock:
+            return {
+                "verified": self.verified,
+                "not_verified": self.not_verified,
+                "deferred": self.deferred,
+                "skip_rate": round(skip_rate, 4),
+            }
+
+
+def _normalize_quotes(text: str) -> str:
+    return text.replace("“", '"').replace("”", '"')
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase word tokens with accents folded and punctuation dropped."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def _ngrams(words: List[str], n: int) -> Set[Tuple[str, ...]]:
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _evidence_index(evidence_chunks: List[EmbeddedChunk]) -> Tuple[Set[Tuple[str, ...]], Set[str]]:
+    """Word n-grams (not spanning chunk boundaries) and the set of words of the chunks."""
+    ngrams: Set[Tuple[str, ...]] = set()
+    words: Set[str] = set()
+    for chunk in evidence_chunks:
+        chunk_words = _words(chunk.text)
+        ngrams |= _ngrams(chunk_words, _NGRAM)
+        words.update(chunk_words)
+    return ngrams, words
+
+
+def _quote_score(quote: str, evidence_ngrams: Set[Tuple[str, ...]], evidence_words: Set[str]) -> float:
+    """Fraction of the quote's word n-grams found in the evidence."""
+    words = _words(quote)
+    if not words:
+        return 0.0
+    if len(words) < _NGRAM:
+        return sum(w in evidence_words for w in words) / len(words)
+    grams = _ngrams(words, _NGRAM)
+    return len(grams & evidence_ngrams) / len(grams)
+
+
+def _claim_support(answer: str, evidence_words: Set[str]) -> Tuple[float, List[str]]:
+    """
+    Fraction of the answer's content words found in the evidence, and the
+    sentences where fewer than half of them are.
+    """
+    found = total = 0
+    unsupported = []
+    for sentence in _SENTENCE_PATTERN.split(answer):
+        tokens = [w for w in _words(sentence) if len(w) > 1 and w not in ENGLISH_STOP_WORDS]
+        if not tokens:
+            continue
+        hits = sum(t in evidence_words for t in tokens)
+        found += hits
+        total += len(tokens)
+        if hits < len(tokens) / 2:
+            unsupported.append(sentence)
+    return (found / total if total else 0.0), unsupported
+
+
+_NOT_FOUND_WORDS = _words(_NOT_FOUND)
+
+
+def _shorten(text: str, limit: int = 60) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _result(status: str, score: float, issues: List[VerificationIssue]) -> VerificationResult:
+    return VerificationResult(
+        document_type="Unknown",
+        overall_status=status,
+        issues=issues,
+        confidence_score=round(score, 4)
+    )
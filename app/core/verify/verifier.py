@@ -1,16 +1,14 @@
 
+import json
 from typing import List, Optional
-from openai import OpenAI
 from app.core.core.config import settings
+from app.core.core.tracing import current_span, span
+from app.core.reason.client import get_async_client, get_client
+from app.core.reason.scheduler import PRIORITY_VERIFY, estimate_tokens, get_scheduler
 from app.core.verify.base import VerificationIssue, VerificationResult
+from app.core.verify.grounding import GroundingChecker
 from app.core.schemas.embedding import EmbeddedChunk
 
-
-client = OpenAI(
-    api_key=settings.GROQ_API_KEY,
-    base_url="https://api.groq.com/openai/v1"
-)
-
 VERIFICATION_PROMPT = """
 You are a fact-checking assistant. Your job is to verify if an answer is properly 
 supported by the provided evidence chunks.
@@ -39,10 +37,21 @@ Respond in the following JSON format:
 class AnswerVerifier:
     """
     Verifies that generated answers are grounded in source documents.
+    
+    A local lexical check runs first; the LLM is only asked to verify
+    answers whose grounding is ambiguous. grounding.stats() reports how
+    many LLM calls were skipped.
     """
     
-    def __init__(self):
-        self.client = client
+    def __init__(self, local_first: Optional[bool] = None):
+        """
+        Args:
+            local_first: Try the local grounding check before the LLM
+                (defaults to settings.VERIFY_LOCAL_FIRST)
+        """
+        if local_first is None:
+            local_first = settings.VERIFY_LOCAL_FIRST
+        self.grounding = GroundingChecker() if local_first else None
     
     def verify(
         self, 
@@ -61,82 +70,89 @@ class AnswerVerifier:
         Returns:
             VerificationResult with status and any issues found
         """
+        with span("verify", chunks=len(evidence_chunks)) as s:
+            result = self._verify(answer, evidence_chunks, query)
+            s.set(status=result.overall_status, confidence=result.confidence_score)
+            return result
+    
+    def _verify(
+        self,
+        answer: str,
+        evidence_chunks: List[EmbeddedChunk],
+        query: str
+    ) -> VerificationResult:
         if not evidence_chunks:
-            return VerificationResult(
-                document_type="Unknown",
-                overall_status="NOT_VERIFIED",
-                issues=[
-                    VerificationIssue(
-                        check="Evidence availability",
-                        status="FAIL",
-                        reason="No evidence chunks provided"
-                    )
-                ],
-                confidence_score=0.0
-            )
+            return _no_evidence_result()
         
-        # Build evidence context
-        evidence_text = "\n\n".join(
-            f"[Chunk {c.chunk_id} from {c.source}]:\n{c.text}"
-            for c in evidence_chunks
-        )
+        local = self._check_locally(answer, evidence_chunks)
+        if local is not None:
+            return local
         
         try:
-            response = self.client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": VERIFICATION_PROMPT},
-                    {
-                        "role": "user",
-                        "content": f"""
-Query: {query}
-
-Answer to verify:
-{answer}
-
-Evidence chunks:
-{evidence_text}
-
-Verify if the answer is properly supported by the evidence.
-"""
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            result_text = response.choices[0].message.content
-            import json
-            result_data = json.loads(result_text)
-            
-            issues = [
-                VerificationIssue(
-                    check=issue.get("check", "Unknown check"),
-                    status=issue.get("status", "UNKNOWN"),
-                    reason=issue.get("reason", "No reason provided")
-                )
-                for issue in result_data.get("issues", [])
-            ]
-            
-            return VerificationResult(
-                document_type=result_data.get("document_type", "Unknown"),
-                overall_status=result_data.get("overall_status", "NOT_VERIFIED"),
-                issues=issues,
-                confidence_score=float(result_data.get("confidence_score", 0.0))
+            messages = _build_messages(answer, evidence_chunks, query)
+            response = get_scheduler().call(
+                lambda: get_client().chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=messages,
+                    response_format={"type": "json_object"}
+                ),
+                priority=PRIORITY_VERIFY,
+                tokens=estimate_tokens(messages)
             )
+            return _parse_result(response.choices[0].message.content)
             
         except Exception as e:
-            return VerificationResult(
-                document_type="Unknown",
-                overall_status="ERROR",
-                issues=[
-                    VerificationIssue(
-                        check="Verification process",
-                        status="FAIL",
-                        reason=f"Verification failed: {str(e)}"
-                    )
-                ],
-                confidence_score=0.0
+            return _error_result(e)
+    
+    async def verify_async(
+        self,
+        answer: str,
+        evidence_chunks: List[EmbeddedChunk],
+        query: str
+    ) -> VerificationResult:
+        """
+        Async version of verify, using the event loop's pooled client.
+        """
+        with span("verify", chunks=len(evidence_chunks)) as s:
+            result = await self._verify_async(answer, evidence_chunks, query)
+            s.set(status=result.overall_status, confidence=result.confidence_score)
+            return result
+    
+    async def _verify_async(
+        self,
+        answer: str,
+        evidence_chunks: List[EmbeddedChunk],
+        query: str
+    ) -> VerificationResult:
+        if not evidence_chunks:
+            return _no_evidence_result()
+        
+        local = self._check_locally(answer, evidence_chunks)
+        if local is not None:
+            return local
+        
+        try:
+            messages = _build_messages(answer, evidence_chunks, query)
+            response = await get_scheduler().call_async(
+                lambda: get_async_client().chat.completions.create(
+                    model=settings.LLM_MODEL,
+                    messages=messages,
+                    response_format={"type": "json_object"}
+                ),
+                priority=PRIORITY_VERIFY,
+                tokens=estimate_tokens(messages)
             )
+            return _parse_result(response.choices[0].message.content)
+        
+        except Exception as e:
+            return _error_result(e)
+    
+    def _check_locally(self, answer: str, evidence_chunks: List[EmbeddedChunk]) -> Optional[VerificationResult]:
+        if self.grounding is None:
+            return None
+        result = self.grounding.check(answer, evidence_chunks)
+        current_span().set(local=result is not None)
+        return result
     
     def quick_verify(
         self, 
@@ -185,3 +201,78 @@ Verify if the answer is properly supported by the evidence.
         
         # Consider grounded if at least 30% of key words found
         return match_ratio >= 0.3
+
+
+def _build_messages(answer: str, evidence_chunks: List[EmbeddedChunk], query: str) -> List[dict]:
+    # Build evidence context
+    evidence_text = "\n\n".join(
+        f"[Chunk {c.chunk_id} from {c.source}]:\n{c.text}"
+        for c in evidence_chunks
+    )
+    return [
+        {"role": "system", "content": VERIFICATION_PROMPT},
+        {
+            "role": "user",
+            "content": f"""
+Query: {query}
+
+Answer to verify:
+{answer}
+
+Evidence chunks:
+{evidence_text}
+
+Verify if the answer is properly supported by the evidence.
+"""
+        }
+    ]
+
+
+def _parse_result(result_text: str) -> VerificationResult:
+    result_data = json.loads(result_text)
+    
+    issues = [
+        VerificationIssue(
+            check=issue.get("check", "Unknown check"),
+            status=issue.get("status", "UNKNOWN"),
+            reason=issue.get("reason", "No reason provided")
+        )
+        for issue in result_data.get("issues", [])
+    ]
+    
+    return VerificationResult(
+        document_type=result_data.get("document_type", "Unknown"),
+        overall_status=result_data.get("overall_status", "NOT_VERIFIED"),
+        issues=issues,
+        confidence_score=float(result_data.get("confidence_score", 0.0))
+    )
+
+
+def _no_evidence_result() -> VerificationResult:
+    return VerificationResult(
+        document_type="Unknown",
+        overall_status="NOT_VERIFIED",
+        issues=[
+            VerificationIssue(
+                check="Evidence availability",
+                status="FAIL",
+                reason="No evidence chunks provided"
+            )
+        ],
+        confidence_score=0.0
+    )
+
+
+def _error_result(error: Exception) -> VerificationResult:
+    return VerificationResult(
+        document_type="Unknown",
+        overall_status="ERROR",
+        issues=[
+            VerificationIssue(
+                check="Verification process",
+                status="FAIL",
+                reason=f"Verification failed: {str(error)}"
+            )
+        ],
+        confidence_score=0.0
+    )
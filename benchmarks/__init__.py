@@ -0,0 +1 @@
+# Offline benchmarks for VERILENS (see benchmarks/bench.py)
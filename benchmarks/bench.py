@@ -0,0 +1,375 @@
+"""
+VERILENS - Offline Benchmark Suite
+
+Times each stage on synthetic corpora and prints (or writes) one JSON
+report that can be diffed between commits:
+
+    python -m benchmarks.bench --chunks 1000 10000 --output bench.json
+
+Stages: load_pdf, chunk_document, index_chunks, similarity_search,
+save, load and end-to-end VeriLensAgent.answer. Corpora of at least
+ANN_MIN_CHUNKS chunks also get an "ann" stage: search latency and
+recall against exact search for each --ann-probes value. The
+"quantization" stage builds int8 and PQ codes and reports their
+compression ratio, recall and latency with and without float re-ranking. The LLM is replaced by
+a local stub server (benchmarks/stub_llm.py) with configurable latency,
+so no API key or network access is needed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.core.config import settings, logger
+from benchmarks.corpus import make_documents, make_queries, write_pdf
+from benchmarks.stub_llm import StubConfig, StubServer
+
+REPORT_VERSION = 1
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Count, mean and p50/p95/p99/max of per-operation latencies, in milliseconds."""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def timed(fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def stage_report(seconds: float, items: int, unit: str, **extra) -> dict:
+    report = {
+        "seconds": round(seconds, 4),
+        unit: items,
+        f"{unit}_per_second": round(items / seconds, 2) if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    report.update(extra)
+    return report
+
+
+def bench_load_pdf(workdir: Path, pages: int, repeats: int) -> dict:
+    from app.core.ingest.pdf_loader import load_pdf
+
+    # One ~8-chunk document per page
+    documents = make_documents(pages * 8, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, chunks_per_document=8, seed=7)
+    path = workdir / "bench.pdf"
+    write_pdf(path, [d.content for d in documents])
+    n_pages = len(documents)
+
+    samples = []
+    for _ in range(repeats):
+        _, seconds = timed(load_pdf, str(path))
+        samples.append(seconds)
+    total = sum(samples)
+    return stage_report(total, n_pages * repeats, "pages", latency=latency_summary(samples))
+
+
+def bench_refresh(workdir: Path, pages: int, repeats: int) -> dict:
+    """A one-page edit re-indexed with refresh_file, against indexing the edited PDF from scratch."""
+    from app.core.ingest.indexer import index_documents
+    from app.core.ingest.pdf_loader import load_pdf_document
+    from app.core.ingest.refresh import refresh_file
+    from app.core.retrieve.vector_store import VectorStore
+
+    documents = make_documents(pages * 8, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, chunks_per_document=8, seed=7)
+    edits = make_documents(repeats * 8, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, chunks_per_document=8, seed=8)
+    texts = [d.content for d in documents]
+    path = workdir / "refresh.pdf"
+    write_pdf(path, texts)
+    store = VectorStore()
+    refresh_file(str(path), store)
+
+    refresh, full, chunks = [], [], []
+    for i, edit in enumerate(edits):
+        texts[(i * 7919) % len(texts)] = edit.content
+        write_pdf(path, texts)
+        result, seconds = timed(refresh_file, str(path), store)
+        refresh.append(seconds)
+        chunks.append(result.chunks_added)
+
+        start = time.perf_counter()
+        index_documents([load_pdf_document(str(path))], VectorStore())
+        full.append(time.perf_counter() - start)
+
+    report = stage_report(sum(refresh), len(refresh), "edits", latency=latency_summary(refresh))
+    report.update(
+        pages=len(texts),
+        chunks_reindexed=round(float(np.mean(chunks)), 1),
+        full_reindex=latency_summary(full),
+        speedup=round(sum(full) / sum(refresh), 2),
+    )
+    return report
+
+
+def bench_size(
+    n_chunks: int,
+    n_queries: int,
+    answer_queries: int,
+    workdir: Path,
+    ann_probes: List[int],
+    quantization: List[str]
+) -> dict:
+    """Run the per-corpus stages for one corpus size."""
+    from app.core.ingest.chunker import chunk_document
+    from app.core.ingest.indexer import index_chunks
+    from app.core.retrieve.vector_store import VectorStore
+
+    results = {}
+    documents, seconds = timed(make_documents, n_chunks, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    characters = sum(len(d.content) for d in documents)
+    results["generate"] = stage_report(seconds, characters, "characters", documents=len(documents))
+
+    start = time.perf_counter()
+    chunks = [chunk for document in documents for chunk in chunk_document(document)]
+    results["chunk_document"] = stage_report(time.perf_counter() - start, len(chunks), "chunks")
+
+    store = VectorStore()
+    _, seconds = timed(index_chunks, chunks, store)
+    results["index_chunks"] = stage_report(seconds, len(chunks), "chunks")
+    del chunks
+
+    queries = make_queries(documents, n_queries)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search(store.embedder.transform([query]), settings.TOP_K)
+        samples.append(time.perf_counter() - start)
+    results["similarity_search"] = stage_report(
+        sum(samples), len(samples), "queries", latency=latency_summary(samples)
+    )
+
+    if store.ann_index is not None and ann_probes:
+        results["ann"] = bench_ann(store, queries, ann_probes)
+    if quantization:
+        results["quantization"] = bench_quantization(store, queries, quantization)
+
+    index_path = workdir / f"index_{n_chunks}"
+    _, seconds = timed(store.save, str(index_path))
+    disk_bytes = sum(f.stat().st_size for f in index_path.rglob("*") if f.is_file())
+    results["save"] = stage_report(seconds, len(store), "chunks", disk_mb=round(disk_bytes / 2**20, 2))
+
+    loaded = VectorStore()
+    _, seconds = timed(loaded.load, str(index_path))
+    results["load"] = stage_report(seconds, len(loaded), "chunks")
+
+    if answer_queries:
+        results["answer"] = bench_answer(loaded, queries[:answer_queries])
+    shutil.rmtree(index_path, ignore_errors=True)
+    return results
+
+
+def bench_ann(store, queries: List[str], probes: List[int]) -> dict:
+    """Latency and recall@TOP_K against exact search for several IVF probe counts."""
+    vectors = [store.embedder.transform([query]) for query in queries]
+
+    def search(n_probe: int):
+        results, samples = [], []
+        for vector in vectors:
+            start = time.perf_counter()
+            chunks = store.similarity_search(vector, settings.TOP_K, n_probe=n_probe)
+            samples.append(time.perf_counter() - start)
+            results.append({(c.source, c.chunk_id) for c in chunks})
+        return results, samples
+
+    exact, samples = search(0)
+    report = {
+        "lists": store.ann_index.n_lists,
+        "exact": {"latency": latency_summary(samples)},
+    }
+    for n_probe in probes:
+        found, samples = search(n_probe)
+        recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e])
+        report[f"probes_{n_probe}"] = {
+            "recall": round(float(recall), 4),
+            "latency": latency_summary(samples),
+        }
+    return report
+
+
+def bench_quantization(store, queries: List[str], kinds: List[str]) -> dict:
+    """Compression ratio, build time, and recall@TOP_K and latency against exact float search, per code kind."""
+    from app.core.retrieve.quantize import compression_ratio, update_quantization
+
+    vectors = [store.embedder.transform([query]) for query in queries]
+    previous = settings.QUANTIZATION, settings.QUANT_RERANK, store.quantized
+
+    def search():
+        found, samples = [], []
+        for vector in vectors:
+            start = time.perf_counter()
+            chunks = store.similarity_search(vector, settings.TOP_K, n_probe=0)
+            samples.append(time.perf_counter() - start)
+            found.append({(c.source, c.chunk_id) for c in chunks})
+        return found, samples
+
+    report = {}
+    try:
+        settings.QUANTIZATION = ""
+        exact, samples = search()
+        report["float32"] = {"latency": latency_summary(samples)}
+        for kind in kinds:
+            settings.QUANTIZATION = kind
+            store.quantized = None
+            codes, seconds = timed(update_quantization, store)
+            entry = {
+                "build_seconds": round(seconds, 4),
+                "code_mb": round(codes.nbytes / 2**20, 2),
+                "compression_ratio": round(compression_ratio(codes, store.embedding_matrix()), 2),
+            }
+            for rerank in sorted({0, previous[1] or 4}):
+                settings.QUANT_RERANK = rerank
+                found, samples = search()
+                recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e])
+                entry[f"rerank_{rerank}"] = {
+                    "recall": round(float(recall), 4),
+                    "latency": latency_summary(samples),
+                }
+            report[kind] = entry
+    finally:
+        settings.QUANTIZATION, settings.QUANT_RERANK, store.quantized = previous
+    return report
+
+
+def bench_answer(store, queries: List[str]) -> dict:
+    """End-to-end VeriLensAgent.answer latency against the stub LLM (caches off)."""
+    from app.core.agent.verilens_agent import VeriLensAgent
+
+    agent = VeriLensAgent(store, enable_verification=True)
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        agent.answer(query)
+        samples.append(time.perf_counter() - start)
+
+    report = stage_report(sum(samples), len(samples), "queries", latency=latency_summary(samples))
+    if agent.verifier.grounding is not None:
+        report["local_verification"] = agent.verifier.grounding.stats()
+    return report
+
+
+def configure_for_benchmark(base_url: str):
+    """Point the LLM clients at the stub and remove limits that would skew timings."""
+    settings.LLM_BASE_URL = base_url
+    settings.GROQ_API_KEY = settings.GROQ_API_KEY or "benchmark"
+    settings.ANSWER_CACHE_ENABLED = False
+    settings.SEMANTIC_CACHE_ENABLED = False
+    settings.LLM_REQUESTS_PER_MINUTE = 0
+    settings.LLM_TOKENS_PER_MINUTE = 0
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parents[1]
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VERILENS stages on synthetic corpora.")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000],
+                        help="Corpus sizes in chunks (e.g. 1000 100000 1000000)")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per corpus size")
+    parser.add_argument("--answer-queries", type=int, default=20,
+                        help="End-to-end answers per corpus size (0 to skip)")
+    parser.add_argument("--pdf-pages", type=int, default=50, help="Pages in the load_pdf benchmark (0 to skip)")
+    parser.add_argument("--pdf-repeats", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub LLM response latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Uniform +/- jitter on the stub latency")
+    parser.add_argument("--ann-probes", type=int, nargs="*", default=[1, 4, 16, 64],
+                        help="IVF probe counts to compare with exact search")
+    parser.add_argument("--ann-min-chunks", type=int, default=settings.ANN_MIN_CHUNKS,
+                        help="Smallest corpus that gets an IVF index")
+    parser.add_argument("--quantization", nargs="*", default=["int8", "pq"], choices=["int8", "pq"],
+                        help="Quantized code kinds to compare with float32 search")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    settings.ANN_MIN_CHUNKS = args.ann_min_chunks
+
+    report = {
+        "version": REPORT_VERSION,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "CHUNK_SIZE": settings.CHUNK_SIZE,
+            "CHUNK_OVERLAP": settings.CHUNK_OVERLAP,
+            "TOP_K": settings.TOP_K,
+            "TFIDF_MAX_FEATURES": settings.TFIDF_MAX_FEATURES,
+            "RETRIEVAL_ENGINE": settings.RETRIEVAL_ENGINE,
+            "ANN_MIN_CHUNKS": settings.ANN_MIN_CHUNKS,
+            "ANN_LISTS": settings.ANN_LISTS,
+            "ANN_PROBES": settings.ANN_PROBES,
+            "QUANTIZATION": settings.QUANTIZATION,
+            "QUANT_RERANK": settings.QUANT_RERANK,
+        },
+        "llm_stub": {"latency": args.llm_latency, "jitter": args.llm_jitter},
+        "stages": {},
+        "sizes": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="verilens_bench_") as tmp, \
+            StubServer(StubConfig(args.llm_latency, args.llm_jitter)) as stub:
+        workdir = Path(tmp)
+        configure_for_benchmark(stub.base_url)
+
+        if args.pdf_pages:
+            logger.info(f"Benchmarking load_pdf ({args.pdf_pages} pages)")
+            report["stages"]["load_pdf"] = bench_load_pdf(workdir, args.pdf_pages, args.pdf_repeats)
+            logger.info(f"Benchmarking refresh_file ({args.pdf_pages} pages)")
+            report["stages"]["refresh"] = bench_refresh(workdir, args.pdf_pages, args.pdf_repeats)
+
+        for n_chunks in args.chunks:
+            logger.info(f"Benchmarking {n_chunks} chunks")
+            report["sizes"][str(n_chunks)] = bench_size(
+                n_chunks, args.queries, args.answer_queries, workdir, args.ann_probes, args.quantization
+            )
+
+        report["llm_stub"]["requests"] = stub.config.requests
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
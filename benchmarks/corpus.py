@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic corpora for benchmarks.
+
+Text is drawn from a Zipf-distributed vocabulary of pseudo-words, so
+term statistics look roughly like natural language and TF-IDF/BM25
+behave realistically. The same seed always produces the same corpus.
+"""
+
+from pathlib import Path
+from typing import List
+import numpy as np
+from app.core.schemas.document import Document
+
+_LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    """Pseudo-words of 3-10 letters."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(3, 11, size=size)
+    return ["".join(rng.choice(_LETTERS, n)) for n in lengths]
+
+
+def make_text(characters: int, vocabulary: List[str], rng: np.random.Generator) -> str:
+    """Roughly `characters` of sentence-like text drawn from the vocabulary."""
+    n_words = max(1, characters // 6)
+    ranks = np.minimum(rng.zipf(1.2, size=n_words), len(vocabulary)) - 1
+    words = np.asarray(vocabulary, dtype=object)[ranks]
+
+    # End a sentence every 8-20 words
+    sentence_ends = np.cumsum(rng.integers(8, 21, size=n_words // 8 + 1))
+    sentence_ends = sentence_ends[sentence_ends < n_words]
+    words[sentence_ends - 1] = [w + "." for w in words[sentence_ends - 1]]
+    return " ".join(words)[:characters]
+
+
+def make_documents(
+    n_chunks: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunks_per_document: int = 200,
+    vocabulary_size: int = 20000,
+    seed: int = 0
+) -> List[Document]:
+    """
+    Documents that chunk into about n_chunks chunks in total.
+
+    Args:
+        n_chunks: Target number of chunks across all documents
+        chunk_size: CHUNK_SIZE the corpus will be chunked with
+        chunk_overlap: CHUNK_OVERLAP the corpus will be chunked with
+        chunks_per_document: Chunks per generated document
+        vocabulary_size: Distinct pseudo-words
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, seed)
+    step = chunk_size - chunk_overlap
+
+    documents = []
+    remaining = n_chunks
+    while remaining > 0:
+        count = min(chunks_per_document, remaining)
+        text = make_text(step * (count - 1) + chunk_size, vocabulary, rng)
+        documents.append(Document(content=text, source=f"doc_{len(documents):05d}.txt"))
+        remaining -= count
+    return documents
+
+
+def make_queries(documents: List[Document], n_queries: int, words: int = 6, seed: int = 1) -> List[str]:
+    """Queries made of consecutive words sampled from the corpus."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n_queries):
+        tokens = documents[rng.integers(len(documents))].content.split()
+        start = rng.integers(max(1, len(tokens) - words))
+        queries.append(" ".join(tokens[start:start + words]).replace(".", ""))
+    return queries
+
+
+def write_pdf(path: Path, pages: List[str], line_length: int = 90, lines_per_page: int = 60):
+    """
+    Write a minimal text-only PDF (one Helvetica text block per page).
+
+    Each page's text is wrapped at line_length characters and clipped
+    to lines_per_page lines. Good enough for PdfReader.extract_text.
+    """
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for text in pages:
+        lines = [text[i:i + line_length] for i in range(0, len(text), line_length)][:lines_per_page]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    Path(path).write_bytes(bytes(out))
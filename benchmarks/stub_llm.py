@@ -0,0 +1,175 @@
+"""
+Local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+Answers in the ANSWER:/EVIDENCE: format VERILENS expects, quoting the
+first sentence of the context it was sent, and returns verification
+JSON when a JSON response format is requested. Latency is configurable
+so benchmarks measure VERILENS rather than the network.
+
+Run standalone:
+    python -m benchmarks.stub_llm --port 8765 --latency 0.2
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_CONTEXT_LINE = re.compile(r"^\[[^\]]+\]\n(.+)$", re.MULTILINE)
+
+VERIFICATION = {
+    "document_type": "Text",
+    "overall_status": "VERIFIED",
+    "issues": [],
+    "confidence_score": 0.9,
+}
+
+
+class StubConfig:
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, tokens_per_second: float = 200.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Time to first byte for one request."""
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+
+def _answer_for(messages) -> str:
+    user = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+    match = _CONTEXT_LINE.search(user)
+    sentence = match.group(1).split(". ")[0].strip() if match else "no context"
+    return (
+        f"ANSWER:\n{sentence}.\n\n"
+        f"EVIDENCE:\n- [Source: stub]: \"{sentence}\"\n\n"
+        f"CONFIDENCE: High"
+    )
+
+
+def _handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            config.count()
+            time.sleep(config.delay())
+
+            if body.get("response_format"):
+                content = json.dumps(VERIFICATION)
+            else:
+                content = _answer_for(body.get("messages", []))
+
+            if body.get("stream"):
+                self._stream(content)
+            else:
+                self._complete(content)
+
+        def _complete(self, content: str):
+            tokens = len(content.split())
+            payload = json.dumps({
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, content: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second else 0.0
+            for word in content.split(" "):
+                event = json.dumps({
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": "stub",
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                })
+                self._write_chunk(f"data: {event}\n\n".encode())
+                time.sleep(interval)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 refuses bursts of concurrent requests
+
+
+class StubServer:
+    """Stub endpoint running on a background thread."""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self._server = _Server((host, port), _handler(self.config))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub OpenAI-compatible chat endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before each response starts")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Streaming speed")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.tokens_per_second)
+    with StubServer(config, args.host, args.port) as server:
+        print(f"Stub LLM listening on {server.base_url} (set LLM_BASE_URL to use it)", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
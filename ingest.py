@@ -0,0 +1,79 @@
+"""
+VERILENS - Bulk Document Ingestion
+
+Indexes every PDF and text file under a directory into one
+multi-source index and saves it for later querying. With --update the
+saved index is brought up to date instead: unchanged files are skipped
+and changed ones re-index only their changed pages.
+"""
+
+import argparse
+import json
+import sys
+
+from app.core.ingest.pipeline import ingest_directory, FileProgress
+from app.core.retrieve.vector_store import VectorStore
+
+
+def print_progress(progress: FileProgress):
+    if progress.status == "indexed":
+        detail = f"{progress.chunks} chunks, {progress.characters} chars"
+    elif progress.status == "updated":
+        detail = f"{progress.chunks} chunks re-indexed from {progress.characters} changed chars"
+    elif progress.status == "unchanged":
+        detail = "no pages changed"
+    elif progress.status == "failed":
+        detail = progress.error
+    else:
+        detail = "no text extracted"
+    print(f" [{progress.seconds:7.2f}s] {progress.status:<9} {progress.source} ({detail})", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a directory of PDF and text files.")
+    parser.add_argument("directory", help="Directory to search recursively")
+    parser.add_argument("--output", default=".verilens_cache/bulk_index", help="Where to save the index")
+    parser.add_argument("--extract-workers", type=int, help="Text extraction processes")
+    parser.add_argument("--chunk-workers", type=int, help="Chunking threads")
+    parser.add_argument("--embed-workers", type=int, help="Embedding threads")
+    parser.add_argument("--queue-size", type=int, help="Capacity of each queue between stages")
+    parser.add_argument("--update", action="store_true", help="Update the index at --output instead of rebuilding it")
+    parser.add_argument("--prune", action="store_true", help="With --update, delete indexed files that are gone")
+    args = parser.parse_args()
+
+    vector_store = VectorStore()
+    if args.update and vector_store.load(args.output, mmap=False):
+        print(f"Updating {args.output} ({len(vector_store)} chunks)")
+
+    print(f"\nIngesting: {args.directory}", flush=True)
+    try:
+        vector_store, stats = ingest_directory(
+            args.directory,
+            vector_store=vector_store,
+            extract_workers=args.extract_workers,
+            chunk_workers=args.chunk_workers,
+            embed_workers=args.embed_workers,
+            queue_size=args.queue_size,
+            on_progress=print_progress
+        )
+    except NotADirectoryError as e:
+        print(f" {e}")
+        sys.exit(1)
+
+    if args.update and args.prune:
+        gone = [s for s in vector_store.chunks.texts.sources if s not in stats.files]
+        deleted = sum(vector_store.delete_source(source) for source in gone)
+        if deleted:
+            print(f"Deleted {deleted} chunks of files that are gone")
+
+    print(json.dumps(stats.summary(), indent=2))
+
+    if len(vector_store) and vector_store.save(args.output):
+        print(f"Index saved to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n Ingestion interrupted.")
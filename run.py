@@ -5,14 +5,14 @@ A RAG-powered document analysis tool that provides answers
 with source citations from PDF documents.
 """
 
-from app.core.ingest.pdf_loader import load_pdf
-from app.core.ingest.chunker import chunk_document
-from app.core.ingest.indexer import index_chunks
+from app.core.ingest.pdf_loader import load_pdf_document
+from app.core.ingest.chunker import iter_chunks
+from app.core.ingest.indexer import index_documents
 from app.core.retrieve.vector_store import VectorStore
 from app.core.agent.verilens_agent import VeriLensAgent
-from app.core.schemas.document import Document
 import os
 import sys
+import time
 
 
 def print_banner():
@@ -45,9 +45,18 @@ def get_pdf_path() -> str:
 
 def process_document(pdf_path: str) -> tuple:
     print(f"\nLoading: {os.path.basename(pdf_path)}", flush=True)
+    filename = os.path.basename(pdf_path)
     vector_store = VectorStore()
+    
+    cache_path = VectorStore.get_cache_path(pdf_path)
+    if vector_store.load(cache_path):
+        print(f"Loaded cached index ({len(vector_store)} chunks)", flush=True)
+        print("Document ready for questions!", flush=True)
+        return vector_store, filename
+    
     print(" Extracting text from PDF", end="", flush=True)
-    text = load_pdf(pdf_path)
+    document = load_pdf_document(pdf_path, filename)
+    text = document.content
     print(" Done!", flush=True)
     
     if not text.strip():
@@ -55,19 +64,18 @@ def process_document(pdf_path: str) -> tuple:
         return None, None
     
     print(f"Extracted {len(text)} characters", flush=True)
-    
-    filename = os.path.basename(pdf_path)
-    document = Document(content=text, source=filename)
   
     print("Chunking document", end="", flush=True)
-    chunks = chunk_document(document)
-    print(f" Done! Created {len(chunks)} chunks", flush=True)
+    offsets = list(iter_chunks(document.content))
+    print(f" Done! Created {len(offsets)} chunks", flush=True)
    
     print("Indexing chunks", end="", flush=True)
-    index_chunks(chunks, vector_store)
+    index_documents([document], vector_store, [offsets])
     print(" Done!", flush=True)
     
-    print(f"Document ready for questions!", flush=True)
+    vector_store.save(cache_path)
+    
+    print("Document ready for questions!", flush=True)
     
     return vector_store, filename
 
@@ -106,14 +114,22 @@ def run_qa_loop(agent: VeriLensAgent, document_name: str):
         print(" Answer:")
         print("─" * 50)
         
+        start = time.perf_counter()
+        first_token = None
         try:
-            answer = agent.answer(query)
-            print(answer)
+            for token in agent.answer_stream(query):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                print(token, end="", flush=True)
+            print()
         except Exception as e:
-            print(f" Error generating answer: {str(e)}")
+            print(f"\n Error generating answer: {str(e)}")
             print("   Please try rephrasing your question.")
         
         print("─" * 50)
+        if first_token is not None:
+            total = time.perf_counter() - start
+            print(f" First token: {first_token:.2f}s | Total: {total:.2f}s")
 
 
 def main():
@@ -0,0 +1,50 @@
+"""
+VERILENS - HTTP Query Service
+
+Serves queries and ingestion over HTTP against one on-disk index:
+
+    python serve.py --workers 4 --port 8000
+
+    curl -X POST localhost:8000/ingest -d '{"documents": [{"source": "a.txt", "content": "..."}]}'
+    curl -X POST localhost:8000/query -d '{"query": "What is this about?"}'
+"""
+
+import argparse
+
+from app.core.server import ServerConfig, serve
+
+
+def main():
+    defaults = ServerConfig()
+    parser = argparse.ArgumentParser(description="Serve VERILENS queries over HTTP.")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--workers", type=int, default=defaults.workers,
+                        help="Worker processes sharing the port and index (0 for one per CPU)")
+    parser.add_argument("--index", default=defaults.index_path,
+                        help="Index directory (e.g. one written by ingest.py); created on first ingest")
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency,
+                        help="Queries in progress per worker")
+    parser.add_argument("--max-queue", type=int, default=defaults.max_queue,
+                        help="Queries waiting per worker before new ones are rejected with 503")
+    parser.add_argument("--request-timeout", type=float, default=defaults.request_timeout)
+    parser.add_argument("--retrieval-threads", type=int, default=defaults.retrieval_threads)
+    parser.add_argument("--ingest-root", default=defaults.ingest_root,
+                        help="Directory that POST /ingest may read paths from")
+    args = parser.parse_args()
+
+    serve(ServerConfig(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        index_path=args.index,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        request_timeout=args.request_timeout,
+        retrieval_threads=args.retrieval_threads,
+        ingest_root=args.ingest_root
+    ))
+
+
+if __name__ == "__main__":
+    main()
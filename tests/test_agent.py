@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from app.core.agent.verilens_agent import VeriLensAgent
+from app.core.ingest.indexer import index_documents
+from app.core.reason.cache import AnswerCache, answer_cache_key
+from app.core.retrieve.retriever import retrieve_relevant_chunks
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.document import Document
+
+
+class _RecordingCache(AnswerCache):
+    """SQLite-backed cache that records which threads read and write it."""
+
+    def __init__(self, path):
+        super().__init__(str(path), max_entries=8, ttl=0)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, answer, verification=None):
+        self.threads.append(threading.get_ident())
+        super().put(key, answer, verification)
+
+
+def test_async_cache_access_runs_off_the_event_loop(tmp_path):
+    store = VectorStore()
+    text = "The warranty covers the screen and the battery for two years. " * 20
+    index_documents([Document(content=text, source="warranty.txt")], store)
+    query = "Is the screen covered?"
+    cache = _RecordingCache(tmp_path / "answers.sqlite3")
+    cache.put(answer_cache_key(query, retrieve_relevant_chunks(query, store)), "Yes [warranty.txt, chunk 0].")
+    cache.threads.clear()
+    agent = VeriLensAgent(store, answer_cache=cache)
+
+    async def ask():
+        return threading.get_ident(), await agent.answer_with_sources_async(query)
+
+    loop_thread, (answer, chunks) = asyncio.run(ask())
+    assert answer.startswith("Yes")
+    assert chunks
+    assert cache.threads and loop_thread not in cache.threads
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from app.core.retrieve.ann import update_ann_index
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.core.config import settings
+
+DIM = 32
+
+
+@pytest.fixture(autouse=True)
+def ann_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ANN_ENABLED", True)
+    monkeypatch.setattr(settings, "ANN_MIN_CHUNKS", 1000)
+    monkeypatch.setattr(settings, "ANN_LISTS", 40)
+    monkeypatch.setattr(settings, "ANN_RETRAIN_GROWTH", 4.0)
+    monkeypatch.setattr(settings, "QUANTIZATION", "")
+
+
+def _clustered(n, seed=0):
+    """Unit vectors scattered around 40 fixed cluster centers."""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(99).normal(size=(40, DIM))
+    points = centers[rng.integers(len(centers), size=n)] + 0.8 * rng.normal(size=(n, DIM))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _add(store, vectors):
+    start = len(store)
+    store.add_batch([
+        EmbeddedChunk(chunk_id=start + i, text=str(start + i), source="points", embedding=vector.tolist())
+        for i, vector in enumerate(vectors)
+    ])
+
+
+def _ids(store, query, top_k, n_probe):
+    return [chunk.chunk_id for chunk in store.similarity_search(query, top_k, n_probe=n_probe)]
+
+
+def _recall(store, queries, n_probe, top_k=10):
+    hits = [
+        len(set(_ids(store, q, top_k, n_probe)) & set(_ids(store, q, top_k, 0))) / top_k
+        for q in queries
+    ]
+    return float(np.mean(hits))
+
+
+def test_recall_against_exact_search():
+    store = VectorStore()
+    _add(store, _clustered(4000))
+    index = update_ann_index(store)
+    assert index is not None and index.n_lists == 40
+
+    queries = _clustered(50, seed=1)
+    recalls = [_recall(store, queries, n_probe) for n_probe in (1, 4, 12)]
+
+    assert recalls[2] >= 0.95
+    assert recalls[0] <= recalls[1] <= recalls[2]
+    # Probing every list is exact search
+    assert _recall(store, queries, index.n_lists) == 1.0
+
+
+def test_probe_picks_closest_lists_and_their_rows():
+    store = VectorStore()
+    _add(store, _clustered(2000))
+    index = update_ann_index(store)
+    query = _clustered(1, seed=2)[0]
+
+    lists = index.probe(query[None, :], 5)[0]
+    expected = np.argsort(-(index.centroids @ query))[:5]
+    assert set(lists) == set(expected)
+
+    rows = index.candidates(lists)
+    assert np.array_equal(rows, np.flatnonzero(np.isin(index.assignments, lists)))
+    assert len(index.probe(query[None, :], index.n_lists + 3)[0]) == index.n_lists
+
+    # A search only returns rows from the probed lists
+    found = _ids(store, query, 10, 5)
+    assert set(found) <= set(rows.tolist())
+
+
+def test_adds_extend_the_index_then_retrain():
+    store = VectorStore()
+    _add(store, _clustered(2000))
+    index = update_ann_index(store)
+
+    # Too few rows to file yet: the index is kept and the new rows are scanned exactly
+    new = _clustered(10, seed=3)
+    _add(store, new)
+    assert update_ann_index(store) is index
+    assert _ids(store, new[0], 1, 1) == [2000]
+
+    # Enough new rows are filed under the existing centroids
+    _add(store, _clustered(1100, seed=4))
+    extended = update_ann_index(store)
+    assert extended is not index and extended.centroids is index.centroids
+    assert extended.size == len(store) and extended.trained_on == 2000
+    assert np.array_equal(extended.assignments[:2000], index.assignments)
+    matrix = store.embedding_matrix()
+    nearest = np.argmax(matrix[2000:] @ index.centroids.T, axis=1)
+    assert np.array_equal(extended.assignments[2000:], nearest)
+    assert _recall(store, _clustered(30, seed=5), 12) >= 0.95
+
+    # Growing ANN_RETRAIN_GROWTH times retrains on the whole store
+    _add(store, _clustered(8000 - len(store), seed=6))
+    retrained = update_ann_index(store)
+    assert retrained.centroids is not index.centroids
+    assert retrained.trained_on == retrained.size == 8000
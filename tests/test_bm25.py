@@ -0,0 +1,40 @@
+import threading
+import numpy as np
+from app.core.retrieve.bm25 import BM25Index
+
+
+def test_search_finds_matching_chunks():
+    index = BM25Index()
+    index.add(["the warranty covers the screen", "kubernetes pods and nodes", "screen protectors are sold separately"])
+    assert index.search("kubernetes", 3) == [1]
+    assert sorted(index.search("screen", 3)) == [0, 2]
+    assert index.search("screen", 3, deleted=np.array([True, False, False])) == [2]
+
+
+def test_add_while_searching():
+    index = BM25Index()
+    index.add(["alpha beta gamma"] * 100)
+    errors, done = [], threading.Event()
+
+    def search():
+        try:
+            while not done.is_set():
+                for doc_id in index.search("alpha beta", 10):
+                    assert doc_id < len(index)
+        except Exception as e:
+            errors.append(e)
+            done.set()
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(300):
+            index.add(["alpha beta delta"] * 20)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors
+    assert len(index) == 100 + 300 * 20
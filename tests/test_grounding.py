@@ -0,0 +1,66 @@
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.verify.grounding import GroundingChecker
+
+CHUNKS = [
+    EmbeddedChunk(
+        chunk_id=0,
+        source="warranty.txt",
+        text="The warranty covers screen and battery repairs for two years from the date of purchase.",
+    ),
+    EmbeddedChunk(
+        chunk_id=1,
+        source="warranty.txt",
+        text="Water damage is not covered by the warranty.",
+    ),
+]
+
+SENTINEL = "I could not find this information in the provided document."
+
+
+def _response(answer, quotes=(), confidence="High"):
+    evidence = "\n".join(f'- [Source: warranty.txt (Lines 1-2)]: "{quote}"' for quote in quotes)
+    return f"ANSWER:\n{answer}\n\nEVIDENCE:\n{evidence}\n\nCONFIDENCE: {confidence}"
+
+
+def test_supported_answer_is_verified():
+    checker = GroundingChecker(high=0.8, low=0.3)
+    result = checker.check(
+        _response(
+            "The warranty covers screen and battery repairs for two years.",
+            ["The warranty covers screen and battery repairs for two years"],
+        ),
+        CHUNKS,
+    )
+    assert result is not None and result.overall_status == "VERIFIED"
+    assert checker.stats()["verified"] == 1
+
+
+def test_unsupported_answer_is_not_verified():
+    checker = GroundingChecker(high=0.8, low=0.3)
+    result = checker.check(
+        _response(
+            "Refunds are issued within fourteen days via bank transfer.",
+            ["Refunds are issued within fourteen days via bank transfer"],
+        ),
+        CHUNKS,
+    )
+    assert result is not None and result.overall_status == "NOT_VERIFIED"
+    assert checker.stats()["not_verified"] == 1
+
+
+def test_not_found_answer_is_verified():
+    checker = GroundingChecker(high=0.8, low=0.3)
+    for answer in (SENTINEL, "  i could NOT find this information in the provided document  "):
+        result = checker.check(_response(answer, confidence="Low"), [])
+        assert result is not None and result.overall_status == "VERIFIED"
+
+
+def test_not_found_with_claims_is_still_checked():
+    checker = GroundingChecker(high=0.8, low=0.3)
+    answer = f"{SENTINEL} However, refunds are issued within fourteen days via bank transfer."
+    result = checker.check(
+        _response(answer, ["Refunds are issued within fourteen days via bank transfer"]),
+        CHUNKS,
+    )
+    assert result is None or result.overall_status == "NOT_VERIFIED"
+    assert checker.stats()["verified"] == 0
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.reason.scheduler import LLMScheduler
+from app.core.core.config import settings
+
+DELAY = 0.2
+
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", DELAY)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 1000)
+
+
+class _Legs:
+    """An async LLM call whose legs (primary, hedge) finish when the test says so."""
+
+    def __init__(self, count=2):
+        self.started = []
+        self.cancelled = []
+        self.release = [asyncio.Event() for _ in range(count)]
+
+    async def __call__(self):
+        leg = len(self.started)
+        self.started.append(time.monotonic())
+        try:
+            await self.release[leg].wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(leg)
+            raise
+        return f"leg {leg}"
+
+
+def _scheduler(requests_per_minute=0):
+    return LLMScheduler(requests_per_minute=requests_per_minute, tokens_per_minute=0, max_concurrency=4)
+
+
+def test_fast_call_is_not_hedged():
+    async def main():
+        scheduler = _scheduler()
+        legs = _Legs()
+        legs.release[0].set()
+        result = await scheduler.call_async(legs, hedge=True)
+        await asyncio.sleep(DELAY * 1.5)
+        return scheduler, legs, result
+
+    scheduler, legs, result = asyncio.run(main())
+    assert result == "leg 0"
+    assert len(legs.started) == 1
+    assert scheduler.stats()["hedges"] == 0
+
+
+def test_hedge_fires_after_the_delay_and_first_result_wins():
+    async def main():
+        scheduler = _scheduler()
+        legs = _Legs()
+        call = asyncio.ensure_future(scheduler.call_async(legs, hedge=True))
+        await asyncio.sleep(DELAY / 2)
+        before_delay = len(legs.started)
+        while len(legs.started) < 2:
+            await asyncio.sleep(0.01)
+        legs.release[1].set()
+        return scheduler, legs, before_delay, await call
+
+    scheduler, legs, before_delay, result = asyncio.run(main())
+    assert before_delay == 1
+    assert legs.started[1] - legs.started[0] >= DELAY * 0.9
+    assert result == "leg 1"
+    # The slower primary was cancelled
+    assert legs.cancelled == [0]
+    stats = scheduler.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1 and stats["attempts"] == 2
+    assert stats["active"] == 0
+
+
+def test_primary_finishing_first_cancels_the_hedge():
+    async def main():
+        scheduler = _scheduler()
+        legs = _Legs()
+        call = asyncio.ensure_future(scheduler.call_async(legs, hedge=True))
+        while len(legs.started) < 2:
+            await asyncio.sleep(0.01)
+        legs.release[0].set()
+        return scheduler, legs, await call
+
+    scheduler, legs, result = asyncio.run(main())
+    assert result == "leg 0"
+    assert legs.cancelled == [1]
+    assert scheduler.stats()["hedge_wins"] == 0
+
+
+def test_hedges_count_against_the_request_budget():
+    async def main():
+        # One request per minute: the hedge cannot be admitted until the primary's
+        # budget refills, so the primary ends up answering alone
+        scheduler = _scheduler(requests_per_minute=1)
+        legs = _Legs()
+        call = asyncio.ensure_future(scheduler.call_async(legs, hedge=True))
+        await asyncio.sleep(DELAY * 2)
+        started, queued = len(legs.started), scheduler.stats()["queue_depth"]
+        legs.release[0].set()
+        return scheduler, started, queued, await call
+
+    scheduler, started, queued, result = asyncio.run(main())
+    assert result == "leg 0"
+    assert started == 1 and queued == 1
+    stats = scheduler.stats()
+    assert stats["hedges"] == 1 and stats["attempts"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_blocking_hedge_returns_the_first_result():
+    scheduler = _scheduler()
+    primary_done = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            primary_done.wait(5)
+            return "primary"
+        return "hedge"
+
+    try:
+        assert scheduler.call(fn, hedge=True) == "hedge"
+    finally:
+        primary_done.set()
+    assert calls[1] - calls[0] >= DELAY * 0.9
+    stats = scheduler.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1 and stats["attempts"] == 2
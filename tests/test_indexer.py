@@ -0,0 +1,79 @@
+import numpy as np
+from app.core.ingest.indexer import index_documents, refit_due, refit_index
+from app.core.retrieve.retriever import retrieve_relevant_chunks
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.document import Document
+from app.core.core.config import settings
+
+TOPICS = [
+    "warranty screen battery repair replacement coverage",
+    "invoice payment refund billing account charge",
+    "shipping delivery courier parcel tracking address",
+    "password login security account token reset",
+]
+
+
+def _corpus(n_docs, seed=0):
+    rng = np.random.default_rng(seed)
+    documents = []
+    for i in range(n_docs):
+        words = TOPICS[i % len(TOPICS)].split()
+        content = " ".join(rng.choice(words, size=300))
+        documents.append(Document(content=content, source=f"doc{i}.txt"))
+    return documents
+
+
+def test_add_keeps_vocabulary_and_ann_index(monkeypatch):
+    monkeypatch.setattr(settings, "ANN_MIN_CHUNKS", 50)
+    monkeypatch.setattr(settings, "QUANTIZATION", "int8")
+    store = VectorStore()
+    index_documents(_corpus(40), store)
+    embedder, ann, codes = store.embedder, store.ann_index, store.quantized
+    assert ann is not None and codes is not None
+
+    index_documents(_corpus(1, seed=1), store)
+
+    assert store.embedder is embedder
+    assert store.ann_index.centroids is ann.centroids
+    assert store.quantized is not None
+    assert not refit_due(store)
+
+
+def test_new_vocabulary_triggers_refit(monkeypatch):
+    monkeypatch.setattr(settings, "TFIDF_REFIT_FRACTION", 0.02)
+    store = VectorStore()
+    index_documents(_corpus(8), store)
+    embedder = store.embedder
+
+    novel = Document(content="kubernetes pods containers cluster nodes scheduler " * 40, source="k8s.txt")
+    index_documents([novel], store, refit=False)
+    assert store.embedder is embedder and refit_due(store)
+    assert "k8s.txt" not in {c.source for c in retrieve_relevant_chunks("kubernetes pods", store)}
+
+    refit_index(store)
+    assert store.embedder is not embedder and store.vocabulary_misses == 0
+    assert {c.source for c in retrieve_relevant_chunks("kubernetes pods", store)} == {"k8s.txt"}
+
+
+def test_refit_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "TFIDF_REFIT_FRACTION", 0)
+    store = VectorStore()
+    index_documents(_corpus(4), store)
+    embedder = store.embedder
+
+    index_documents([Document(content="kubernetes pods " * 100, source="k8s.txt")], store)
+
+    assert store.embedder is embedder and not refit_due(store)
+
+
+def test_new_topic_sharing_common_words_counts_as_missed():
+    store = VectorStore()
+    index_documents([Document(content="The support document covers warranty screen repairs. " * 30, source="a.txt")], store)
+
+    misses = store.embedder.count_misses([
+        "Kubernetes runs pods of containers; the pods and containers of the kubernetes nodes "
+        "are described in the support document. " * 5,
+        "The support document covers warranty screen repairs. " * 5,
+    ])
+
+    assert misses == 1
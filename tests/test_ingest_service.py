@@ -0,0 +1,56 @@
+import asyncio
+from app.core.ingest.pipeline import ingest_directory
+from app.core.retrieve.retriever import retrieve_relevant_chunks
+from app.core.schemas.document import Document
+from app.core.schemas.request import IngestRequest
+from app.core.server.service import QueryService
+from app.core.core.config import settings
+
+WARRANTY = "The warranty covers the screen and the battery for two years. Water damage is excluded. " * 20
+KUBERNETES = "Kubernetes pods run containers that the control plane schedules onto cluster nodes. " * 20
+
+
+def _sources(query, store):
+    return {chunk.source for chunk in retrieve_relevant_chunks(query, store)}
+
+
+def test_second_ingest_is_searchable(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    service = QueryService(index_path=str(tmp_path / "index"), reload_interval=0)
+
+    first = asyncio.run(service.ingest(IngestRequest(documents=[Document(content=WARRANTY, source="warranty.txt")])))
+    second = asyncio.run(service.ingest(IngestRequest(documents=[Document(content=KUBERNETES, source="k8s.txt")])))
+
+    assert first["chunks_added"] and second["chunks_added"]
+    assert _sources("kubernetes pods", service.store) == {"k8s.txt"}
+    assert _sources("warranty screen", service.store) == {"warranty.txt"}
+
+
+def test_ingest_directory_into_fitted_store(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    (first / "warranty.txt").write_text(WARRANTY)
+    (second / "k8s.txt").write_text(KUBERNETES)
+
+    store, _ = ingest_directory(str(first), extract_workers=1)
+    store, stats = ingest_directory(str(second), vector_store=store, extract_workers=1)
+
+    assert stats.summary()["indexed"] == 1
+    assert _sources("kubernetes pods", store) == {"k8s.txt"}
+    assert _sources("warranty screen", store) == {"warranty.txt"}
+
+
+def test_ingest_directory_streams_after_fit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_FIT_CHUNKS", 3)
+    topics = ["warranty screen battery", "kubernetes pods containers", "invoice payment refund", "courier parcel tracking"]
+    for i, topic in enumerate(topics * 2):
+        (tmp_path / f"{i}.txt").write_text(f"Document {i} is about {topic}. " * 40)
+
+    store, stats = ingest_directory(str(tmp_path), extract_workers=1, embed_workers=2)
+
+    assert stats.summary()["indexed"] == 8
+    assert len(store) == stats.total_chunks
+    for topic in topics:
+        found = {chunk.text for chunk in retrieve_relevant_chunks(topic, store)}
+        assert all(topic in text for text in found)
@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from app.core.retrieve.quantize import update_quantization
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.core.config import settings
+
+TOP_K = 10
+
+
+@pytest.fixture(autouse=True)
+def quant_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ANN_MIN_CHUNKS", 10 ** 9)
+    monkeypatch.setattr(settings, "QUANT_PQ_SUBSPACES", 0)
+    monkeypatch.setattr(settings, "QUANT_RERANK", 4)
+
+
+def _dense(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(99).normal(size=(40, 32))
+    points = centers[rng.integers(40, size=n)] + 0.8 * rng.normal(size=(n, 32))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _sparse(n, seed=0):
+    """Non-negative rows over 256 terms, like TF-IDF, with words drawn from 20 topics."""
+    rng = np.random.default_rng(seed)
+    topics = np.random.default_rng(99).integers(256, size=(20, 24))
+    rows = []
+    for topic in rng.integers(20, size=n):
+        terms = np.unique(np.concatenate([rng.choice(topics[topic], 8), rng.integers(256, size=3)]))
+        row = np.zeros(256, dtype=np.float32)
+        row[terms] = rng.random(len(terms)) + 0.1
+        rows.append(row)
+    return normalize(sparse.csr_matrix(np.array(rows)))
+
+
+def _use(monkeypatch, kind, layout):
+    monkeypatch.setattr(settings, "QUANTIZATION", kind)
+    # Four of the 32 dense dimensions per PQ byte; the default eight loses too much
+    monkeypatch.setattr(settings, "QUANT_PQ_SUBSPACES", 8 if layout == "dense" else 0)
+
+
+def _store(layout, n, seed=0):
+    store = VectorStore()
+    _add(store, layout, n, seed)
+    return store
+
+
+def _add(store, layout, n, seed):
+    start = len(store)
+    chunks = [EmbeddedChunk(chunk_id=start + i, text=str(start + i), source="points") for i in range(n)]
+    if layout == "dense":
+        for chunk, vector in zip(chunks, _dense(n, seed)):
+            chunk.embedding = vector.tolist()
+        store.add_batch(chunks)
+    else:
+        store.add_sparse(chunks, _sparse(n, seed))
+
+
+def _queries(layout, n=30):
+    return list(_dense(n, seed=1)) if layout == "dense" else [_sparse(n, seed=1)[i] for i in range(n)]
+
+
+def _exact(store, query):
+    scores = store.embedding_matrix() @ (query.T if sparse.issparse(query) else query)
+    scores = np.asarray(scores.toarray() if sparse.issparse(scores) else scores).ravel()
+    return scores, list(np.argsort(-scores, kind="stable")[:TOP_K])
+
+
+def _search(store, query):
+    return [chunk.chunk_id for chunk in store.similarity_search(query, TOP_K)]
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_codes_rank_like_exact_search(monkeypatch, kind, layout):
+    _use(monkeypatch, kind, layout)
+    store = _store(layout, 3000)
+    codes = update_quantization(store)
+    assert codes is not None and codes.kind == kind and codes.size == 3000
+
+    queries = _queries(layout)
+    monkeypatch.setattr(settings, "QUANT_RERANK", 0)
+    recall, errors = [], []
+    for query in queries:
+        scores, exact = _exact(store, query)
+        approx = codes.scores(query)
+        errors.append(np.abs(approx - scores))
+        recall.append(len(set(_search(store, query)) & set(exact)) / TOP_K)
+
+    errors = np.concatenate(errors)
+    if kind == "int8":
+        assert errors.max() < 0.02 and np.mean(recall) >= 0.95
+    else:
+        assert errors.mean() < 0.05 and np.mean(recall) >= 0.5
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_rerank_restores_exact_order(monkeypatch, kind, layout):
+    _use(monkeypatch, kind, layout)
+    store = _store(layout, 3000)
+    update_quantization(store)
+
+    code_recall, rerank_recall, top_hits = [], [], 0
+    for query in _queries(layout):
+        scores, exact = _exact(store, query)
+        monkeypatch.setattr(settings, "QUANT_RERANK", 0)
+        code_recall.append(len(set(_search(store, query)) & set(exact)) / TOP_K)
+        monkeypatch.setattr(settings, "QUANT_RERANK", 4)
+        found = _search(store, query)
+        rerank_recall.append(len(set(found) & set(exact)) / TOP_K)
+
+        # Re-ranked results are ordered by their float scores
+        assert list(scores[found]) == sorted(scores[found], reverse=True)
+        top_hits += found[0] == exact[0]
+
+    assert np.mean(rerank_recall) >= max(0.9, np.mean(code_recall))
+    assert top_hits >= 0.9 * len(rerank_recall)
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_adds_extend_codes_then_retrain(monkeypatch, kind):
+    _use(monkeypatch, kind, "dense")
+    store = _store("dense", 2000)
+    codes = update_quantization(store)
+    trained = codes.scales if kind == "int8" else codes.codebooks
+
+    # A few new rows stay pending and are scored with their float vectors
+    _add(store, "dense", 10, seed=3)
+    assert update_quantization(store) is codes
+    query = store.embedding_matrix()[2005]
+    assert _search(store, query)[0] == 2005
+
+    # Enough new rows are encoded with the existing scales or codebooks
+    _add(store, "dense", 1100, seed=4)
+    extended = update_quantization(store)
+    assert extended.size == len(store) and extended.trained_on == 2000
+    assert (extended.scales if kind == "int8" else extended.codebooks) is trained
+    if kind == "int8":
+        added = np.clip(np.rint(store.embedding_matrix()[2000:] / trained), -127, 127)
+        assert np.array_equal(extended.codes[2000:], added)
+    else:
+        assert np.array_equal(extended.codes[:, :2000], codes.codes)
+
+    # Growing four times rebuilds them over the whole store
+    _add(store, "dense", 8000 - len(store), seed=5)
+    rebuilt = update_quantization(store)
+    assert rebuilt.trained_on == rebuilt.size == 8000
+    assert (rebuilt.scales if kind == "int8" else rebuilt.codebooks) is not trained
+
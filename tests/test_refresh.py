@@ -0,0 +1,102 @@
+import random
+import re
+from app.core.ingest.indexer import index_documents
+from app.core.ingest.refresh import refresh_document
+from app.core.reason.context import pack_context
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.document import Document
+from app.core.schemas.embedding import EmbeddedChunk
+from app.core.schemas.filter import SearchFilter
+
+SOURCE = "manual.txt"
+
+
+def _page(page: int, version: int, words: int) -> str:
+    # Fixed-width words, so a word cut at a chunk edge never equals a whole one
+    return " ".join(f"p{page:03d}v{version:02d}w{i:03d}" for i in range(words)) + "\n"
+
+
+def _document(pages) -> Document:
+    offsets, position = [], 0
+    for text in pages:
+        offsets.append(position)
+        position += len(text)
+    return Document(content="".join(pages), source=SOURCE, page_offsets=offsets)
+
+
+def _live_chunks(store: VectorStore):
+    return [chunk for chunk in store.vectors if chunk.source == SOURCE]
+
+
+def _assert_matches(store: VectorStore, document: Document):
+    chunks = _live_chunks(store)
+    words = set(re.findall(r"\w+", document.content))
+    covered = set()
+    for chunk in chunks:
+        assert chunk.text in document.content
+        covered.update(re.findall(r"\w+", chunk.text))
+    assert words <= covered
+    assert len({chunk.chunk_id for chunk in chunks}) == len(chunks)
+    # Merged context spans must be real text of the document
+    for span in pack_context(chunks, max_tokens=0):
+        assert span.text in document.content
+
+
+def test_one_page_edit_reindexes_only_nearby_chunks():
+    pages = [_page(page, 0, 60) for page in range(40)]
+    store = VectorStore()
+    index_documents([_document(pages)], store)
+    total = len(store)
+
+    pages[17] = _page(17, 1, 60)
+    document = _document(pages)
+    result = refresh_document(document, store)
+
+    assert result.changed_pages == 1
+    assert 0 < result.chunks_added < total // 5
+    assert result.chunks_deleted < total // 5
+    _assert_matches(store, document)
+    assert refresh_document(document, store).changed_pages == 0
+
+
+def test_random_edits_keep_source_in_sync():
+    rng = random.Random(7)
+    pages = [_page(page, 0, rng.randint(0, 80)) for page in range(12)]
+    store = VectorStore()
+    index_documents([_document(pages)], store)
+
+    for version in range(1, 30):
+        for page in rng.sample(range(len(pages)), rng.randint(1, 3)):
+            pages[page] = _page(page, version, rng.randint(0, 80))
+        if rng.random() < 0.2:
+            pages.append(_page(len(pages), version, rng.randint(1, 80)))
+        if rng.random() < 0.2 and len(pages) > 2:
+            pages.pop()
+        document = _document(pages)
+        refresh_document(document, store)
+        _assert_matches(store, document)
+
+
+def test_page_filter_after_refresh():
+    pages = [_page(page, 0, 60) for page in range(10)]
+    store = VectorStore()
+    index_documents([_document(pages)], store)
+    pages[4] = _page(4, 1, 60)
+    refresh_document(_document(pages), store)
+
+    rows = store.chunks.filter_rows(SearchFilter(pages=(5, 5)), len(store))
+    deleted = store.deleted_mask()
+    texts = [store.view(int(row)).text for row in rows if deleted is None or not deleted[row]]
+    assert any("p004v01" in text for text in texts)
+    assert not any("p004v00" in text or "p001" in text for text in texts)
+
+
+def test_context_does_not_merge_across_documents_of_a_source():
+    chunks = [
+        EmbeddedChunk(chunk_id=42, text="b" * 500, source=SOURCE, start=0, end=500, doc_id=1),
+        EmbeddedChunk(chunk_id=0, text="a" * 500, source=SOURCE, start=0, end=500, doc_id=0),
+        EmbeddedChunk(chunk_id=1, text="a" * 500, source=SOURCE, start=400, end=900, doc_id=0),
+    ]
+    spans = pack_context(chunks, max_tokens=0)
+    assert [span.chunk_ids for span in spans] == [[42], [0, 1]]
+    assert spans[1].text == "a" * 900
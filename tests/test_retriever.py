@@ -0,0 +1,23 @@
+import pytest
+from app.core.retrieve.embedder import TfidfEmbedder
+from app.core.retrieve.retriever import _embed_and_search
+
+
+class _RefittingStore:
+    """Hands out a new embedder on every access, as if a refit landed during each search."""
+
+    @property
+    def embedder(self):
+        return TfidfEmbedder().fit(["warranty screen battery"])
+
+
+def test_search_gives_up_when_the_vocabulary_keeps_changing():
+    searches = []
+
+    def search(embeddings):
+        searches.append(embeddings)
+        return []
+
+    with pytest.raises(RuntimeError):
+        _embed_and_search(["warranty"], _RefittingStore(), search)
+    assert len(searches) == 3
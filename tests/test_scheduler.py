@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+from openai import RateLimitError
+from app.core.reason.scheduler import PRIORITY_ANSWER, PRIORITY_VERIFY, LLMScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def _scheduler(clock, **limits):
+    limits = {"requests_per_minute": 0, "tokens_per_minute": 0, "max_concurrency": 10, **limits}
+    return LLMScheduler(clock=clock, **limits)
+
+
+def _enqueue(scheduler, admitted, name, priority=PRIORITY_ANSWER, tokens=0):
+    scheduler._enqueue(priority, tokens, lambda: admitted.append(name))
+
+
+def _tick(scheduler, clock, seconds):
+    """Let time pass and run the dispatch the refill timer would."""
+    clock.advance(seconds)
+    scheduler._on_timer()
+
+
+def _rate_limit(retry_after: str) -> RateLimitError:
+    error = RateLimitError.__new__(RateLimitError)
+    error.response = SimpleNamespace(headers={"retry-after": retry_after})
+    return error
+
+
+def test_request_bucket_denies_then_refills():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=2)
+    admitted = []
+    for name in ("a", "b", "c"):
+        _enqueue(scheduler, admitted, name)
+
+    assert admitted == ["a", "b"]
+    assert scheduler.stats()["queue_depth"] == 1
+
+    # One request refills every 30 seconds
+    _tick(scheduler, clock, 29)
+    assert admitted == ["a", "b"]
+    _tick(scheduler, clock, 1)
+    assert admitted == ["a", "b", "c"]
+
+
+def test_token_bucket_denies_then_refills_and_credits_unused_tokens():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, tokens_per_minute=600)
+    admitted = []
+    _enqueue(scheduler, admitted, "big", tokens=500)
+    _enqueue(scheduler, admitted, "next", tokens=200)
+    assert admitted == ["big"]
+
+    # 100 tokens left, 10 refill per second
+    _tick(scheduler, clock, 9)
+    assert admitted == ["big"]
+    _tick(scheduler, clock, 1)
+    assert admitted == ["big", "next"]
+
+    # Unused tokens go back to the bucket when the request reports its usage
+    _enqueue(scheduler, admitted, "after", tokens=300)
+    assert admitted == ["big", "next"]
+    scheduler.release(reserved=500, used=100)
+    assert admitted == ["big", "next", "after"]
+
+
+def test_answers_are_admitted_before_verifications():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, max_concurrency=1)
+    admitted = []
+    _enqueue(scheduler, admitted, "first")
+    _enqueue(scheduler, admitted, "verify-1", PRIORITY_VERIFY)
+    _enqueue(scheduler, admitted, "answer-1")
+    _enqueue(scheduler, admitted, "verify-2", PRIORITY_VERIFY)
+    _enqueue(scheduler, admitted, "answer-2")
+    assert admitted == ["first"]
+    assert scheduler.stats()["queue_depth_by_priority"] == {PRIORITY_ANSWER: 2, PRIORITY_VERIFY: 2}
+
+    for _ in range(4):
+        scheduler.release()
+    assert admitted == ["first", "answer-1", "answer-2", "verify-1", "verify-2"]
+
+
+def test_retry_after_pauses_every_admission():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+
+    delay = scheduler.retry_delay(_rate_limit("10"), attempt=0, max_retries=3)
+    assert 10 <= delay <= 12
+    assert scheduler.stats()["rate_limited"] == 1
+    assert scheduler.stats()["paused_seconds"] == 10
+
+    admitted = []
+    _enqueue(scheduler, admitted, "answer")
+    _enqueue(scheduler, admitted, "verify", PRIORITY_VERIFY)
+    _tick(scheduler, clock, 9.5)
+    assert admitted == []
+    _tick(scheduler, clock, 0.5)
+    assert admitted == ["answer", "verify"]
+
+
+def test_no_retry_on_the_last_attempt():
+    scheduler = _scheduler(FakeClock())
+    assert scheduler.retry_delay(_rate_limit("10"), attempt=2, max_retries=3) is None
+    assert scheduler.stats()["paused_seconds"] == 0
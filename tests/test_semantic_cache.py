@@ -0,0 +1,43 @@
+from app.core.ingest.indexer import index_documents
+from app.core.reason.semantic_cache import SemanticQueryCache
+from app.core.retrieve.vector_store import VectorStore
+from app.core.schemas.document import Document
+from app.core.schemas.embedding import EmbeddedChunk
+
+CHUNKS = [EmbeddedChunk(chunk_id=0, text="The screen is covered by the warranty.", source="warranty.txt")]
+
+
+def _cache():
+    store = VectorStore()
+    text = "The warranty covers the screen and the battery for two years. Screen damage is covered. " * 10
+    index_documents([Document(content=text, source="warranty.txt")], store)
+    cache = SemanticQueryCache(store, threshold=0.8)
+    cache.put("Is the screen covered?", CHUNKS, "Yes.")
+    return cache
+
+
+def test_paraphrase_hits():
+    cache = _cache()
+    assert cache.get("is the screen covered", CHUNKS).answer == "Yes."
+    assert cache.get("Screen covered?", CHUNKS).answer == "Yes."
+
+
+def test_warranty_period_paraphrases_hit():
+    cache = _cache()
+    cache.put("what is the warranty period", CHUNKS, "Two years.")
+    for query in ["how long is the warranty", "what is the period of the warranty", "what's the warranty period"]:
+        assert cache.get(query, CHUNKS).answer == "Two years."
+
+
+def test_negation_misses():
+    cache = _cache()
+    assert cache.get("Is the screen not covered?", CHUNKS) is None
+    assert cache.get("Isn't the screen covered?", CHUNKS) is None
+    assert cache.get("Isn’t the screen covered?", CHUNKS) is None
+    assert cache.get("Is the screen never covered?", CHUNKS) is None
+
+
+def test_different_chunks_miss():
+    cache = _cache()
+    other = [EmbeddedChunk(chunk_id=1, text="Batteries are covered.", source="warranty.txt")]
+    assert cache.get("Is the screen covered?", other) is None
@@ -0,0 +1,42 @@
+import threading
+from datetime import datetime
+from app.core.retrieve.text_store import TextStore
+
+
+def test_docs_for_sources():
+    texts = TextStore()
+    texts.add("one", "a.txt")
+    texts.add("two", "b.txt")
+    texts.add("three", "a.txt")
+    assert texts.docs_for_sources(["a.txt"]).tolist() == [0, 2]
+    assert texts.docs_for_sources(["a.txt", "b.txt", "missing"]).tolist() == [0, 1, 2]
+    assert texts.docs_for_sources(["missing"]).tolist() == []
+
+
+def test_add_while_reading_partitions():
+    texts = TextStore()
+    texts.add("first", "a.txt")
+    errors, done = [], threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                doc_ids = texts.docs_for_sources(["a.txt"])
+                texts.ingestion_times(doc_ids)
+        except Exception as e:
+            errors.append(e)
+            done.set()
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(20000):
+            texts.add(f"text {i}", "a.txt")
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors
+    assert texts.ingestion_times(texts.docs_for_sources(["a.txt"]))[0] > datetime(2000, 1, 1).timestamp()